@@ -1,14 +1,18 @@
 
 import streamlit as st
 import os
-from groq import Groq
-from app_files.firebase_utils import initialize_firebase, get_firestore_db, initialize_pyrebase
-from firebase_admin import firestore
-import pandas as pd
-import altair as alt
+import atexit
+import tempfile
+from app_files.ledger_cache import LedgerCache
+from app_files.data_fetch import start_user_data
+from app_files.session import cached_profile, invalidate_profile, store_profile
+from app_files.instrumentation import Tracer
 from datetime import datetime
 from dotenv import load_dotenv
 
+# Heavier modules (pandas, altair, groq, firebase_admin and the app_files modules built on
+# them) are imported where they are first needed, so the login page renders without them.
+
 load_dotenv()
 
 st.set_page_config(
@@ -19,42 +23,368 @@ st.set_page_config(
 )
 
 # --- Custom CSS for styling ---
-def local_css(file_name):
+@st.cache_resource
+def read_css(file_name):
+    """
+    Reads the stylesheet once per process.
+    """
     with open(file_name) as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+        return f.read()
+
+def local_css(file_name):
+    st.markdown(f"<style>{read_css(file_name)}</style>", unsafe_allow_html=True)
 
 local_css("app_files/style.css") 
 
+# --- Instrumentation ---
+@st.cache_resource
+def init_tracer():
+    """
+    Creates the process-wide tracer for timing spans. Finished reruns are appended to
+    TRACE_LOG_PATH as JSON lines when it is set.
+    """
+    return Tracer(log_path=os.environ.get("TRACE_LOG_PATH") or None)
+
+tracer = init_tracer()
+# INSTRUMENTATION=0 leaves the Firestore and Groq clients unwrapped
+INSTRUMENT_CLIENTS = os.environ.get("INSTRUMENTATION", "1") != "0"
+# DEBUG_PANEL=1 offers the timing panel in the sidebar
+DEBUG_PANEL = os.environ.get("DEBUG_PANEL", "0") == "1"
+# Most tokens of financial data the AI Advisor adds to a prompt
+ADVISOR_CONTEXT_TOKENS = int(os.environ.get("ADVISOR_CONTEXT_TOKENS", 1500))
+
 # --- Firebase and Groq Initialization ---
+# Each client is created on first use and then cached for the process: the login page
+# only needs Pyrebase auth, Firestore is connected after sign-in and Groq on the first
+# page that calls the LLM.
+def firebase_config():
+    """
+    Returns the Firebase config from Streamlit secrets, stopping the app if it is missing.
+    """
+    if "firebase" not in st.secrets:
+        st.error("Firebase configuration not found in Streamlit secrets! Please add your Firebase config to `secrets.toml`.")
+        st.stop()
+    return st.secrets["firebase"]
+
+@st.cache_resource
+def init_auth():
+    """
+    Initializes Pyrebase authentication.
+    """
+    from app_files.firebase_utils import initialize_pyrebase
+    try:
+        return initialize_pyrebase(firebase_config())
+    except Exception as e:
+        st.error(f"An error occurred during initialization: {e}")
+        st.stop()
+
 @st.cache_resource
-def init_connections():
+def init_firestore():
     """
-    Initializes Firebase and the Groq client.
-    Caches the connections for performance.
+    Initializes Firebase and returns the Firestore client.
     """
+    from app_files.firebase_utils import initialize_firebase, get_firestore_db
+    from app_files.instrumentation import InstrumentedFirestore
     try:
-        # Check for Firebase config in secrets
-        if "firebase" not in st.secrets:
-            st.error("Firebase configuration not found in Streamlit secrets! Please add your Firebase config to `secrets.toml`.")
-            st.stop()
-        firebase_config = st.secrets["firebase"]
-
-        # Check for Groq API key
-        groq_api_key = os.environ.get("GROQ_API_KEY")
-        if not groq_api_key:
-            st.error("GROQ_API_KEY not found! Please create a `.env` file in the project root and add `GROQ_API_KEY=\"YOUR_API_KEY\"`.")
-            st.stop()
-
-        initialize_firebase(firebase_config)
+        initialize_firebase(firebase_config())
         db = get_firestore_db()
-        auth = initialize_pyrebase(firebase_config)
-        groq_client = Groq(api_key=groq_api_key)
-        return db, auth, groq_client
+        if INSTRUMENT_CLIENTS:
+            db = InstrumentedFirestore(db, tracer)
+        return db
     except Exception as e:
         st.error(f"An error occurred during initialization: {e}")
         st.stop()
 
-db, auth, groq_client = init_connections()
+@st.cache_resource
+def init_groq():
+    """
+    Creates the Groq client behind the process-wide LLM gateway, which limits concurrency
+    and request rate, coalesces identical requests and retries rate limits and 5xx errors.
+    Tunable with LLM_MAX_CONCURRENCY, LLM_REQUESTS_PER_MINUTE, LLM_TIMEOUT_SECONDS and
+    LLM_MAX_RETRIES; GROQ_BASE_URL points the client elsewhere (e.g. a local stub server).
+    """
+    # Check for Groq API key
+    groq_api_key = os.environ.get("GROQ_API_KEY")
+    if not groq_api_key:
+        st.error("GROQ_API_KEY not found! Please create a `.env` file in the project root and add `GROQ_API_KEY=\"YOUR_API_KEY\"`.")
+        st.stop()
+    from groq import Groq
+    from app_files.instrumentation import InstrumentedGroq
+    from app_files.llm_gateway import LLMGateway
+    try:
+        # Retries are left to the gateway so they share its rate limit
+        groq_client = Groq(api_key=groq_api_key, base_url=os.environ.get("GROQ_BASE_URL") or None, max_retries=0)
+        if INSTRUMENT_CLIENTS:
+            groq_client = InstrumentedGroq(groq_client, tracer)
+        return LLMGateway(
+            groq_client,
+            max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", 4)),
+            requests_per_minute=float(os.environ.get("LLM_REQUESTS_PER_MINUTE", 30)),
+            timeout=float(os.environ.get("LLM_TIMEOUT_SECONDS", 60)),
+            max_retries=int(os.environ.get("LLM_MAX_RETRIES", 3)),
+        )
+    except Exception as e:
+        st.error(f"An error occurred during initialization: {e}")
+        st.stop()
+
+# --- Ledger Cache ---
+@st.cache_resource
+def init_ledger_cache():
+    """
+    Creates the process-wide ledger cache shared by every session.
+    Size and freshness can be tuned with LEDGER_CACHE_MAX_MB and LEDGER_CACHE_TTL_SECONDS.
+    """
+    max_mb = float(os.environ.get("LEDGER_CACHE_MAX_MB", 64))
+    ttl_seconds = float(os.environ.get("LEDGER_CACHE_TTL_SECONDS", 300))
+    return LedgerCache(max_bytes=int(max_mb * 1024 * 1024), ttl_seconds=ttl_seconds)
+
+ledger_cache = init_ledger_cache()
+
+# --- Ledger Store ---
+@st.cache_resource
+def init_ledger_store():
+    """
+    Creates the store ledger reads go through: a per-process SQLite replica of Firestore,
+    or Firestore itself when LOCAL_REPLICA=0 or the replica cannot be opened.
+    The replica file can be placed with LOCAL_REPLICA_PATH; the default per-process file is
+    deleted when the process exits.
+    """
+    from app_files.replica import FirestoreStore, ReplicaStore, remove_replica_files
+    db = init_firestore()
+    if os.environ.get("LOCAL_REPLICA", "1") == "0":
+        return FirestoreStore(db)
+    path = os.environ.get("LOCAL_REPLICA_PATH")
+    if path is None:
+        # The default file belongs to this process only, so it goes away with it
+        path = os.path.join(tempfile.gettempdir(), f"finance_manager_replica_{os.getpid()}.sqlite3")
+        atexit.register(remove_replica_files, path)
+    try:
+        return ReplicaStore(db, path)
+    except Exception as e:
+        st.warning(f"Local replica unavailable, reading from Firestore directly: {e}")
+        return FirestoreStore(db)
+
+@st.cache_resource
+def init_categorizer():
+    """
+    Creates the process-wide expense categorizer (memo cache, keyword classifier, LLM fallback).
+    """
+    from app_files.categorizer import Categorizer
+    return Categorizer(init_firestore(), init_groq())
+
+@st.cache_resource
+def init_summary_cache():
+    """
+    Creates the process-wide cache of Dashboard AI summaries, keyed by their inputs.
+    Tunable with SUMMARY_CACHE_MAX_ENTRIES and SUMMARY_CACHE_TTL_SECONDS.
+    """
+    from app_files.llm import CompletionCache
+    max_entries = int(os.environ.get("SUMMARY_CACHE_MAX_ENTRIES", 1000))
+    ttl_seconds = float(os.environ.get("SUMMARY_CACHE_TTL_SECONDS", 24 * 60 * 60))
+    return CompletionCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+@st.cache_resource
+def init_live_updates():
+    """
+    Creates the process-wide Firestore listeners that keep active users' cached data current.
+    Set LIVE_UPDATES=0 to rely on cache expiry and the "Refresh Data" button instead.
+    """
+    if os.environ.get("LIVE_UPDATES", "1") == "0":
+        return None
+    from app_files.live_updates import LiveUpdates
+    idle_seconds = float(os.environ.get("LIVE_UPDATES_IDLE_SECONDS", 15 * 60))
+    return LiveUpdates(init_firestore(), ledger_cache, init_ledger_store(), idle_seconds=idle_seconds)
+
+SUMMARY_PROMPT = "Here is my financial data:\n- Total Income: {total_income}\n- Total Expenses: {total_expenses}\n- Expenses by Category: {expenses_by_category}\n\nProvide a brief summary of my financial health and one actionable tip."
+
+def load_ledger(db, ledger_store, user_id, collection):
+    """
+    Returns the user's incomes or expenses as a ColumnarLedger, their 'savings_goals' as
+    documents with their "id", or their monthly 'rollups'. Served from the ledger cache;
+    the returned value is shared across sessions and must not be modified.
+    Also runs on the I/O pool, so the Firestore client and ledger store are passed in
+    from the script thread rather than looked up.
+    """
+    from app_files.columnar import COLUMNAR_COLLECTIONS, ColumnarLedger
+    from app_files.rollups import load_rollups
+
+    def fetch():
+        if collection == 'rollups':
+            return load_rollups(db, user_id)
+        rows = ledger_store.rows(user_id, collection)
+        if collection in COLUMNAR_COLLECTIONS:
+            return ColumnarLedger.from_rows(rows)
+        return rows
+    return ledger_cache.get(user_id, collection, fetch)
+
+def invalidate_ledger(user_id, *collections):
+    """
+    Drops cached copies of the user's data after a write so the next read sees it.
+    """
+    for collection in collections:
+        ledger_cache.invalidate(user_id, collection)
+        if collection != 'rollups':
+            init_ledger_store().mark_stale(user_id, collection)
+
+def apply_ledger_write(user_id, collection, added=(), deleted_ids=(), ledger_store=None):
+    """
+    Patches the cached ledger after a single add or delete instead of reloading it,
+    and drops the user's rollups so the Dashboard shows the new totals.
+    """
+    ledger_cache.update(user_id, collection, lambda ledger: ledger.append(added).delete(deleted_ids))
+    (ledger_store or init_ledger_store()).mark_stale(user_id, collection)
+    ledger_cache.invalidate(user_id, 'rollups')
+
+@st.cache_resource
+def init_write_queue():
+    """
+    Creates the process-wide background writer for new incomes and expenses, which
+    categorizes and saves them in batches. Tunable with WRITE_QUEUE_MAX_BATCH and
+    WRITE_QUEUE_MAX_WAIT_SECONDS.
+    """
+    from app_files.write_queue import WriteQueue
+    ledger_store = init_ledger_store()
+
+    def on_committed(user_id, collection, rows):
+        # Runs on the writer's thread, so the ledger store is passed in rather than looked up
+        apply_ledger_write(user_id, collection, added=rows, ledger_store=ledger_store)
+
+    return WriteQueue(
+        init_firestore(),
+        init_categorizer(),
+        on_committed=on_committed,
+        max_batch=int(os.environ.get("WRITE_QUEUE_MAX_BATCH", 200)),
+        max_wait_seconds=float(os.environ.get("WRITE_QUEUE_MAX_WAIT_SECONDS", 0.25)),
+    )
+
+# Ledger data each page renders from; fetched concurrently with the user profile when it is not cached
+PAGES = ["📊 Dashboard", "💸 Expense Tracker", "💰 Income Manager", "🎯 Savings Goal Planner", "🤖 AI Financial Advisor", "⚙️ Settings"]
+PAGE_DATA = {
+    "📊 Dashboard": ('rollups', 'incomes', 'expenses'),
+    "🎯 Savings Goal Planner": ('savings_goals', 'incomes', 'expenses'),
+}
+
+def get_paginator(user_id, collection):
+    """
+    Returns this session's cursor paginator over the user's incomes or expenses.
+    """
+    key = f"paginator_{collection}_{user_id}"
+    if key not in st.session_state:
+        from app_files.pagination import Paginator
+        ledger_store = init_ledger_store()
+        st.session_state[key] = Paginator(lambda page_size, after, **filters: ledger_store.fetch_page(user_id, collection, page_size, after, **filters))
+    return st.session_state[key]
+
+def date_range_filters(date_range):
+    """
+    Turns the value of a range `st.date_input` (zero, one or two dates) into query filters.
+    """
+    filters = {}
+    if len(date_range) > 0:
+        filters['start_date'] = date_range[0]
+    if len(date_range) > 1:
+        filters['end_date'] = date_range[1]
+    return filters
+
+def pending_writes_panel(user_id, collection):
+    """
+    Lists the user's new incomes or expenses that are still being saved in the background,
+    checking again every second until they are; then the page reruns, confirms they were
+    saved and the table shows them. Writes that could not be saved can be retried or discarded.
+    """
+    write_queue = init_write_queue()
+    version_key = f"write_version_{collection}_{user_id}"
+    version = write_queue.version(user_id)
+    if st.session_state.setdefault(version_key, version) != version:
+        st.session_state[version_key] = version
+        get_paginator(user_id, collection).refresh()
+        st.toast(f"New {collection} saved.")
+
+    @st.fragment(run_every=1 if write_queue.pending(user_id, collection) else None)
+    def panel():
+        if write_queue.version(user_id) != st.session_state[version_key]:
+            st.rerun()
+        import pandas as pd
+        pending = write_queue.pending(user_id, collection)
+        if pending:
+            st.info(f"Saving {len(pending)} new {collection}…")
+            pending_df = pd.DataFrame(pending)
+            if collection == 'expenses':
+                pending_df['category'] = pending_df['category'].fillna("Categorizing...") if 'category' in pending_df else "Categorizing..."
+            pending_df['status'] = "Saving..."
+            columns = [column for column in ['date', 'description', 'category', 'amount', 'status'] if column in pending_df]
+            st.dataframe(pending_df[columns].style.format({'amount': "{:.2f}"}), use_container_width=True)
+        failed = write_queue.failed(user_id, collection)
+        if failed:
+            st.error(f"{len(failed)} new {collection} could not be saved: {failed[-1]['error']}")
+            retry_col, discard_col = st.columns(2)
+            with retry_col:
+                if st.button("Retry", key=f"retry_writes_{collection}"):
+                    write_queue.retry_failed(user_id, collection)
+                    st.rerun()
+            with discard_col:
+                if st.button("Discard", key=f"discard_writes_{collection}"):
+                    write_queue.discard_failed(user_id, collection)
+                    st.rerun()
+
+    panel()
+
+def pagination_controls(paginator, key):
+    """
+    Renders Previous/Next buttons for a paginator.
+    """
+    prev_col, page_col, next_col = st.columns([1, 2, 1])
+    with prev_col:
+        st.button("◀ Previous", key=f"{key}_previous", on_click=paginator.previous, disabled=not paginator.has_previous())
+    with page_col:
+        st.markdown(f"<p style='text-align: center; color: var(--text-color);'>Page {paginator.page_number}</p>", unsafe_allow_html=True)
+    with next_col:
+        st.button("Next ▶", key=f"{key}_next", on_click=paginator.next, disabled=not paginator.current().has_more)
+
+def record_llm_timings(name, timings):
+    """
+    Keeps the timings of this session's recent streamed completions.
+    """
+    history = st.session_state.setdefault('llm_timings', [])
+    history.append({"name": name, **timings})
+    del history[:-50]
+
+def debug_panel(rerun):
+    """
+    Renders the opt-in sidebar panel with this rerun's timing spans and per-page percentiles.
+    """
+    if not DEBUG_PANEL or not st.sidebar.toggle("Show performance panel", key="debug_panel"):
+        return
+    import pandas as pd
+    with st.sidebar.expander("⏱️ Performance", expanded=True):
+        spans = rerun['spans'] if rerun else []
+        st.caption(f"This rerun: {rerun['seconds'] * 1000:.0f} ms, {len(spans)} spans" if rerun else "No rerun recorded.")
+        if spans:
+            spans_df = pd.DataFrame(spans)
+            spans_df['ms'] = spans_df['seconds'] * 1000
+            columns = [column for column in ['kind', 'name', 'ms', 'documents', 'writes', 'bytes', 'rows', 'prompt_tokens', 'completion_tokens', 'error'] if column in spans_df]
+            st.dataframe(spans_df[columns].style.format({'ms': "{:.1f}"}, na_rep=""), use_container_width=True)
+        summary = tracer.summary()
+        if summary:
+            st.markdown("**All pages (recent spans)**")
+            summary_df = pd.DataFrame(summary)
+            st.dataframe(summary_df[['page', 'kind', 'name', 'count', 'p50_ms', 'p90_ms', 'p99_ms', 'documents', 'bytes', 'prompt_tokens', 'completion_tokens']].style.format({'p50_ms': "{:.1f}", 'p90_ms': "{:.1f}", 'p99_ms': "{:.1f}"}), use_container_width=True)
+        gateway = init_groq().stats()
+        st.caption(
+            f"LLM gateway: {gateway['active']} active, {gateway['queue_depth']} queued (max {gateway['max_queue_depth']}), "
+            f"{gateway['coalesced']}/{gateway['requests']} coalesced, {gateway['retries']} retries, {gateway['timeouts']} timeouts"
+        )
+        writes = init_write_queue().stats()
+        lag = "n/a" if writes['lag_p95_ms'] is None else f"{writes['lag_p95_ms']:.0f} ms"
+        st.caption(
+            f"Write queue: {writes['queue_depth']} queued, {writes['pending']} pending, {writes['failed']} failed, "
+            f"{writes['written']} written in {writes['commits']} commits, {writes['retries']} retries, p95 lag {lag}"
+        )
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("JSONL", tracer.export_jsonl(), file_name="finance_manager_spans.jsonl", mime="application/jsonl", key="debug_export_jsonl")
+        with col2:
+            st.download_button("Prometheus", tracer.prometheus(), file_name="finance_manager_metrics.prom", mime="text/plain", key="debug_export_prometheus")
 
 # --- Main App ---
 def main():
@@ -65,7 +395,12 @@ def main():
         st.session_state.user = None
 
     if st.session_state.user:
-        app()
+        tracer.begin_rerun(st.session_state.get('page', PAGES[0]))
+        try:
+            app()
+        finally:
+            rerun = tracer.end_rerun()
+        debug_panel(rerun)
     else:
         login_signup()
 
@@ -98,7 +433,7 @@ def login_signup():
                 password = st.text_input("🔒 Password", type="password", placeholder="Enter your password")
                 if st.button("Login", use_container_width=True, type="primary"):
                     try:
-                        user = auth.sign_in_with_email_and_password(email, password)
+                        user = init_auth().sign_in_with_email_and_password(email, password)
                         st.session_state.user = user
                         st.rerun()
                     except Exception as e:
@@ -110,10 +445,11 @@ def login_signup():
                 password = st.text_input("🔒 Password", type="password", placeholder="Create a password")
                 if st.button("Sign Up", use_container_width=True, type="primary"):
                     try:
-                        user = auth.create_user_with_email_and_password(email, password)
+                        user = init_auth().create_user_with_email_and_password(email, password)
                         st.session_state.user = user
                         # Create user profile in Firestore
-                        user_ref = db.collection('users').document(user['localId'])
+                        from firebase_admin import firestore
+                        user_ref = init_firestore().collection('users').document(user['localId'])
                         user_ref.set({
                             "email": email,
                             "created_at": firestore.SERVER_TIMESTAMP,
@@ -123,14 +459,130 @@ def login_signup():
                     except Exception as e:
                         st.error(f"Signup failed: {e}")
 
+def statement_import_panel(user_id, key):
+    """
+    Renders the bulk CSV import for bank statements.
+    Negative amounts (or debits) become expenses and positive amounts (or credits) become incomes.
+    """
+    with st.expander("📥 Import Bank Statement (CSV)"):
+        st.caption("Columns: date, description and amount (or debit/credit). An optional type column can mark rows as income or expense. Rows you already have are skipped.")
+        uploaded_file = st.file_uploader("Statement CSV", type=["csv"], key=f"{key}_statement_file")
+        if uploaded_file is not None and st.button("Import", type="primary", key=f"{key}_statement_import"):
+            progress_bar = st.progress(0.0, text="Importing...")
+
+            def on_progress(rows_done, total_rows, elapsed):
+                fraction = min(rows_done / total_rows, 1.0) if total_rows else 1.0
+                progress_bar.progress(fraction, text=f"Imported {rows_done}/{total_rows} rows ({rows_done / max(elapsed, 1e-6):.0f} rows/s)")
+
+            from app_files.importer import existing_hashes, import_statement
+            db, ledger_store = init_firestore(), init_ledger_store()
+            known_hashes = existing_hashes(load_ledger(db, ledger_store, user_id, 'incomes').to_rows(), load_ledger(db, ledger_store, user_id, 'expenses').to_rows())
+            try:
+                summary = import_statement(init_firestore(), init_categorizer(), user_id, uploaded_file, known_hashes, on_progress=on_progress)
+            except ValueError as e:
+                st.error(f"Import failed: {e}")
+                return
+            finally:
+                invalidate_ledger(user_id, 'incomes', 'expenses', 'rollups')
+                get_paginator(user_id, 'incomes').reset()
+                get_paginator(user_id, 'expenses').reset()
+            st.success(
+                f"Imported {summary['incomes']} incomes and {summary['expenses']} expenses in {summary['seconds']:.1f}s "
+                f"({summary['rows'] / max(summary['seconds'], 1e-6):.0f} rows/s, {summary['batches']} batch writes). "
+                f"Skipped {summary['duplicates']} duplicates and {summary['skipped']} unreadable rows."
+            )
+
+def export_panel(user_id):
+    """
+    Renders the full-history export. The chosen incomes and/or expenses are paged through
+    and written to a CSV or Parquet file in the background; once the file is ready it can
+    be prepared (read) and downloaded.
+    """
+    from app_files.categories import CATEGORIES
+    from app_files.export import EXPORT_FORMATS, ExportJob
+    export_data = {"Incomes and expenses": ('incomes', 'expenses'), "Expenses": ('expenses',), "Incomes": ('incomes',)}
+    with st.form("export_form"):
+        data = st.selectbox("Data", list(export_data))
+        export_format = st.selectbox("Format", list(EXPORT_FORMATS))
+        date_range = st.date_input("Date range", value=[], key="export_date_range")
+        category = st.selectbox("Category (expenses only)", ["All"] + CATEGORIES)
+        submitted = st.form_submit_button("Export", type="primary")
+    if submitted:
+        previous = st.session_state.pop('export_job', None)
+        if previous is not None:
+            previous.discard()
+        filters = date_range_filters(date_range)
+        if category != "All":
+            filters['category'] = category
+        st.session_state.export_job = ExportJob(init_ledger_store(), user_id, export_format, export_data[data], **filters).start()
+
+    job = st.session_state.get('export_job')
+    if job is None or job.user_id != user_id:
+        return
+    running = not job.done()
+
+    @st.fragment(run_every=1 if running else None)
+    def progress():
+        if running and job.done():
+            # Rerun the page so this fragment stops polling
+            st.rerun()
+        if not job.done():
+            st.info(f"Exporting... {job.rows:,} rows so far.")
+        elif job.error:
+            st.error(f"Export failed: {job.error}")
+        elif job.path is not None:
+            st.success(f"Exported {job.rows:,} rows in {job.seconds:.1f}s.")
+            # The file is read once, when asked for, and dropped again after the download
+            if job.data is None:
+                st.button(f"Prepare {job.file_name}", on_click=job.load, key="export_prepare")
+            else:
+                st.download_button(f"Download {job.file_name}", job.data, file_name=job.file_name, mime=job.mime, on_click=job.release, key="export_download")
+
+    progress()
+
 def app():
     """
     The main application logic after the user has logged in.
     """
+    # Deferred from startup: the first signed-in render pays for these, the login page does not
+    import altair as alt
+    import pandas as pd
+    from firebase_admin import firestore
+    from app_files.advisor_context import AdvisorIndex, build_context, estimate_tokens
+    from app_files.analytics import build_cash_flow_index, net_flow_since, rollup_category_totals
+    from app_files.chart_data import DEFAULT_GRANULARITY, GRANULARITIES, category_frame, trend_frame
+    from app_files.categories import CATEGORIES
+    from app_files.columnar import ColumnarLedger
+    from app_files.forecast import HORIZON_MONTHS, forecast_goals
+    from app_files.llm import MODEL, completion_cache_key, format_timings, new_timings, stream_chat
+    from app_files.pagination import DEFAULT_PAGE_SIZE, PAGE_SIZES
+    from app_files.replica import stage_delete
+    from app_files.query_router import route_query
+    from app_files.rollups import delete_transaction, ensure_rollups, rebuild_rollups
+
     user_id = st.session_state.user['localId']
+    db = init_firestore()
+    ledger_store = init_ledger_store()
     user_ref = db.collection('users').document(user_id)
-    user_doc = user_ref.get()
-    user_data = user_doc.to_dict()
+
+    # Keep this user's cached data current with changes made here or on other devices
+    live_updates = init_live_updates()
+    live = live_updates is not None
+    if live:
+        try:
+            live_updates.watch(user_id)
+        except Exception:
+            live = False
+
+    # Taken before any data is read, so results derived from it can be cached under it
+    data_version = ledger_cache.version(user_id)
+
+    # Start the profile read (unless this session has it cached) and the current page's ledger reads together
+    current_page = st.session_state.get('page', PAGES[0])
+    profile = cached_profile(st.session_state, user_id)
+    load_profile = None if profile is not None else (lambda: user_ref.get().to_dict())
+    page_data = start_user_data(load_profile, lambda kind: load_ledger(db, ledger_store, user_id, kind), PAGE_DATA.get(current_page, ()))
+    user_data = profile if profile is not None else store_profile(st.session_state, user_id, page_data.get('profile'))
 
     # Apply theme
     if user_data and 'theme' in user_data:
@@ -138,33 +590,40 @@ def app():
 
     st.sidebar.title(f"Welcome, {user_data.get('email', '')}!")
     if st.sidebar.button("Logout"):
+        invalidate_profile(st.session_state)
         st.session_state.user = None
         st.rerun()
 
     # --- Sidebar Navigation ---
     st.sidebar.header("Navigation")
-    page = st.sidebar.radio("", ["📊 Dashboard", "💸 Expense Tracker", "💰 Income Manager", "🎯 Savings Goal Planner", "🤖 AI Financial Advisor", "⚙️ Settings"], label_visibility="hidden")
+    page = st.sidebar.radio("", PAGES, label_visibility="hidden", key="page")
 
 
     # --- Page Routing ---
     if page == "📊 Dashboard":
         st.markdown("<h1 style='color: var(--text-color);'>📊 Dashboard</h1>", unsafe_allow_html=True)
         
-        if st.button("Refresh Data", type="secondary"):
-            st.cache_resource.clear()
+        # Listeners keep the data current; without them, offer a manual re-read
+        if not live and st.button("Refresh Data", type="secondary"):
+            # Re-read this user's data; shared caches such as the AI summaries stay warm
+            ledger_cache.invalidate(user_id)
+            ledger_store.mark_stale(user_id)
             st.rerun()
         st.markdown("--- ")
 
-        # Fetch data
-        incomes_ref = db.collection('incomes').where('user_id', '==', user_id).stream()
-        expenses_ref = db.collection('expenses').where('user_id', '==', user_id).stream()
-
-        incomes = [income.to_dict() for income in incomes_ref]
-        expenses = [expense.to_dict() for expense in expenses_ref]
+        # Fetch monthly rollups (one row per month instead of one per transaction)
+        rollups = page_data.get('rollups')
+        if ensure_rollups(db, user_id, user_data):
+            ledger_cache.invalidate(user_id, 'rollups')
+            # The rebuild recorded its version on the user document
+            invalidate_profile(st.session_state)
+            rollups = load_ledger(db, ledger_store, user_id, 'rollups')
+        income_months = [row for row in rollups if row.get('income_count', 0) > 0]
+        expense_months = [row for row in rollups if row.get('expense_count', 0) > 0]
 
         # Calculate metrics
-        total_income = sum([income['amount'] for income in incomes])
-        total_expenses = sum([expense['amount'] for expense in expenses])
+        total_income = sum(row['income_cents'] for row in income_months) / 100
+        total_expenses = sum(row['expense_cents'] for row in expense_months) / 100
         net_income = total_income - total_expenses
 
         st.markdown("<h3 style='color: var(--text-color);'>Overview</h3>", unsafe_allow_html=True)
@@ -178,70 +637,82 @@ def app():
         
         st.markdown("--- ")
 
-        # Trend chart
-        if incomes or expenses:
-            if incomes:
-                income_df = pd.DataFrame(incomes)
-                income_df['date'] = pd.to_datetime(income_df['date'])
-                income_df = income_df.set_index('date').resample('M')['amount'].sum().reset_index()
-                income_df['type'] = 'Income'
-            else:
-                income_df = pd.DataFrame()
-
-            if expenses:
-                expense_df = pd.DataFrame(expenses)
-                expense_df['date'] = pd.to_datetime(expense_df['date'])
-                expense_df = expense_df.set_index('date').resample('M')['amount'].sum().reset_index()
-                expense_df['type'] = 'Expense'
-            else:
-                expense_df = pd.DataFrame()
+        # Charts are built from per-period totals cached with the ledgers, limited to the
+        # chosen window and downsampled, so their size does not depend on the history length
+        incomes, expenses = page_data.get('incomes'), page_data.get('expenses')
+        if income_months or expense_months:
+            col1, col2 = st.columns([1, 2])
+            with col1:
+                granularity = st.selectbox("Granularity", list(GRANULARITIES), index=list(GRANULARITIES).index(DEFAULT_GRANULARITY), key="dashboard_granularity")
+            with col2:
+                window = date_range_filters(st.date_input("Date range", value=[], key="dashboard_date_range"))
 
-            trend_df = pd.concat([income_df, expense_df])
+            # Trend chart
+            with tracer.span("dataframe", "trend", rows=len(incomes) + len(expenses)):
+                trend_df = trend_frame(incomes, expenses, granularity, window.get('start_date'), window.get('end_date'))
 
             st.markdown("<h3 style='color: var(--text-color);'>Income vs. Expense Trend</h3>", unsafe_allow_html=True)
-            st.altair_chart(alt.Chart(trend_df).mark_line().encode(
-                x=alt.X('date:T', title='Date'),
-                y=alt.Y('amount:Q', title='Amount'),
-                color=alt.Color('type:N', legend=alt.Legend(title="Type"))
-            ).properties(
-                title="Monthly Income and Expense Trend"
-            ).interactive(), use_container_width=True)
+            with tracer.span("chart", "trend", rows=len(trend_df)):
+                st.altair_chart(alt.Chart(trend_df).mark_line().encode(
+                    x=alt.X('date:T', title='Date'),
+                    y=alt.Y('amount:Q', title='Amount'),
+                    color=alt.Color('type:N', legend=alt.Legend(title="Type"))
+                ).properties(
+                    title=f"{granularity} Income and Expense Trend"
+                ).interactive(), use_container_width=True)
 
         # Expense distribution
-        if expenses:
-            expense_df = pd.DataFrame(expenses)
-            expense_by_category = expense_df.groupby('category')['amount'].sum().reset_index()
-
-            st.markdown("<h3 style='color: var(--text-color);'>Expense Distribution</h3>", unsafe_allow_html=True)
-            st.altair_chart(alt.Chart(expense_by_category).mark_arc().encode(
-                theta=alt.Theta(field="amount", type="quantitative"),
-                color=alt.Color(field="category", type="nominal", title="Category")
-            ).properties(
-                title="Expense Distribution by Category"
-            ), use_container_width=True)
-
-        # AI-powered insights
+        if expense_months:
+            with tracer.span("dataframe", "expense_distribution", rows=len(expenses)):
+                expense_by_category = category_frame(expenses, window.get('start_date'), window.get('end_date'))
+
+            if not expense_by_category.empty:
+                st.markdown("<h3 style='color: var(--text-color);'>Expense Distribution</h3>", unsafe_allow_html=True)
+                with tracer.span("chart", "expense_distribution", rows=len(expense_by_category)):
+                    st.altair_chart(alt.Chart(expense_by_category).mark_arc().encode(
+                        theta=alt.Theta(field="amount", type="quantitative"),
+                        color=alt.Color(field="category", type="nominal", title="Category")
+                    ).properties(
+                        title="Expense Distribution by Category"
+                    ), use_container_width=True)
+
+        # AI-powered insights (from the all-time totals)
+        category_totals = rollup_category_totals(expense_months)
         if total_income > 0 or total_expenses > 0:
             st.markdown("<h3 style='color: var(--text-color);'>AI Financial Summary</h3>", unsafe_allow_html=True)
             with st.container(border=True):
-                with st.spinner("Generating summary..."):
+                # The summary only depends on the aggregates, so identical aggregates reuse it
+                summary_inputs = {
+                    "total_income": round(total_income, 2),
+                    "total_expenses": round(total_expenses, 2),
+                    "expenses_by_category": {category: round(amount, 2) for category, amount in sorted(category_totals.items())},
+                }
+                summary_key = completion_cache_key(MODEL, SUMMARY_PROMPT, summary_inputs)
+                summary_cache = init_summary_cache()
+                summary = summary_cache.get(summary_key)
+                if summary is not None:
+                    st.write(summary)
+                else:
                     messages = [
                         {
                             "role": "user",
-                            "content": f"Here is my financial data:\n- Total Income: {total_income}\n- Total Expenses: {total_expenses}\n- Expenses by Category: {expense_by_category.to_dict() if expenses else {}}\n\nProvide a brief summary of my financial health and one actionable tip.",
+                            "content": SUMMARY_PROMPT.format(**summary_inputs),
                         }
                     ]
-                    chat_completion = groq_client.chat.completions.create(
-                        messages=messages,
-                        model="meta-llama/llama-4-scout-17b-16e-instruct",
-                    )
-                    summary = chat_completion.choices[0].message.content
-                    st.write(summary)
+                    # Stream the summary so the first sentences show up right away
+                    timings = new_timings()
+                    summary = st.write_stream(stream_chat(init_groq(), messages, timings))
+                    record_llm_timings("dashboard_summary", timings)
+                    if timings["status"] == "complete":
+                        summary_cache.put(summary_key, summary)
 
     elif page == "💸 Expense Tracker":
         st.markdown("<h1 style='color: var(--text-color);'>💸 Expense Tracker</h1>", unsafe_allow_html=True)
         st.markdown("--- ")
 
+        # Read this user's category memo while the form is being filled in
+        init_categorizer().preload(user_id)
+
         col1, col2 = st.columns([1,2])
         with col1:
             with st.container(border=True):
@@ -254,61 +725,65 @@ def app():
 
                     if submitted:
                         if description and amount and date:
-                            # Use Groq to categorize the expense
-                            with st.spinner("Categorizing expense..."):
-                                prompt = f"Categorize the following expense into one of these categories: Food, Transportation, Entertainment, Utilities, Shopping, Health, Other. Expense: {description}"
-                                chat_completion = groq_client.chat.completions.create(
-                                    messages=[
-                                        {
-                                            "role": "user",
-                                            "content": prompt,
-                                        }
-                                    ],
-                                model="meta-llama/llama-4-scout-17b-16e-instruct",
-                                )
-                                category = chat_completion.choices[0].message.content.strip()
-
-                            # Save the expense to Firebase
+                            # Categorized and saved to Firebase in the background; listed as pending until then
                             expense_data = {
                                 "user_id": user_id,
                                 "description": description,
                                 "amount": amount,
                                 "date": str(date),
-                                "category": category,
                                 "created_at": firestore.SERVER_TIMESTAMP
                             }
-                            db.collection('expenses').add(expense_data)
-                            st.success("Expense added successfully!")
+                            init_write_queue().submit(user_id, 'expenses', expense_data)
+                            get_paginator(user_id, 'expenses').reset()
                             st.rerun()
                         else:
                             st.error("Please fill out all the fields.")
+                statement_import_panel(user_id, "expenses")
+                categorizer_stats = init_categorizer().stats()
+                if categorizer_stats['total']:
+                    st.caption(f"Auto-categorization: {categorizer_stats['memo_hit_rate']:.0%} from cache, {categorizer_stats['classifier_hit_rate']:.0%} by keywords, {categorizer_stats['rates']['llm']:.0%} by AI ({categorizer_stats['total']} expenses)")
         with col2:
             with st.container(border=True):
                 st.markdown("<h3 style='color: var(--text-color);'>Your Expenses</h3>", unsafe_allow_html=True)
-                # Display expenses
-                expenses_ref = db.collection('expenses').where('user_id', '==', user_id).order_by('date', direction=firestore.Query.DESCENDING).stream()
-                expenses = [{**expense.to_dict(), "id": expense.id} for expense in expenses_ref]
+                pending_writes_panel(user_id, 'expenses')
+                # Display expenses one page at a time, filtered on the server
+                filter_col1, filter_col2, filter_col3 = st.columns([2, 2, 1])
+                with filter_col1:
+                    date_range = st.date_input("Date range", value=[], key="expenses_date_range")
+                with filter_col2:
+                    category_filter = st.selectbox("Category", ["All"] + CATEGORIES, key="expenses_category_filter")
+                with filter_col3:
+                    page_size = st.selectbox("Rows per page", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE), key="expenses_page_size")
+                filters = date_range_filters(date_range)
+                if category_filter != "All":
+                    filters['category'] = category_filter
+                expenses_paginator = get_paginator(user_id, 'expenses')
+                expenses_paginator.configure(page_size, **filters)
+                expenses = expenses_paginator.current().rows
 
                 if expenses:
-                    # Create a DataFrame for better display and sorting
-                    expenses_df = pd.DataFrame(expenses)
-                    expenses_df['date'] = pd.to_datetime(expenses_df['date'])
-                    expenses_df = expenses_df.sort_values(by='date', ascending=False).reset_index(drop=True)
+                    # Typed columns (dates, exact amounts) for display, newest first
+                    with tracer.span("dataframe", "expenses_table", rows=len(expenses)):
+                        expenses_df = ColumnarLedger.from_rows(expenses).frame()
 
                     st.dataframe(expenses_df[['date', 'description', 'category', 'amount']].style.format({'amount': "{:.2f}"}), use_container_width=True)
+                    pagination_controls(expenses_paginator, 'expenses')
 
                     st.markdown("--- ")
                     st.markdown("<h4 style='color: var(--text-color);'>Delete Expense</h4>", unsafe_allow_html=True)
-                    expense_to_delete = st.selectbox("Select expense to delete:", options=expenses_df['description'] + " - " + expenses_df['amount'].astype(str) + " - " + expenses_df['date'].dt.strftime('%Y-%m-%d'), index=None)
+                    expenses_by_id = {expense['id']: expense for expense in expenses}
+                    selected_expense_id = st.selectbox("Select expense to delete:", options=list(expenses_by_id), format_func=lambda expense_id: f"{expenses_by_id[expense_id]['description']} - {expenses_by_id[expense_id]['amount']} - {expenses_by_id[expense_id]['date']}", index=None)
                     if st.button("Delete Selected Expense", type="secondary"):
-                        if expense_to_delete:
-                            # Find the ID of the selected expense
-                            selected_expense_id = expenses_df[expenses_df.apply(lambda x: x['description'] + " - " + str(x['amount']) + " - " + x['date'].strftime('%Y-%m-%d') == expense_to_delete, axis=1)]['id'].iloc[0]
-                            db.collection('expenses').document(selected_expense_id).delete()
+                        if selected_expense_id:
+                            delete_transaction(db, user_id, 'expenses', expenses_by_id[selected_expense_id])
+                            apply_ledger_write(user_id, 'expenses', deleted_ids=[selected_expense_id])
+                            expenses_paginator.refresh()
                             st.success("Expense deleted successfully!")
                             st.rerun()
                         else:
                             st.warning("Please select an expense to delete.")
+                elif filters or expenses_paginator.page_number > 1:
+                    st.info("No expenses match these filters.")
                 else:
                     st.info("You haven't added any expenses yet.")
 
@@ -327,7 +802,7 @@ def app():
 
                     if submitted:
                         if description and amount and date:
-                            # Save the income to Firebase
+                            # Saved to Firebase in the background; listed as pending until then
                             income_data = {
                                 "user_id": user_id,
                                 "description": description,
@@ -335,38 +810,50 @@ def app():
                                 "date": str(date),
                                 "created_at": firestore.SERVER_TIMESTAMP
                             }
-                            db.collection('incomes').add(income_data)
-                            st.success("Income added successfully!")
+                            init_write_queue().submit(user_id, 'incomes', income_data)
+                            get_paginator(user_id, 'incomes').reset()
                             st.rerun()
                         else:
                             st.error("Please fill out all the fields.")
+                statement_import_panel(user_id, "incomes")
         with col2:
             with st.container(border=True):
                 st.markdown("<h3 style='color: var(--text-color);'>Your Incomes</h3>", unsafe_allow_html=True)
-                # Display incomes
-                incomes_ref = db.collection('incomes').where('user_id', '==', user_id).order_by('date', direction=firestore.Query.DESCENDING).stream()
-                incomes = [{**income.to_dict(), "id": income.id} for income in incomes_ref]
+                pending_writes_panel(user_id, 'incomes')
+                # Display incomes one page at a time, filtered on the server
+                filter_col1, filter_col2 = st.columns([4, 1])
+                with filter_col1:
+                    date_range = st.date_input("Date range", value=[], key="incomes_date_range")
+                with filter_col2:
+                    page_size = st.selectbox("Rows per page", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE), key="incomes_page_size")
+                filters = date_range_filters(date_range)
+                incomes_paginator = get_paginator(user_id, 'incomes')
+                incomes_paginator.configure(page_size, **filters)
+                incomes = incomes_paginator.current().rows
 
                 if incomes:
-                    # Create a DataFrame for better display and sorting
-                    incomes_df = pd.DataFrame(incomes)
-                    incomes_df['date'] = pd.to_datetime(incomes_df['date'])
-                    incomes_df = incomes_df.sort_values(by='date', ascending=False).reset_index(drop=True)
+                    # Typed columns (dates, exact amounts) for display, newest first
+                    with tracer.span("dataframe", "incomes_table", rows=len(incomes)):
+                        incomes_df = ColumnarLedger.from_rows(incomes).frame()
 
                     st.dataframe(incomes_df[['date', 'description', 'amount']].style.format({'amount': "{:.2f}"}), use_container_width=True)
+                    pagination_controls(incomes_paginator, 'incomes')
 
                     st.markdown("--- ")
                     st.markdown("<h4 style='color: var(--text-color);'>Delete Income</h4>", unsafe_allow_html=True)
-                    income_to_delete = st.selectbox("Select income to delete:", options=incomes_df['description'] + " - " + incomes_df['amount'].astype(str) + " - " + incomes_df['date'].dt.strftime('%Y-%m-%d'), index=None)
+                    incomes_by_id = {income['id']: income for income in incomes}
+                    selected_income_id = st.selectbox("Select income to delete:", options=list(incomes_by_id), format_func=lambda income_id: f"{incomes_by_id[income_id]['description']} - {incomes_by_id[income_id]['amount']} - {incomes_by_id[income_id]['date']}", index=None)
                     if st.button("Delete Selected Income", type="secondary"):
-                        if income_to_delete:
-                            # Find the ID of the selected income
-                            selected_income_id = incomes_df[incomes_df.apply(lambda x: x['description'] + " - " + str(x['amount']) + " - " + x['date'].strftime('%Y-%m-%d') == income_to_delete, axis=1)]['id'].iloc[0]
-                            db.collection('incomes').document(selected_income_id).delete()
+                        if selected_income_id:
+                            delete_transaction(db, user_id, 'incomes', incomes_by_id[selected_income_id])
+                            apply_ledger_write(user_id, 'incomes', deleted_ids=[selected_income_id])
+                            incomes_paginator.refresh()
                             st.success("Income deleted successfully!")
                             st.rerun()
                         else:
                             st.warning("Please select an income to delete.")
+                elif filters or incomes_paginator.page_number > 1:
+                    st.info("No incomes match these filters.")
                 else:
                     st.info("You haven't added any income yet.")
 
@@ -397,9 +884,11 @@ def app():
                                     "price": price,
                                     "target_date": str(target_date),
                                     "monthly_saving": monthly_saving,
-                                    "created_at": firestore.SERVER_TIMESTAMP
+                                    "created_at": firestore.SERVER_TIMESTAMP,
+                                    "updated_at": firestore.SERVER_TIMESTAMP
                                 }
                                 db.collection('savings_goals').add(goal_data)
+                                invalidate_ledger(user_id, 'savings_goals')
                                 st.success("Savings goal set successfully!")
                                 st.rerun()
                         else:
@@ -408,21 +897,27 @@ def app():
             with st.container(border=True):
                 st.markdown("<h3 style='color: var(--text-color);'>Your Savings Goals</h3>", unsafe_allow_html=True)
                 # Display savings goals
-                goals_ref = db.collection('savings_goals').where('user_id', '==', user_id).stream()
-                goals = [{**goal.to_dict(), "id": goal.id} for goal in goals_ref]
+                goals = page_data.get('savings_goals')
 
                 if goals:
+                    # One pass over the user's transactions; each goal is then a binary search
+                    cash_flow_index = build_cash_flow_index(page_data.get('incomes'), page_data.get('expenses'))
+                    # Monte Carlo forecasts for all goals together, recomputed only when the data changes
+                    today = datetime.now().date()
+                    with tracer.span("forecast", "goals", rows=len(goals)):
+                        goal_forecasts = ledger_cache.get(
+                            user_id, ('goal_forecasts', data_version, today),
+                            lambda: forecast_goals(goals, page_data.get('incomes'), page_data.get('expenses'), today),
+                        )
+                    if not goal_forecasts:
+                        st.caption("Forecasts appear once you have a few months of incomes and expenses.")
+                    elif len(goals) > 1:
+                        st.caption("Forecasts fund your goals one at a time in target date order: your savings and each month's net cash flow go to the earliest unfinished goal.")
                     for goal in goals:
                         st.subheader(f"**{goal['product_name']}**")
                         
-                        # Calculate progress
-                        # Fetch incomes and expenses up to the current date for progress calculation
-                        incomes_for_progress_ref = db.collection('incomes').where('user_id', '==', user_id).where('date', '>=', goal['created_at']).stream()
-                        expenses_for_progress_ref = db.collection('expenses').where('user_id', '==', user_id).where('date', '>=', goal['created_at']).stream()
-                        incomes_for_progress = [i.to_dict() for i in incomes_for_progress_ref]
-                        expenses_for_progress = [e.to_dict() for e in expenses_for_progress_ref]
-
-                        total_saved = sum([i['amount'] for i in incomes_for_progress]) - sum([e['amount'] for e in expenses_for_progress])
+                        # Calculate progress from the net cash flow since the goal was created
+                        total_saved = net_flow_since(cash_flow_index, goal.get('created_at'))
                         progress = total_saved / goal['price']
                         if progress < 0: progress = 0
                         if progress > 1: progress = 1
@@ -431,8 +926,19 @@ def app():
                         st.info(f"Saved: {user_data.get('currency', '$')} {total_saved:.2f} / {user_data.get('currency', '$')} {goal['price']:.2f}")
                         st.write(f"Target Date: {goal['target_date']}")
                         st.write(f"Monthly Saving Needed: {user_data.get('currency', '$')} {goal['monthly_saving']:.2f}")
+                        forecast = goal_forecasts.get(goal['id'])
+                        if forecast:
+                            st.write(f"Chance of reaching it by the target date: {forecast['probability']:.0%}")
+                            if forecast['likely_month']:
+                                confident = f", 90% likely by {forecast['confident_month']}" if forecast['confident_month'] else ""
+                                st.caption(f"At your usual monthly net cash flow: likely reached by {forecast['likely_month']}{confident}.")
+                            else:
+                                st.caption(f"At your usual monthly net cash flow, not likely to be reached within {HORIZON_MONTHS // 12} years.")
                         if st.button("Delete Goal", key=f"del_goal_{goal['id']}", type="secondary"):
-                            db.collection('savings_goals').document(goal['id']).delete()
+                            batch = db.batch()
+                            stage_delete(batch, db, user_id, 'savings_goals', goal['id'])
+                            batch.commit()
+                            invalidate_ledger(user_id, 'savings_goals')
                             st.rerun()
                         st.markdown("--- ")
                 else:
@@ -461,57 +967,47 @@ def app():
                 st.session_state.messages.append({"role": "user", "content": prompt})
 
                 with st.spinner("Thinking..."):
-                    # Classify the user's query
-                    classification_prompt = f"Is the following query general or specific to the user\'s financial data? Respond with only one word: \'general\' or \'specific\'.\n\nQuery: {prompt}"
-                    classification_completion = groq_client.chat.completions.create(
-                        messages=[
-                            {
-                                "role": "user",
-                                "content": classification_prompt,
-                            }
-                        ],
-                        model="meta-llama/llama-4-scout-17b-16e-instruct",
-                    )
-                    classification = classification_completion.choices[0].message.content.strip().lower()
+                    # Start fetching the financial context while the query is being classified
+                    advisor_data = start_user_data(None, lambda kind: load_ledger(db, ledger_store, user_id, kind), ('incomes', 'expenses', 'savings_goals'))
+
+                    # Classify the user's query locally; the LLM is only asked when the classifier is unsure
+                    classification, _, _ = route_query(init_groq(), prompt)
 
                     # Generate AI response based on classification
                     system_prompt = "You are a friendly and helpful financial advisor. Your goal is to provide insightful and actionable advice. Be encouraging and supportive."
                     
-                    if "specific" in classification:
-                        # Get financial context
-                        incomes_ref = db.collection('incomes').where('user_id', '==', user_id).stream()
-                        expenses_ref = db.collection('expenses').where('user_id', '==', user_id).stream()
-                        goals_ref = db.collection('savings_goals').where('user_id', '==', user_id).stream()
-
-                        incomes = [income.to_dict() for income in incomes_ref]
-                        expenses = [expense.to_dict() for expense in expenses_ref]
-                        goals = [goal.to_dict() for goal in goals_ref]
-
-                        financial_context = f"Here is the user's financial data:\n- Incomes: {incomes}\n- Expenses: {expenses}\n- Savings Goals: {goals}"
-                        full_prompt = f"{system_prompt}\n\n{financial_context}\n\nUser question: {prompt}"
+                    if classification == "specific":
+                        # Only aggregates and the transactions relevant to the question, within a token budget
+                        incomes = advisor_data.get('incomes')
+                        expenses = advisor_data.get('expenses')
+                        goals = advisor_data.get('savings_goals')
+                        with tracer.span("prompt", "advisor_context", rows=len(incomes) + len(expenses)) as counts:
+                            advisor_index = ledger_cache.get(user_id, ('advisor_index', data_version), lambda: AdvisorIndex(incomes, expenses))
+                            financial_context = build_context(advisor_index, goals, prompt, currency=user_data.get('currency', 'USD'), token_budget=ADVISOR_CONTEXT_TOKENS)
+                            counts['prompt_tokens'] = estimate_tokens(financial_context)
+                        full_prompt = f"{financial_context}\n\nUser question: {prompt}"
                     else:
-                        full_prompt = f"{system_prompt}\n\nUser question: {prompt}"
-
-                    chat_completion = groq_client.chat.completions.create(
-                        messages=[
-                            {
-                                "role": "system",
-                                "content": system_prompt
-                            },
-                            {
-                                "role": "user",
-                                "content": full_prompt,
-                            }
-                        ],
-                        model="meta-llama/llama-4-scout-17b-16e-instruct",
-                    )
-                    response = chat_completion.choices[0].message.content
-
-                    # Display assistant response in chat message container
-                    with st.chat_message("assistant"):
-                        st.markdown(response)
-                    # Add assistant response to chat history
-                    st.session_state.messages.append({"role": "assistant", "content": response})
+                        full_prompt = f"User question: {prompt}"
+
+                messages = [
+                    {
+                        "role": "system",
+                        "content": system_prompt
+                    },
+                    {
+                        "role": "user",
+                        "content": full_prompt,
+                    }
+                ]
+
+                # Stream the assistant response into the chat message container
+                with st.chat_message("assistant"):
+                    timings = new_timings()
+                    response = st.write_stream(stream_chat(init_groq(), messages, timings))
+                    st.caption(format_timings(timings))
+                record_llm_timings("advisor", timings)
+                # Add assistant response to chat history
+                st.session_state.messages.append({"role": "assistant", "content": response})
     
     elif page == "⚙️ Settings":
         st.markdown("<h1 style='color: var(--text-color);'>⚙️ Settings</h1>", unsafe_allow_html=True)
@@ -531,7 +1027,26 @@ def app():
                         "currency": currency,
                         "theme": theme
                     })
+                    invalidate_profile(st.session_state)
                     st.success("Settings updated successfully!")
                     st.rerun()
+
+        with st.container(border=True):
+            st.markdown("<h3 style='color: var(--text-color);'>Dashboard Data</h3>", unsafe_allow_html=True)
+            st.write("Recompute the Dashboard's monthly totals from your transactions and fix any drift.")
+            if st.button("Rebuild Dashboard Totals", type="secondary"):
+                with st.spinner("Rebuilding..."):
+                    drift = rebuild_rollups(db, user_id)
+                ledger_cache.invalidate(user_id, 'rollups')
+                if drift:
+                    st.warning(f"Corrected {len(drift)} drifted value(s).")
+                    st.dataframe(pd.DataFrame(drift, columns=['month', 'field', 'stored', 'expected']), use_container_width=True)
+                else:
+                    st.success("Dashboard totals are up to date.")
+
+        with st.container(border=True):
+            st.markdown("<h3 style='color: var(--text-color);'>Export Data</h3>", unsafe_allow_html=True)
+            st.write("Download your full history, or part of it, as CSV or Parquet.")
+            export_panel(user_id)
 if __name__ == '__main__':
     main()
@@ -0,0 +1,298 @@
+import calendar
+import math
+import re
+import sys
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from app_files.analytics import build_cash_flow_index, net_flow_since, to_date_key
+from app_files.columnar import as_ledger
+
+# Hard cap on the size of the financial context added to an Advisor prompt
+DEFAULT_TOKEN_BUDGET = 1500
+# Rough characters per token for English text and numbers; errs towards overestimating
+CHARS_PER_TOKEN = 3.5
+MONTHS_SHOWN = 12
+TOP_CATEGORIES = 5
+MAX_ROWS = 40
+# Only the most recent matches of each query term are scored, so retrieval cost does not
+# grow with the length of the history
+CANDIDATES_PER_TERM = 500
+
+STOPWORDS = frozenset("""
+    a about after all am an and any are as at be been before by can could did do does for from
+    had has have how i i'm im in is it its me much my of on or our should so than that the their
+    them then there these this those to was we were what when where which who why will with would
+    you your spend spent spending pay paid money many total cost costs
+    last past next day days week weeks month months year years today yesterday
+""".split())
+MONTH_NAMES = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+MONTH_NAMES.update({name.lower(): number for number, name in enumerate(calendar.month_abbr) if name})
+
+_WORD = re.compile(r"[a-z0-9]+")
+_LAST_N = re.compile(r"\b(?:last|past) (\d+) (day|week|month|year)s?\b")
+_MONTH = re.compile(r"\b(" + "|".join(sorted(MONTH_NAMES, key=len, reverse=True)) + r")\b(?: (\d{4}))?")
+_YEAR = re.compile(r"\b(20\d{2}|19\d{2})\b")
+
+
+def estimate_tokens(text):
+    """
+    Estimates how many tokens `text` takes in a prompt.
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _stem(word):
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def terms(text):
+    """
+    Splits text into lowercase, lightly stemmed search terms, without stopwords and month
+    names (periods are handled by question_window()).
+    """
+    return [_stem(word) for word in _WORD.findall(str(text).lower()) if word not in STOPWORDS and word not in MONTH_NAMES]
+
+
+def _add_months(month_start, months):
+    index = month_start.year * 12 + month_start.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def question_window(question, today):
+    """
+    Finds the period a question asks about ("last month", "this year", "in March",
+    "past 30 days", "2024"). Returns (start, end, label) with inclusive dates, or None.
+    """
+    text = str(question).lower()
+    this_month = today.replace(day=1)
+    match = _LAST_N.search(text)
+    if match:
+        count, unit = int(match.group(1)), match.group(2)
+        if unit == 'month':
+            start = _add_months(this_month, -count)
+        elif unit == 'year':
+            start = _add_months(this_month, -12 * count)
+        else:
+            start = today - timedelta(days=count * (7 if unit == 'week' else 1))
+        return start, today, match.group(0)
+    if "today" in text:
+        return today, today, "today"
+    if "yesterday" in text:
+        return today - timedelta(days=1), today - timedelta(days=1), "yesterday"
+    for phrase, start, end in (
+        ("this week", today - timedelta(days=today.weekday()), today),
+        ("last week", today - timedelta(days=today.weekday() + 7), today - timedelta(days=today.weekday() + 1)),
+        ("this month", this_month, today),
+        ("last month", _add_months(this_month, -1), this_month - timedelta(days=1)),
+        ("this year", date(today.year, 1, 1), today),
+        ("last year", date(today.year - 1, 1, 1), date(today.year - 1, 12, 31)),
+    ):
+        if phrase in text:
+            return start, end, phrase
+    match = _MONTH.search(text)
+    # "may" is too common a word to be read as the month on its own
+    if match and (match.group(1) != "may" or match.group(2)):
+        month = MONTH_NAMES[match.group(1)]
+        year = int(match.group(2)) if match.group(2) else (today.year if month <= today.month else today.year - 1)
+        start = date(year, month, 1)
+        return start, _add_months(start, 1) - timedelta(days=1), start.strftime("%B %Y")
+    match = _YEAR.search(text)
+    if match:
+        year = int(match.group(1))
+        return date(year, 1, 1), date(year, 12, 31), str(year)
+    return None
+
+
+class AdvisorIndex:
+    """
+    Search index over a user's incomes and expenses for the AI Advisor, plus the aggregates
+    its prompts summarize. Built once per version of the user's data and shared, read-only.
+
+    Every transaction is indexed under the terms of its description, its category and its
+    kind ("income" or "expense"). Postings hold ledger positions, which are in date order,
+    so a date window is a range of each posting list.
+    """
+
+    def __init__(self, incomes, expenses):
+        self.ledgers = {'income': as_ledger(incomes), 'expense': as_ledger(expenses)}
+        self.postings = {}  # term -> {kind: positions}
+        for kind, ledger in self.ledgers.items():
+            # Descriptions and categories repeat a lot; tokenize each distinct pair once
+            description_codes, descriptions = pd.factorize(ledger.descriptions)
+            category_codes = ledger.categories.codes.astype(np.int64) + 1  # 0 when missing
+            codes, pairs = pd.factorize(description_codes * (len(ledger.categories.categories) + 1) + category_codes)
+            term_texts = {}
+            for text_id, pair in enumerate(pairs):
+                description, category = divmod(int(pair), len(ledger.categories.categories) + 1)
+                text = f"{kind} {descriptions[description]} {ledger.categories.categories[category - 1] if category else ''}"
+                for term in set(terms(text)):
+                    term_texts.setdefault(term, []).append(text_id)
+            if not term_texts:
+                continue
+            # Group row positions by distinct text, then each term's rows are a union of groups
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(pairs) + 1))
+            for term, text_ids in term_texts.items():
+                positions = np.sort(np.concatenate([order[bounds[t]:bounds[t + 1]] for t in text_ids]))
+                self.postings.setdefault(term, {})[kind] = positions
+        rows = sum(len(ledger) for ledger in self.ledgers.values())
+        self.idf = {
+            term: math.log((1 + rows) / (1 + sum(len(p) for p in by_kind.values()))) + 1
+            for term, by_kind in self.postings.items()
+        }
+        self.cash_flow = build_cash_flow_index(self.ledgers['income'], self.ledgers['expense'])
+        self.category_totals = self.ledgers['expense'].category_totals()
+        for ledger in self.ledgers.values():
+            # Memoized on the (shared) ledgers, so prompts only look them up
+            ledger.monthly_totals()
+
+    def __sizeof__(self):
+        # The ledgers are shared with the ledger cache and not counted here
+        return (
+            object.__sizeof__(self)
+            + sum(p.nbytes for by_kind in self.postings.values() for p in by_kind.values())
+            + sum(sys.getsizeof(term) for term in self.postings) * 2
+            + sum(a.nbytes for a in self.cash_flow)
+        )
+
+    def bounds(self, kind, window=None):
+        """
+        Returns the (lo, hi) ledger positions of a kind's transactions inside `window`, an
+        optional inclusive (start, end) date range.
+        """
+        ledger = self.ledgers[kind]
+        if window is None:
+            return 0, len(ledger)
+        start, end = (np.datetime64(to_date_key(value), 'D') for value in window)
+        return int(np.searchsorted(ledger.dates, start, side='left')), int(np.searchsorted(ledger.dates, end + 1, side='left'))
+
+    def search(self, question, window=None, limit=MAX_ROWS):
+        """
+        Returns up to `limit` (kind, position) pairs of the transactions that best match the
+        question's terms (TF-IDF), newest first among equal scores. `window` is an optional
+        (start, end) date range. Returns [] when no term matches.
+        """
+        query = terms(question)
+        found = []  # (score, date, kind, position) arrays per kind
+        for kind, ledger in self.ledgers.items():
+            lo, hi = self.bounds(kind, window)
+            positions, weights = [], []
+            for term in set(query):
+                postings = self.postings.get(term, {}).get(kind)
+                if postings is None:
+                    continue
+                inside = postings[np.searchsorted(postings, lo):np.searchsorted(postings, hi)][-CANDIDATES_PER_TERM:]
+                positions.append(inside)
+                weights.append(np.full(len(inside), self.idf[term] * query.count(term)))
+            if positions:
+                positions, inverse = np.unique(np.concatenate(positions), return_inverse=True)
+                scores = np.bincount(inverse, weights=np.concatenate(weights))
+                found.append((scores, ledger.dates[positions].astype(np.int64), np.full(len(positions), kind), positions))
+        if not found:
+            return []
+        scores, dates, kinds, positions = (np.concatenate(column) for column in zip(*found))
+        best = np.lexsort((-dates, -scores))[:limit]
+        return [(str(kinds[i]), int(positions[i])) for i in best]
+
+    def largest(self, window=None, limit=MAX_ROWS):
+        """
+        Returns up to `limit` (kind, position) pairs of the largest expenses inside `window`.
+        """
+        lo, hi = self.bounds('expense', window)
+        cents = self.ledgers['expense'].cents[lo:hi]
+        best = np.argsort(-cents, kind='stable')[:limit] if len(cents) <= limit else np.argpartition(-cents, limit)[:limit]
+        best = best[np.argsort(-cents[best], kind='stable')]
+        return [('expense', lo + int(i)) for i in best]
+
+
+def _money(cents, currency):
+    return f"{currency} {int(cents) / 100:,.2f}"
+
+
+def _monthly_lines(index, currency, months_shown):
+    incomes = dict(zip(*index.ledgers['income'].monthly_totals()))
+    expenses = dict(zip(*index.ledgers['expense'].monthly_totals()))
+    months = sorted(set(incomes) | set(expenses))[-months_shown:]
+    return [
+        f"{month}: income {_money(incomes.get(month, 0), currency)}, expenses {_money(expenses.get(month, 0), currency)}, "
+        f"net {_money(incomes.get(month, 0) - expenses.get(month, 0), currency)}"
+        for month in reversed(months)
+    ]
+
+
+def _category_line(totals, currency, top=TOP_CATEGORIES):
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+    return ", ".join(f"{category} {currency} {amount:,.2f}" for category, amount in ranked)
+
+
+def _goal_lines(index, goals, currency):
+    lines = []
+    for goal in goals or []:
+        saved = net_flow_since(index.cash_flow, goal.get('created_at'))
+        lines.append(
+            f"{goal.get('product_name', 'Goal')}: {currency} {max(saved, 0):,.2f} of {currency} {goal.get('price', 0):,.2f} saved, "
+            f"target {to_date_key(goal.get('target_date'))}, needs {currency} {goal.get('monthly_saving', 0):,.2f}/month"
+        )
+    return lines
+
+
+def _row_line(index, kind, position, currency):
+    ledger = index.ledgers[kind]
+    category = ledger.categories[position]
+    label = f" [{category}]" if isinstance(category, str) else ""
+    return f"{np.datetime_as_string(ledger.dates[position], unit='D')} {kind} {_money(ledger.cents[position], currency)} {ledger.descriptions[position]}{label}"
+
+
+def build_context(index, goals, question, today=None, currency="USD", token_budget=DEFAULT_TOKEN_BUDGET):
+    """
+    Builds the financial context for an Advisor question, never longer than `token_budget`
+    tokens: all-time totals, the period the question asks about, goal status, recent monthly
+    totals, top categories and the transactions that match the question. Sections are added
+    in that order and cut off line by line when the budget runs out.
+    """
+    today = today or date.today()
+    lines, used = [], 0
+
+    def add(line):
+        nonlocal used
+        cost = estimate_tokens(line) + 1
+        if used + cost > token_budget:
+            return False
+        lines.append(line)
+        used += cost
+        return True
+
+    def add_section(title, section_lines):
+        if section_lines and add(title):
+            for line in section_lines:
+                if not add(f"- {line}"):
+                    return
+
+    income, expense = index.ledgers['income'], index.ledgers['expense']
+    add("The user's financial data:")
+    add(f"All time: income {_money(income.cents.sum(), currency)} ({len(income)} transactions), "
+        f"expenses {_money(expense.cents.sum(), currency)} ({len(expense)} transactions), as of {today.isoformat()}.")
+    window = question_window(question, today)
+    if window is not None:
+        start, end, label = window
+        period_income, period_expense = income.between(start, end), expense.between(start, end)
+        add(f"{label.capitalize()} ({start.isoformat()} to {end.isoformat()}): income {_money(period_income.cents.sum(), currency)}, "
+            f"expenses {_money(period_expense.cents.sum(), currency)}; top categories: "
+            f"{_category_line(period_expense.category_totals(), currency) or 'none'}.")
+    add_section("Savings goals:", _goal_lines(index, goals, currency))
+    add_section("Monthly totals, newest first:", _monthly_lines(index, currency, MONTHS_SHOWN))
+    if index.category_totals:
+        add(f"Top expense categories (all time): {_category_line(index.category_totals, currency)}.")
+    matches = index.search(question, window=window[:2] if window else None)
+    if matches:
+        add_section("Transactions matching the question:", [_row_line(index, kind, position, currency) for kind, position in matches])
+    elif window is not None:
+        add_section(f"Largest expenses {window[2]}:", [_row_line(index, kind, position, currency) for kind, position in index.largest(window[:2])])
+    return "\n".join(lines)
@@ -0,0 +1,59 @@
+from datetime import date, datetime
+
+import numpy as np
+
+from app_files.columnar import as_ledger
+
+# Category totals within this of zero (e.g. after deletes) are left out of charts
+ZERO_TOLERANCE = 0.005
+
+
+def to_date_key(value):
+    """
+    Normalizes a transaction `date` string or a Firestore timestamp to a 'YYYY-MM-DD' key.
+    Returns None for missing values.
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)[:10]
+
+
+def build_cash_flow_index(incomes, expenses):
+    """
+    Builds a date-sorted prefix-sum index of net cash flow (incomes minus expenses).
+    `incomes` and `expenses` are ColumnarLedgers or lists of ledger rows.
+    Returns a (dates, prefix) pair of arrays where prefix[i] is the net flow in cents of
+    the first i transactions in date order, so any "since date X" total is one binary search.
+    """
+    incomes, expenses = as_ledger(incomes), as_ledger(expenses)
+    dates = np.concatenate([incomes.dates, expenses.dates])
+    flows = np.concatenate([incomes.cents, -expenses.cents])
+    order = np.argsort(dates, kind='stable')
+    prefix = np.concatenate([[0], np.cumsum(flows[order])])
+    return dates[order], prefix
+
+
+def net_flow_since(index, since):
+    """
+    Returns the net cash flow of all transactions dated on or after `since`.
+    `since` may be a date string, a date or a Firestore timestamp; None means all time.
+    """
+    dates, prefix = index
+    since_key = to_date_key(since)
+    start = 0 if since_key is None else int(np.searchsorted(dates, np.datetime64(since_key, 'D'), side='left'))
+    return int(prefix[-1] - prefix[start]) / 100
+
+
+def rollup_category_totals(expense_months):
+    """
+    Sums the per-category expense totals of rollup rows, dropping categories that net to zero.
+    """
+    totals = {}
+    for row in expense_months:
+        for category, cents in row.get('category_cents', {}).items():
+            totals[category] = totals.get(category, 0) + cents
+    return {category: cents / 100 for category, cents in totals.items() if cents}
@@ -0,0 +1,16 @@
+import re
+
+# Expense categories, in display order; "Other" is the fallback
+CATEGORIES = ["Food", "Transportation", "Entertainment", "Utilities", "Shopping", "Health", "Other"]
+
+_NON_WORD = re.compile(r"[^a-z\s]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_description(description):
+    """
+    Normalizes an expense description for memo lookups: lowercase, no digits or
+    punctuation, single spaces. "Uber #1234 " and "uber" map to the same key.
+    """
+    text = _NON_WORD.sub(" ", str(description).lower())
+    return _SPACES.sub(" ", text).strip()
@@ -0,0 +1,371 @@
+import hashlib
+import logging
+import re
+import threading
+from collections import OrderedDict
+
+from firebase_admin import firestore
+
+from app_files.categories import CATEGORIES, normalize_description
+from app_files.data_fetch import submit
+from app_files.llm import MODEL
+from app_files.replica import MAX_BATCH_WRITES
+
+logger = logging.getLogger(__name__)
+
+# One small document per (scope, description) memo entry; scope is a user id or GLOBAL_SCOPE
+MEMO_COLLECTION = 'category_memos'
+GLOBAL_SCOPE = '__global__'
+
+# Tokens that identify a category on their own. Descriptions are normalized first,
+# so entries are lowercase words without digits or punctuation.
+KEYWORDS = {
+    "Food": {
+        "grocery", "groceries", "supermarket", "restaurant", "dinner", "lunch", "breakfast", "brunch",
+        "cafe", "coffee", "starbucks", "pizza", "burger", "mcdonalds", "kfc", "subway", "sushi",
+        "food", "snacks", "bakery", "takeout", "takeaway", "doordash", "ubereats", "zomato", "swiggy",
+        "deliveroo", "grubhub", "meal", "meals", "tea", "drinks", "bar", "pub", "walmart", "aldi",
+        "lidl", "tesco", "costco", "kroger", "safeway", "wholefoods", "trader", "joes", "fruit", "vegetables",
+    },
+    "Transportation": {
+        "uber", "lyft", "ola", "taxi", "cab", "bus", "train", "metro", "fuel", "gas",
+        "petrol", "diesel", "parking", "toll", "tolls", "flight", "airline", "airfare", "car",
+        "transport", "transit", "commute", "bike", "scooter", "rental", "garage", "mechanic", "tyre",
+        "tire", "railway", "ticket", "tickets", "mta", "shell", "chevron", "bp",
+    },
+    "Entertainment": {
+        "netflix", "spotify", "hulu", "disney", "prime video", "youtube", "movie", "movies", "cinema",
+        "theatre", "theater", "concert", "game", "games", "gaming", "steam", "playstation", "xbox",
+        "nintendo", "music", "festival", "party", "bowling", "museum", "show", "entertainment",
+        "subscription", "hbo", "twitch", "club", "outing",
+    },
+    "Utilities": {
+        "electricity", "electric", "water", "internet", "wifi", "broadband", "phone", "mobile",
+        "utility", "utilities", "bill", "bills", "rent", "heating", "sewage", "trash", "garbage",
+        "verizon", "att", "comcast", "xfinity", "airtel", "jio", "vodafone", "insurance", "mortgage",
+        "council", "recharge", "power",
+    },
+    "Shopping": {
+        "amazon", "flipkart", "ebay", "clothes", "clothing", "shoes", "shirt", "jeans", "dress",
+        "mall", "shopping", "store", "target", "ikea", "furniture", "electronics", "laptop",
+        "headphones", "gift", "gifts", "book", "books", "apparel", "zara", "hm", "nike", "adidas",
+        "decor", "appliance", "gadget", "cosmetics", "makeup",
+    },
+    "Health": {
+        "doctor", "hospital", "clinic", "pharmacy", "medicine", "medicines", "medical", "dentist",
+        "dental", "gym", "fitness", "yoga", "therapy", "therapist", "health", "vitamins", "checkup",
+        "prescription", "optician", "glasses", "lab", "physio", "cvs", "walgreens", "pharmeasy",
+    },
+}
+
+def classify_by_keywords(normalized):
+    """
+    Classifies a normalized description with the keyword table.
+    Returns a category, or None when no category (or more than one) matches best.
+    """
+    tokens = set(normalized.split())
+    padded = f" {normalized} "
+    scores = {}
+    for category, keywords in KEYWORDS.items():
+        score = sum(1 for keyword in keywords if (keyword in tokens if " " not in keyword else f" {keyword} " in padded))
+        if score:
+            scores[category] = score
+    if not scores:
+        return None
+    best = max(scores.values())
+    winners = [category for category, score in scores.items() if score == best]
+    return winners[0] if len(winners) == 1 else None
+
+
+def parse_category(reply):
+    """
+    Maps a free-form LLM reply onto the allowed label set, falling back to "Other".
+    """
+    text = str(reply).strip().lower()
+    for category in CATEGORIES:
+        if text == category.lower():
+            return category
+    for category in CATEGORIES:
+        if re.search(rf"\b{category.lower()}\b", text):
+            return category
+    return "Other"
+
+
+def memo_doc_id(scope, key):
+    """
+    Returns the id of the memo document for a normalized description in a scope.
+    """
+    return f"{scope}_{hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]}"
+
+
+class _Memo:
+    """
+    A bounded least-recently-used mapping of normalized description -> category.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        category = self._entries.get(key)
+        if category is not None:
+            self._entries.move_to_end(key)
+        return category
+
+    def put(self, key, category):
+        self._entries[key] = category
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def update(self, entries):
+        for key, category in entries.items():
+            if category in CATEGORIES:
+                self.put(key, category)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class Categorizer:
+    """
+    Tiered expense categorizer shared by every session in the process.
+
+    1. Memo cache of normalized descriptions, per user and global, persisted in Firestore.
+    2. Local keyword classifier.
+    3. The Groq LLM, constrained to CATEGORIES, only when both of the above miss.
+
+    Each memo is read from Firestore once per process (its most recently used entries, up
+    to the memo's size); preload() starts that read early. New entries are saved in the
+    background on the I/O pool, so categorizing never waits for a Firestore write.
+    """
+
+    def __init__(self, db, groq_client, model=MODEL, max_user_entries=500, max_global_entries=5000, max_users=1000):
+        self.db = db
+        self.groq_client = groq_client
+        self.model = model
+        self.max_user_entries = max_user_entries
+        self.max_global_entries = max_global_entries
+        self.max_users = max_users
+        self._global = None  # Future of the global _Memo
+        self._users = OrderedDict()  # user_id -> Future of the user's _Memo
+        self._unsaved = {}  # memo document id -> data
+        self._save_scheduled = False
+        self._lock = threading.Lock()
+        self.counts = {"user_memo": 0, "global_memo": 0, "keywords": 0, "llm": 0}
+        self.save_errors = 0
+
+    def categorize(self, user_id, description):
+        """
+        Returns the category for an expense description, using the cheapest tier that knows it.
+        """
+        key = normalize_description(description)
+        category, tier = self._lookup(user_id, key)
+        if category is None:
+            category = self._ask_llm(description)
+            tier = "llm"
+        self._remember(user_id, key, category, persist_global=(tier == "llm"))
+        with self._lock:
+            self.counts[tier] += 1
+        return category
+
+    def categorize_many(self, user_id, descriptions, batch_size=25):
+        """
+        Categorizes many descriptions at once (e.g. a statement import).
+        Each distinct normalized description is resolved once; the ones no local tier
+        knows are sent to the LLM `batch_size` per prompt. Returns description -> category.
+        """
+        by_key = {}
+        for description in descriptions:
+            by_key.setdefault(normalize_description(description), []).append(description)
+
+        resolved = {}
+        unknown = []
+        for key in by_key:
+            category, tier = self._lookup(user_id, key)
+            if category is None:
+                unknown.append(key)
+            else:
+                resolved[key] = category
+                with self._lock:
+                    self.counts[tier] += 1
+        for start in range(0, len(unknown), batch_size):
+            chunk = unknown[start:start + batch_size]
+            categories = self._ask_llm_batch([by_key[key][0] for key in chunk])
+            for key, category in zip(chunk, categories):
+                resolved[key] = category
+                with self._lock:
+                    self.counts["llm"] += 1
+        self._remember_many(user_id, resolved, llm_keys=set(unknown))
+        return {description: resolved[key] for key, originals in by_key.items() for description in originals}
+
+    def preload(self, user_id):
+        """
+        Starts reading the user's memo and the global memo in the background, if they
+        have not been read yet, so the next categorization does not wait for them.
+        """
+        self._memo_future(user_id)
+        self._global_future()
+
+    def save_memos(self):
+        """
+        Writes the memo entries learned since the last save. Runs on the I/O pool after
+        new entries are learned; returns the number of entries written.
+        """
+        with self._lock:
+            unsaved, self._unsaved = self._unsaved, {}
+            self._save_scheduled = False
+        items = list(unsaved.items())
+        memos = self.db.collection(MEMO_COLLECTION)
+        try:
+            for start in range(0, len(items), MAX_BATCH_WRITES):
+                batch = self.db.batch()
+                for doc_id, data in items[start:start + MAX_BATCH_WRITES]:
+                    batch.set(memos.document(doc_id), {**data, "updated_at": firestore.SERVER_TIMESTAMP})
+                batch.commit()
+        except Exception:
+            # The memos are a cache; an entry that is not saved is learned again later
+            logger.exception("Could not save %d category memo entries", len(items))
+            with self._lock:
+                self.save_errors += 1
+            return 0
+        return len(items)
+
+    def stats(self):
+        """
+        Returns the lookup counts per tier and the share of lookups served without the LLM.
+        """
+        with self._lock:
+            counts = dict(self.counts)
+        total = sum(counts.values())
+        rates = {tier: (count / total if total else 0.0) for tier, count in counts.items()}
+        return {
+            "total": total,
+            "counts": counts,
+            "rates": rates,
+            "memo_hit_rate": rates["user_memo"] + rates["global_memo"],
+            "classifier_hit_rate": rates["keywords"],
+            "local_hit_rate": 1.0 - rates["llm"] if total else 0.0,
+        }
+
+    def _lookup(self, user_id, key):
+        if not key:
+            return "Other", "keywords"
+        user_memo = self._memo_future(user_id).result()
+        global_memo = self._global_future().result()
+        with self._lock:
+            category = user_memo.get(key)
+            if category is not None:
+                return category, "user_memo"
+            category = global_memo.get(key)
+            if category is not None:
+                return category, "global_memo"
+        category = classify_by_keywords(key)
+        if category is not None:
+            return category, "keywords"
+        return None, None
+
+    def _remember(self, user_id, key, category, persist_global):
+        self._remember_many(user_id, {key: category}, llm_keys={key} if persist_global else set())
+
+    def _remember_many(self, user_id, resolved, llm_keys):
+        resolved = {key: category for key, category in resolved.items() if key}
+        user_memo = self._memo_future(user_id).result()
+        global_memo = self._global_future().result()
+        with self._lock:
+            for key, category in resolved.items():
+                if user_memo.get(key) != category:
+                    self._unsaved[memo_doc_id(user_id, key)] = {"scope": user_id, "key": key, "category": category}
+                user_memo.put(key, category)
+                # Only LLM answers are shared with other users; local tiers would find the rest again
+                if key in llm_keys:
+                    self._unsaved[memo_doc_id(GLOBAL_SCOPE, key)] = {"scope": GLOBAL_SCOPE, "key": key, "category": category}
+                global_memo.put(key, category)
+            schedule = bool(self._unsaved) and not self._save_scheduled
+            if schedule:
+                self._save_scheduled = True
+        if schedule:
+            submit(self.save_memos)
+
+    def _memo_future(self, user_id):
+        with self._lock:
+            future = self._users.get(user_id)
+            if future is not None:
+                self._users.move_to_end(user_id)
+                return future
+            future = self._users[user_id] = submit(self._read_memo, user_id, self.max_user_entries)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+            return future
+
+    def _global_future(self):
+        with self._lock:
+            if self._global is None:
+                self._global = submit(self._read_memo, GLOBAL_SCOPE, self.max_global_entries)
+            return self._global
+
+    def _read_memo(self, scope, max_entries):
+        memo = _Memo(max_entries)
+        try:
+            docs = (
+                self.db.collection(MEMO_COLLECTION)
+                .where('scope', '==', scope)
+                .order_by('updated_at', direction=firestore.Query.DESCENDING)
+                .limit(max_entries)
+                .stream()
+            )
+            # Oldest first, so the most recently used entries end up most recent in the LRU
+            memo.update({row['key']: row['category'] for row in reversed([doc.to_dict() for doc in docs])})
+        except Exception:
+            logger.exception("Could not read the category memo for %s; it will be read again", scope)
+            with self._lock:
+                if scope == GLOBAL_SCOPE:
+                    self._global = None
+                else:
+                    self._users.pop(scope, None)
+        return memo
+
+    def _ask_llm(self, description):
+        prompt = (
+            f"Categorize the following expense into exactly one of these categories: {', '.join(CATEGORIES)}. "
+            f"Respond with only the category name.\n\nExpense: {description}"
+        )
+        chat_completion = self.groq_client.chat.completions.create(
+            messages=[
+                {
+                    "role": "user",
+                    "content": prompt,
+                }
+            ],
+            model=self.model,
+            max_tokens=5,
+            temperature=0,
+        )
+        return parse_category(chat_completion.choices[0].message.content)
+
+    def _ask_llm_batch(self, descriptions):
+        if len(descriptions) == 1:
+            return [self._ask_llm(descriptions[0])]
+        numbered = "\n".join(f"{number}. {description}" for number, description in enumerate(descriptions, start=1))
+        prompt = (
+            f"Categorize each of the following expenses into exactly one of these categories: {', '.join(CATEGORIES)}. "
+            f"Respond with one line per expense in the form '<number>. <category>' and nothing else.\n\n{numbered}"
+        )
+        chat_completion = self.groq_client.chat.completions.create(
+            messages=[
+                {
+                    "role": "user",
+                    "content": prompt,
+                }
+            ],
+            model=self.model,
+            max_tokens=8 * len(descriptions) + 16,
+            temperature=0,
+        )
+        categories = ["Other"] * len(descriptions)
+        for line in chat_completion.choices[0].message.content.splitlines():
+            match = re.match(r"\s*(\d+)[.):\-]\s*(.+)", line)
+            if match and 1 <= int(match.group(1)) <= len(descriptions):
+                categories[int(match.group(1)) - 1] = parse_category(match.group(2))
+        return categories
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+from app_files.analytics import ZERO_TOLERANCE, to_date_key
+from app_files.columnar import as_ledger, period_start
+
+# Dashboard granularity choices -> ColumnarLedger period units
+GRANULARITIES = {"Daily": 'D', "Weekly": 'W', "Monthly": 'M', "Yearly": 'Y'}
+DEFAULT_GRANULARITY = "Monthly"
+# Chart sizes are bounded so the payload does not grow with the length of a user's history
+MAX_POINTS = 200
+TOP_CATEGORIES = 6
+OTHER_CATEGORY = "Other"
+
+
+def _period_range(first, last, unit):
+    # Every period from first to last, so series without activity in a period show 0
+    if unit == 'W':
+        return np.arange(first, last + np.timedelta64(7, 'D'), np.timedelta64(7, 'D'))
+    return np.arange(first, last + 1)
+
+
+def downsample(x, y, max_points=MAX_POINTS):
+    """
+    Reduces a line series to at most `max_points` points with Largest-Triangle-Three-Buckets:
+    the first and last points are kept, and from each bucket in between the point forming
+    the largest triangle with its neighbours, which keeps the peaks and dips a line chart shows.
+    `x` must be increasing (numbers or datetime64). Returns the selected (x, y).
+    """
+    n = len(y)
+    if n <= max_points or max_points < 3:
+        return x, y
+    xs = np.asarray(x).view(np.int64).astype(np.float64) if np.asarray(x).dtype.kind == 'M' else np.asarray(x, dtype=np.float64)
+    ys = np.asarray(y, dtype=np.float64)
+    # Bucket edges for the n - 2 points between the first and the last
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for bucket in range(max_points - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        next_lo, next_hi = (edges[bucket + 1], edges[bucket + 2]) if bucket + 2 < len(edges) else (n - 1, n)
+        avg_x, avg_y = xs[next_lo:next_hi].mean(), ys[next_lo:next_hi].mean()
+        areas = np.abs((xs[a] - avg_x) * (ys[lo:hi] - ys[a]) - (xs[a] - xs[lo:hi]) * (avg_y - ys[a]))
+        a = lo + int(np.argmax(areas))
+        selected[bucket + 1] = a
+    return x[selected], y[selected]
+
+
+def trend_frame(incomes, expenses, granularity=DEFAULT_GRANULARITY, start=None, end=None, max_points=MAX_POINTS):
+    """
+    Builds the Dashboard's income/expense trend (date, amount, type) from ColumnarLedgers at
+    "Daily", "Weekly", "Monthly" or "Yearly" granularity, for transactions dated from `start`
+    to `end` (inclusive; None leaves that side open). Each series covers every period of the
+    window and is downsampled to at most `max_points` points. The per-period totals are
+    computed once per ledger, so only the window and downsampling run on each rerun.
+    """
+    unit = GRANULARITIES[granularity]
+    series = [(as_ledger(ledger).period_totals(unit), label) for ledger, label in ((incomes, 'Income'), (expenses, 'Expense'))]
+    series = [(starts, cents, label) for (starts, cents), label in series if len(starts)]
+    if not series:
+        return pd.DataFrame(columns=['date', 'amount', 'type'])
+    first = period_start(np.datetime64(to_date_key(start), 'D'), unit) if start is not None else min(starts[0] for starts, _, _ in series)
+    last = period_start(np.datetime64(to_date_key(end), 'D'), unit) if end is not None else max(starts[-1] for starts, _, _ in series)
+    if last < first:
+        return pd.DataFrame(columns=['date', 'amount', 'type'])
+    periods = _period_range(first, last, unit)
+    frames = []
+    for starts, cents, label in series:
+        inside = slice(np.searchsorted(starts, first, side='left'), np.searchsorted(starts, last, side='right'))
+        totals = np.zeros(len(periods), dtype=np.int64)
+        totals[np.searchsorted(periods, starts[inside])] = cents[inside]
+        dates, totals = downsample(periods, totals, max_points)
+        frames.append(pd.DataFrame({"date": dates.astype('datetime64[s]'), "amount": totals / 100, "type": label}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def top_categories(totals, top=TOP_CATEGORIES):
+    """
+    Returns a (category, amount) DataFrame of the `top` largest category totals, largest first,
+    with all remaining categories (and any existing "Other") summed into one "Other" row.
+    Totals that net to zero are left out.
+    """
+    ranked = sorted(((category, amount) for category, amount in totals.items() if abs(amount) > ZERO_TOLERANCE), key=lambda item: (-item[1], item[0]))
+    named = [item for item in ranked if item[0] != OTHER_CATEGORY][:top]
+    rest = sum(amount for category, amount in ranked if (category, amount) not in named)
+    if abs(rest) > ZERO_TOLERANCE:
+        named.append((OTHER_CATEGORY, rest))
+    return pd.DataFrame(named, columns=['category', 'amount'])
+
+
+def category_frame(expenses, start=None, end=None, top=TOP_CATEGORIES):
+    """
+    Builds the Dashboard's expense distribution (category, amount) for expenses dated from
+    `start` to `end`, as the `top` largest categories plus "Other".
+    """
+    return top_categories(as_ledger(expenses).between(start, end).category_totals(), top)
@@ -0,0 +1,259 @@
+import math
+import sys
+
+import numpy as np
+import pandas as pd
+
+from app_files.categories import CATEGORIES
+
+# Ledger collections the app caches as ColumnarLedgers rather than lists of documents
+COLUMNAR_COLLECTIONS = ('incomes', 'expenses')
+DATE_DTYPE = 'datetime64[s]'
+ID_DTYPE = str
+# Period units for period_totals(): days, weeks (starting Monday), months and years
+PERIOD_UNITS = ('D', 'W', 'M', 'Y')
+
+
+def to_cents(amounts):
+    """
+    Converts amounts in currency units to integer cents, rounding half away from zero.
+    """
+    amounts = np.asarray(amounts, dtype=np.float64)
+    return (np.sign(amounts) * np.floor(np.abs(amounts) * 100 + 0.5)).astype(np.int64)
+
+
+def amount_to_cents(amount):
+    """
+    Converts one amount to integer cents, rounding like to_cents().
+    """
+    cents = math.floor(abs(float(amount)) * 100 + 0.5)
+    return -cents if amount < 0 else cents
+
+
+def _date_key(value):
+    if value is None:
+        return 'NaT'
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()[:10]
+    return str(value)[:10]
+
+
+def period_start(dates, unit):
+    """
+    Returns the start of the period each of `dates` falls in, as datetime64 in the period's
+    own unit ('D', 'M', 'Y'); weeks ('W') start on Monday and are returned as days.
+    """
+    if unit == 'W':
+        days = np.asarray(dates).astype('datetime64[D]')
+        # 1970-01-01 was a Thursday
+        return days - (days.view(np.int64) + 3) % 7
+    return np.asarray(dates).astype(f'datetime64[{unit}]')
+
+
+def _order(ids, dates):
+    # Oldest first; rows on the same day by descending id, so the reversed (newest-first)
+    # view matches the stores' (date DESC, id ASC) order
+    id_rank = np.empty(len(ids), dtype=np.int64)
+    id_rank[np.argsort(ids, kind='stable')] = np.arange(len(ids))
+    return np.lexsort((-id_rank, dates.view(np.int64)))
+
+
+class ColumnarLedger:
+    """
+    An immutable, column-oriented copy of a user's incomes or expenses.
+
+    Rows are kept oldest first in parallel arrays: `ids` (str), `dates` (datetime64),
+    `cents` (int64 amounts in cents), `categories` (a pandas Categorical; missing for
+    incomes) and `descriptions` (objects, with repeated strings shared). Slicing returns
+    views, append()/delete() return new ledgers, and totals are exact integer sums.
+    Ledgers are shared between sessions through the ledger cache, so they are never
+    modified in place; derived per-period totals are computed once and kept with them.
+    """
+
+    __slots__ = ('ids', 'dates', 'cents', 'categories', 'descriptions', '_periods')
+
+    def __init__(self, ids, dates, cents, categories, descriptions):
+        self.ids = ids
+        self.dates = dates
+        self.cents = cents
+        self.categories = categories
+        self.descriptions = descriptions
+        self._periods = {}  # unit -> (starts, cents)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Builds a ledger from ledger rows (dicts with "id", "date", "amount" and optionally
+        "description" and "category"), e.g. as returned by the ledger stores.
+        """
+        rows = list(rows)
+        shared = {}
+        ids = np.array([row.get('id', '') for row in rows], dtype=ID_DTYPE)
+        dates = np.array([_date_key(row.get('date')) for row in rows], dtype='datetime64[D]').astype(DATE_DTYPE)
+        cents = to_cents([row['amount'] for row in rows])
+        descriptions = np.array([shared.setdefault(d, d) for d in (row.get('description', '') for row in rows)], dtype=object)
+        values = [row.get('category') for row in rows]
+        # Categories outside the known list (older data, imports) are kept after the known ones
+        extra = sorted({value for value in values if value is not None and value not in CATEGORIES})
+        categories = pd.Categorical(values, categories=CATEGORIES + extra)
+        return cls._sorted(ids, dates, cents, categories, descriptions)
+
+    @classmethod
+    def _sorted(cls, ids, dates, cents, categories, descriptions):
+        order = _order(ids, dates)
+        return cls(ids[order], dates[order], cents[order], categories.take(order), descriptions[order])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, key):
+        """
+        Selects rows by slice (a zero-copy view), boolean mask or positions.
+        """
+        if isinstance(key, slice):
+            return ColumnarLedger(self.ids[key], self.dates[key], self.cents[key], self.categories[key], self.descriptions[key])
+        key = np.asarray(key)
+        if key.dtype == bool:
+            key = np.flatnonzero(key)
+        return ColumnarLedger(self.ids[key], self.dates[key], self.cents[key], self.categories.take(key), self.descriptions[key])
+
+    def __sizeof__(self):
+        strings = {id(d): d for d in self.descriptions}
+        return (
+            object.__sizeof__(self)
+            + self.ids.nbytes + self.dates.nbytes + self.cents.nbytes + self.descriptions.nbytes
+            + self.categories.codes.nbytes
+            + sum(sys.getsizeof(d) for d in strings.values())
+            + sum(starts.nbytes + cents.nbytes for starts, cents in self._periods.values())
+        )
+
+    @property
+    def amounts(self):
+        """
+        Amounts in currency units (a new float array).
+        """
+        return self.cents / 100
+
+    def newest_first(self):
+        """
+        Returns a reversed zero-copy view, newest row first.
+        """
+        return self[::-1]
+
+    def total(self):
+        """
+        Returns the exact sum of all amounts, in currency units.
+        """
+        return int(self.cents.sum()) / 100
+
+    def append(self, rows):
+        """
+        Returns a new ledger with `rows` (ledger rows with their "id") added.
+        """
+        rows = list(rows)
+        if not rows:
+            return self
+        other = ColumnarLedger.from_rows(rows)
+        # Both sides are sorted by (date, id descending): each new row goes after the older
+        # days and, within its day, after the existing rows with a larger id
+        first = np.searchsorted(self.dates, other.dates, side='left')
+        positions = np.searchsorted(self.dates, other.dates, side='right')
+        for k in np.flatnonzero(positions > first):
+            positions[k] = first[k] + np.count_nonzero(self.ids[first[k]:positions[k]] > other.ids[k])
+        order = np.insert(np.arange(len(self)), positions, np.arange(len(self), len(self) + len(other)))
+        categories = pd.api.types.union_categoricals([self.categories, other.categories], ignore_order=True)
+        return ColumnarLedger(
+            np.concatenate([self.ids, other.ids])[order],
+            np.concatenate([self.dates, other.dates])[order],
+            np.concatenate([self.cents, other.cents])[order],
+            categories.take(order),
+            np.concatenate([self.descriptions, other.descriptions])[order],
+        )
+
+    def between(self, start=None, end=None):
+        """
+        Returns a zero-copy view of the rows dated from `start` to `end` (dates or date strings,
+        both inclusive); None leaves that side open.
+        """
+        lo = 0 if start is None else int(np.searchsorted(self.dates, np.datetime64(_date_key(start), 'D'), side='left'))
+        hi = len(self) if end is None else int(np.searchsorted(self.dates, np.datetime64(_date_key(end), 'D') + 1, side='left'))
+        return self[lo:max(lo, hi)]
+
+    def delete(self, ids):
+        """
+        Returns a new ledger without the rows whose id is in `ids`.
+        """
+        ids = np.asarray(list(ids), dtype=ID_DTYPE)
+        if not len(ids):
+            return self
+        return self[~np.isin(self.ids, ids)]
+
+    def frame(self, newest_first=True):
+        """
+        Returns a DataFrame (date, description, category, amount, id) for tables and charts.
+        The date and category columns reuse the ledger's arrays instead of re-parsing;
+        amounts are converted from cents.
+        """
+        ledger = self.newest_first() if newest_first else self
+        return pd.DataFrame({
+            "date": ledger.dates,
+            "description": ledger.descriptions,
+            "category": ledger.categories,
+            "amount": ledger.amounts,
+            "id": ledger.ids,
+        }, copy=False)
+
+    def to_rows(self, newest_first=True):
+        """
+        Returns the rows as a list of dicts (id, date as 'YYYY-MM-DD', description, category, amount).
+        """
+        ledger = self.newest_first() if newest_first else self
+        dates = np.datetime_as_string(ledger.dates, unit='D')
+        categories = ledger.categories.astype(object)
+        return [
+            {"id": str(i), "date": str(d), "description": desc, "category": c if isinstance(c, str) else None, "amount": int(cents) / 100}
+            for i, d, desc, c, cents in zip(ledger.ids, dates, ledger.descriptions, categories, ledger.cents)
+        ]
+
+    def period_totals(self, unit):
+        """
+        Returns (starts, cents): the distinct periods with rows, as returned by period_start(),
+        and each period's total. Computed once per ledger and unit; the arrays are shared.
+        """
+        totals = self._periods.get(unit)
+        if totals is None:
+            starts = period_start(self.dates, unit)
+            if len(starts):
+                # Rows are sorted by date, so each period is one contiguous run
+                boundaries = np.flatnonzero(np.concatenate([[True], starts[1:] != starts[:-1]]))
+                totals = (starts[boundaries], np.add.reduceat(self.cents, boundaries))
+            else:
+                totals = (starts, np.zeros(0, dtype=np.int64))
+            self._periods[unit] = totals
+        return totals
+
+    def monthly_totals(self):
+        """
+        Returns (months, cents): the distinct months (datetime64[M]) and each month's total.
+        """
+        return self.period_totals('M')
+
+    def category_totals(self):
+        """
+        Returns {category: total in currency units} for categories with any rows.
+        """
+        codes = self.categories.codes
+        known = codes >= 0
+        totals = np.zeros(len(self.categories.categories), dtype=np.int64)
+        np.add.at(totals, codes[known], self.cents[known])
+        counts = np.bincount(codes[known], minlength=len(totals))
+        return {category: int(total) / 100 for category, total, count in zip(self.categories.categories, totals, counts) if count}
+
+
+def as_ledger(value):
+    """
+    Returns `value` as a ColumnarLedger, building one from a list of ledger rows if needed.
+    """
+    if isinstance(value, ColumnarLedger):
+        return value
+    return ColumnarLedger.from_rows(value or [])
@@ -0,0 +1,61 @@
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+LEDGER_KINDS = ('incomes', 'expenses', 'savings_goals', 'rollups')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Returns the process-wide thread pool used for Firestore and Groq I/O.
+    Its size can be tuned with FETCH_WORKERS.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=int(os.environ.get("FETCH_WORKERS", 16)), thread_name_prefix="finance-io")
+        return _executor
+
+
+def submit(fn, *args, **kwargs):
+    """
+    Runs `fn` on the I/O pool and returns its Future.
+    The callable must not use Streamlit APIs; those only work on the script thread.
+    It runs in a copy of the caller's context, so timing spans are attributed to the caller's rerun.
+    """
+    return get_executor().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class PendingUserData:
+    """
+    Reads for a page that are already in flight; get() waits for one of them.
+    """
+
+    def __init__(self, futures):
+        self._futures = futures
+
+    def get(self, name):
+        """
+        Waits for and returns a single result ('profile' or one of LEDGER_KINDS).
+        """
+        return self._futures[name].result()
+
+
+def start_user_data(load_profile, load_kind, kinds=()):
+    """
+    Starts the profile read and one read per ledger kind concurrently.
+    `load_profile()` returns the user document dict, `load_kind(kind)` returns a ledger list.
+    """
+    futures = {}
+    if load_profile is not None:
+        futures['profile'] = submit(load_profile)
+    for kind in kinds:
+        if kind not in LEDGER_KINDS:
+            raise ValueError(f"Unknown ledger kind: {kind}")
+        futures[kind] = submit(load_kind, kind)
+    return PendingUserData(futures)
+
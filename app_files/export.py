@@ -0,0 +1,222 @@
+import csv
+import glob
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import date
+
+from app_files.data_fetch import submit
+
+logger = logging.getLogger(__name__)
+
+# Format -> (file suffix, MIME type)
+EXPORT_FORMATS = {"CSV": (".csv", "text/csv"), "Parquet": (".parquet", "application/vnd.apache.parquet")}
+EXPORT_COLLECTIONS = ('incomes', 'expenses')
+# Rows read per page and written per CSV flush / Parquet row group
+DEFAULT_CHUNK_ROWS = 1000
+COLUMNS = ('type', 'id', 'date', 'description', 'category', 'amount')
+TYPES = {'incomes': "income", 'expenses': "expense"}
+EXPORT_FILE_PREFIX = "finance_manager_export_"
+# Finished exports are deleted after this long, whether or not they were downloaded
+EXPORT_TTL_SECONDS = 60 * 60
+
+
+class ExportCancelled(Exception):
+    """
+    Raised inside an export when it was cancelled.
+    """
+
+
+def export_row(collection, row):
+    """
+    Turns a ledger row into an export row with COLUMNS; dates become datetime.date.
+    """
+    date_key = str(row['date'])[:10] if row.get('date') else None
+    return {
+        "type": TYPES[collection],
+        "id": row['id'],
+        "date": date.fromisoformat(date_key) if date_key else None,
+        "description": row.get('description', ''),
+        "category": row.get('category') if collection == 'expenses' else None,
+        "amount": float(row['amount']),
+    }
+
+
+def iter_chunks(ledger_store, user_id, collections=EXPORT_COLLECTIONS, chunk_rows=DEFAULT_CHUNK_ROWS, start_date=None, end_date=None, category=None):
+    """
+    Yields the user's rows as lists of at most `chunk_rows` export rows, reading each
+    collection newest first one page at a time with the store's cursors, so only one page
+    is held at once. A category filter leaves out incomes, which have no category.
+    """
+    for collection in collections:
+        filters = {"start_date": start_date, "end_date": end_date}
+        if category:
+            if collection != 'expenses':
+                continue
+            filters['category'] = category
+        after = None
+        while True:
+            page = ledger_store.fetch_page(user_id, collection, chunk_rows, after, **filters)
+            if page.rows:
+                yield [export_row(collection, row) for row in page.rows]
+            if not page.has_more:
+                break
+            after = page.cursor
+
+
+def write_csv(chunks, path):
+    """
+    Writes chunks of export rows to a CSV file at `path`. Returns the number of rows.
+    """
+    rows = 0
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=COLUMNS)
+        writer.writeheader()
+        for chunk in chunks:
+            writer.writerows(chunk)
+            rows += len(chunk)
+    return rows
+
+
+def write_parquet(chunks, path):
+    """
+    Writes chunks of export rows to a Parquet file at `path`, one row group per chunk.
+    Returns the number of rows.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("type", pa.string()),
+        ("id", pa.string()),
+        ("date", pa.date32()),
+        ("description", pa.string()),
+        ("category", pa.string()),
+        ("amount", pa.float64()),
+    ])
+    rows = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            rows += len(chunk)
+    return rows
+
+
+WRITERS = {"CSV": write_csv, "Parquet": write_parquet}
+
+
+def cleanup_exports(max_age_seconds=EXPORT_TTL_SECONDS, directory=None):
+    """
+    Deletes export files in the temporary directory older than `max_age_seconds`.
+    Returns the number of files deleted.
+    """
+    cutoff = time.time() - max_age_seconds
+    deleted = 0
+    for path in glob.glob(os.path.join(directory or tempfile.gettempdir(), f"{EXPORT_FILE_PREFIX}*")):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                deleted += 1
+        except OSError:
+            pass
+    return deleted
+
+
+class ExportJob:
+    """
+    One export running on the I/O pool into a temporary file, so the session that started
+    it (and every other session) keeps rendering while it pages through the data.
+    `rows` counts the rows written so far; once done(), `error` is set or `path` holds the
+    finished file. load() reads the file into `data` for one download and release() drops it
+    again. discard() cancels the export and deletes the file; files that are never discarded
+    are removed by cleanup_exports() once EXPORT_TTL_SECONDS old.
+    """
+
+    def __init__(self, ledger_store, user_id, export_format="CSV", collections=EXPORT_COLLECTIONS, chunk_rows=DEFAULT_CHUNK_ROWS, **filters):
+        self.ledger_store = ledger_store
+        self.user_id = user_id
+        self.export_format = export_format
+        self.collections = tuple(collections)
+        self.chunk_rows = chunk_rows
+        self.filters = filters
+        self.rows = 0
+        self.path = None
+        self.error = None
+        self.data = None
+        self.started_at = time.monotonic()
+        self.seconds = None
+        self._cancelled = threading.Event()
+        self._future = None
+
+    @property
+    def file_name(self):
+        return f"finance_manager_{'_'.join(self.collections)}_{date.today().isoformat()}{EXPORT_FORMATS[self.export_format][0]}"
+
+    @property
+    def mime(self):
+        return EXPORT_FORMATS[self.export_format][1]
+
+    def start(self):
+        self._future = submit(self._run)
+        return self
+
+    def done(self):
+        return self._future is not None and self._future.done()
+
+    def load(self):
+        """
+        Reads the finished file into `data`, or sets `error` if it has already been cleaned up.
+        """
+        try:
+            with open(self.path, "rb") as file:
+                self.data = file.read()
+        except OSError:
+            self.path = None
+            self.error = "The export has expired. Please export again."
+
+    def release(self):
+        """
+        Drops the contents read by load(), e.g. once they have been downloaded.
+        """
+        self.data = None
+
+    def discard(self):
+        """
+        Stops the export if it is still running and deletes its file.
+        """
+        self._cancelled.set()
+        self.data = None
+        if self.done() and self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+    def _chunks(self):
+        for chunk in iter_chunks(self.ledger_store, self.user_id, self.collections, self.chunk_rows, **self.filters):
+            if self._cancelled.is_set():
+                raise ExportCancelled()
+            yield chunk
+            self.rows += len(chunk)
+
+    def _run(self):
+        cleanup_exports()
+        fd, path = tempfile.mkstemp(prefix=EXPORT_FILE_PREFIX, suffix=EXPORT_FORMATS[self.export_format][0])
+        os.close(fd)
+        try:
+            WRITERS[self.export_format](self._chunks(), path)
+        except Exception as e:
+            os.remove(path)
+            if not isinstance(e, ExportCancelled):
+                logger.exception("Export failed for %s", self.user_id)
+                self.error = f"{type(e).__name__}: {e}"
+        else:
+            if self._cancelled.is_set():
+                os.remove(path)
+            else:
+                self.path = path
+        finally:
+            self.seconds = time.monotonic() - self.started_at
@@ -1,13 +1,15 @@
 
-import firebase_admin
-from firebase_admin import credentials, firestore
-import pyrebase
 import json
 
+# firebase_admin and pyrebase are imported by the functions that use them, so signing in
+# (Pyrebase) does not pay for loading the Admin SDK and Firestore, and vice versa.
+
 def initialize_firebase(firebase_config):
     """
     Initializes the Firebase app using the service account.
     """
+    import firebase_admin
+    from firebase_admin import credentials
     if not firebase_admin._apps:
         # Extract only the service account credentials for firebase_admin.credentials.Certificate
         service_account_info = {
@@ -30,12 +32,14 @@ def get_firestore_db():
     """
     Returns the Firestore database client.
     """
+    from firebase_admin import firestore
     return firestore.client()
 
 def initialize_pyrebase(firebase_config):
     """
     Initializes Pyrebase for authentication.
     """
+    import pyrebase
     # Use the firebase_config dictionary directly
     firebase = pyrebase.initialize_app(firebase_config)
     return firebase.auth()
@@ -0,0 +1,126 @@
+from datetime import date
+
+import numpy as np
+
+from app_files.analytics import build_cash_flow_index, net_flow_since, to_date_key
+from app_files.columnar import as_ledger
+
+DEFAULT_PATHS = 2000
+LOOKBACK_MONTHS = 24
+# Fewer complete months than this is too little history to forecast from
+MIN_HISTORY_MONTHS = 3
+# Months simulated ahead; targets further out are judged at the horizon
+HORIZON_MONTHS = 120
+# Completion months are reported at these chances of having reached the goal
+LIKELY = 0.5
+CONFIDENT = 0.9
+
+
+def _month(value):
+    return np.datetime64(to_date_key(value)[:7], 'M')
+
+
+def monthly_net_history(incomes, expenses, today, lookback_months=LOOKBACK_MONTHS):
+    """
+    Returns the net cash flow (incomes minus expenses, in cents) of each complete month before
+    `today`'s, oldest first, starting with the first month that has transactions and covering
+    at most the last `lookback_months`. Months without transactions count as 0.
+    """
+    current = _month(today)
+    first = current - lookback_months
+    months, totals = [], []
+    for ledger, sign in ((as_ledger(incomes), 1), (as_ledger(expenses), -1)):
+        starts, cents = ledger.period_totals('M')
+        inside = (starts >= first) & (starts < current)
+        months.append(starts[inside])
+        totals.append(sign * cents[inside])
+    months, totals = np.concatenate(months), np.concatenate(totals)
+    if not len(months):
+        return np.zeros(0, dtype=np.int64)
+    start = months.min()
+    history = np.zeros(int((current - start).astype(int)), dtype=np.int64)
+    np.add.at(history, (months - start).astype(int), totals)
+    return history
+
+
+def simulate_goals(needed, target_months, history, paths=DEFAULT_PATHS, seed=0):
+    """
+    Runs the Monte Carlo for all goals at once. Every path draws its future months' net cash
+    flow from `history` (a bootstrap of past months, in cents), and all goals are measured
+    against the same paths since they are funded from the same cash flow.
+
+    `needed` holds the balance in cents at which each goal counts as reached and `target_months` how many months
+    from now each target falls (0 for this month). Returns (probability, likely, confident):
+    the chance of having saved the amount by the target month, and the first month by which
+    it has been reached on LIKELY and CONFIDENT of the paths (-1 when not within HORIZON_MONTHS).
+    """
+    needed = np.asarray(needed, dtype=np.float64)
+    target_months = np.asarray(target_months, dtype=np.int64)
+    horizon = HORIZON_MONTHS
+    rng = np.random.default_rng(seed)
+    draws = rng.choice(np.asarray(history, dtype=np.float64), size=(paths, horizon))
+    # Best balance reached so far on each path, month 0 (now) included; once a goal's amount
+    # has been set aside it counts as reached even if later months are negative
+    best = np.zeros((paths, horizon + 1))
+    np.maximum.accumulate(np.cumsum(draws, axis=1), axis=1, out=best[:, 1:])
+    np.maximum(best, 0, out=best)
+
+    reached_by_target = best[:, np.clip(target_months, 0, horizon)] >= needed
+    probability = reached_by_target.mean(axis=0)
+    # The share of paths that reached an amount by month m is at least q exactly when the
+    # (1 - q) quantile of `best` at m does; the quantiles grow with m, so this is a search
+    quantiles = np.quantile(best, [1 - LIKELY, 1 - CONFIDENT], axis=0)
+    completion = []
+    for curve in quantiles:
+        months = np.searchsorted(curve, needed, side='left')
+        completion.append(np.where(months > horizon, -1, months))
+    return probability, completion[0], completion[1]
+
+
+def forecast_goals(goals, incomes, expenses, today=None, paths=DEFAULT_PATHS, seed=0):
+    """
+    Forecasts the user's savings goals from their income/expense history.
+    The goals share one cash flow, so they are funded one at a time in target date order:
+    the savings so far (the net cash flow since each goal was created, as on the Goal
+    Planner) and every future month's net cash flow go to the earliest unfinished goal.
+    Returns {goal id: {"saved", "probability", "likely_month", "confident_month"}}, where
+    "saved" is the part of the savings assigned to the goal and the months are 'YYYY-MM'
+    strings or None when not reached within HORIZON_MONTHS, or an empty dict when there
+    are fewer than MIN_HISTORY_MONTHS complete months of history.
+    """
+    today = today or date.today()
+    history = monthly_net_history(incomes, expenses, today)
+    if not goals or len(history) < MIN_HISTORY_MONTHS:
+        return {}
+    index = build_cash_flow_index(incomes, expenses)
+    saved = np.array([net_flow_since(index, goal.get('created_at')) for goal in goals])
+    prices = np.array([goal['price'] for goal in goals], dtype=np.float64)
+    current = _month(today)
+    target_months = np.array([int((_month(goal['target_date']) - current).astype(int)) for goal in goals])
+    order = np.argsort(target_months, kind='stable')
+    # Savings that count towards several goals go to the earliest one first
+    assigned = np.zeros(len(goals))
+    used = 0.0
+    for i in order:
+        assigned[i] = min(max(saved[i] - used, 0), prices[i])
+        used += assigned[i]
+    needed = np.maximum(np.round((prices - assigned) * 100), 0)
+    # A goal is reached once the balance covers it and every goal due before it
+    cumulative = np.empty_like(needed)
+    cumulative[order] = np.cumsum(needed[order])
+    probability, likely, confident = simulate_goals(cumulative, np.maximum(target_months, 0), history, paths=paths, seed=seed)
+    # A target month that has already passed is judged on what has been saved so far
+    probability = np.where(target_months < 0, (needed == 0).astype(float), probability)
+
+    def month_label(months):
+        return None if months < 0 else str(current + int(months))
+
+    return {
+        goal['id']: {
+            "saved": float(assigned[i]),
+            "probability": float(probability[i]),
+            "likely_month": month_label(likely[i]),
+            "confident_month": month_label(confident[i]),
+        }
+        for i, goal in enumerate(goals)
+    }
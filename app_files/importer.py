@@ -0,0 +1,209 @@
+import hashlib
+import re
+import time
+from collections import Counter
+
+import pandas as pd
+from firebase_admin import firestore
+
+from app_files.replica import MAX_BATCH_WRITES
+from app_files.rollups import stage_rollup_updates
+
+CHUNK_ROWS = 2000
+
+_COLUMN_ALIASES = {
+    "date": ("date", "transaction date", "posting date", "posted date", "value date"),
+    "description": ("description", "details", "narration", "memo", "payee", "name", "particulars"),
+    "amount": ("amount", "value", "transaction amount"),
+    "debit": ("debit", "withdrawal", "withdrawals", "money out", "paid out"),
+    "credit": ("credit", "deposit", "deposits", "money in", "paid in"),
+    "type": ("type", "transaction type", "kind"),
+}
+_EXPENSE_TYPES = {"expense", "expenses", "debit", "dr", "withdrawal", "out"}
+_INCOME_TYPES = {"income", "incomes", "credit", "cr", "deposit", "in"}
+
+
+def identity_description(description):
+    """
+    Returns the description as it counts for duplicate detection: lowercase with single
+    spaces. Digits and punctuation are kept, so "Cheque 1001" and "Cheque 1002" differ.
+    """
+    return re.sub(r"\s+", " ", str(description)).strip().lower()
+
+
+def content_hash(collection, date, description, amount, occurrence=0):
+    """
+    Returns a stable hash identifying a transaction by its content.
+    `occurrence` distinguishes genuinely repeated rows (two identical coffees on one day).
+    """
+    key = f"{collection}|{date}|{identity_description(description)}|{round(float(amount), 2):.2f}|{occurrence}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def existing_hashes(incomes, expenses):
+    """
+    Computes the content hashes of the user's existing ledger rows.
+    """
+    hashes = set()
+    for collection, rows in (('incomes', incomes), ('expenses', expenses)):
+        seen = Counter()
+        for row in rows:
+            base = (row['date'], identity_description(row.get('description', '')), round(float(row['amount']), 2))
+            hashes.add(content_hash(collection, row['date'], row.get('description', ''), row['amount'], seen[base]))
+            seen[base] += 1
+    return hashes
+
+
+def count_rows(file):
+    """
+    Counts the data rows of a CSV file without loading it, then rewinds it.
+    """
+    file.seek(0)
+    lines = 0
+    last = b""
+    for block in iter(lambda: file.read(1 << 20), b""):
+        lines += block.count(b"\n")
+        last = block
+    if last and not last.endswith(b"\n"):
+        lines += 1
+    file.seek(0)
+    return max(lines - 1, 0)
+
+
+def _resolve_columns(columns):
+    normalized = {str(column).strip().lower(): column for column in columns}
+    resolved = {}
+    for field, aliases in _COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in normalized:
+                resolved[field] = normalized[alias]
+                break
+    if "date" not in resolved or "description" not in resolved:
+        raise ValueError("The CSV needs a date column and a description column.")
+    if "amount" not in resolved and "debit" not in resolved and "credit" not in resolved:
+        raise ValueError("The CSV needs an amount column, or debit/credit columns.")
+    return resolved
+
+
+def _parse_amounts(series):
+    text = series.astype(str).str.strip()
+    negative = text.str.startswith("(") & text.str.endswith(")")
+    cleaned = text.str.replace(r"[^0-9.\-]", "", regex=True)
+    amounts = pd.to_numeric(cleaned, errors="coerce")
+    return amounts.where(~negative, -amounts.abs())
+
+
+def parse_chunk(chunk, columns):
+    """
+    Turns one CSV chunk into (collection, date, description, amount) tuples.
+    Rows with a type column use it; otherwise negative amounts (or debits) are expenses
+    and positive amounts (or credits) are incomes. Returns (rows, skipped_count).
+    """
+    dates = pd.to_datetime(chunk[columns["date"]], errors="coerce").dt.strftime("%Y-%m-%d")
+    descriptions = chunk[columns["description"]].fillna("").astype(str).str.strip()
+    if "amount" in columns:
+        amounts = _parse_amounts(chunk[columns["amount"]])
+    else:
+        credits = _parse_amounts(chunk[columns["credit"]]).fillna(0) if "credit" in columns else 0
+        debits = _parse_amounts(chunk[columns["debit"]]).fillna(0).abs() if "debit" in columns else 0
+        amounts = credits - debits
+    types = chunk[columns["type"]].fillna("").astype(str).str.strip().str.lower() if "type" in columns else None
+
+    rows = []
+    skipped = 0
+    for position in range(len(chunk)):
+        date, description, amount = dates.iloc[position], descriptions.iloc[position], amounts.iloc[position]
+        if pd.isna(date) or not description or pd.isna(amount) or amount == 0:
+            skipped += 1
+            continue
+        kind = types.iloc[position] if types is not None else ""
+        if kind in _EXPENSE_TYPES:
+            collection = 'expenses'
+        elif kind in _INCOME_TYPES:
+            collection = 'incomes'
+        else:
+            collection = 'expenses' if amount < 0 else 'incomes'
+        rows.append((collection, date, re.sub(r"\s+", " ", description), round(abs(float(amount)), 2)))
+    return rows, skipped
+
+
+def _commit(db, user_id, pending):
+    batch = db.batch()
+    for collection, data in pending:
+        batch.set(db.collection(collection).document(), data)
+    for collection in ('incomes', 'expenses'):
+        stage_rollup_updates(batch, db, user_id, collection, [data for c, data in pending if c == collection])
+    batch.commit()
+
+
+def import_statement(db, categorizer, user_id, file, known_hashes, on_progress=None, chunk_rows=CHUNK_ROWS):
+    """
+    Streams a CSV bank statement into the user's incomes and expenses.
+
+    The file is read `chunk_rows` at a time. Rows whose content hash is already in
+    `known_hashes` (or earlier in the file) are skipped. Expense descriptions are
+    categorized once per distinct description, and documents are written in
+    WriteBatch groups together with their rollup increments.
+    `on_progress(rows_done, total_rows, elapsed_seconds)` is called after every chunk.
+    Returns a summary dict.
+    """
+    started = time.perf_counter()
+    total_rows = count_rows(file)
+    known_hashes = set(known_hashes)
+    occurrences = Counter()
+    summary = {"rows": 0, "incomes": 0, "expenses": 0, "duplicates": 0, "skipped": 0, "batches": 0}
+
+    reader = pd.read_csv(file, chunksize=chunk_rows, dtype=str, skipinitialspace=True)
+    columns = None
+    for chunk in reader:
+        if columns is None:
+            columns = _resolve_columns(chunk.columns)
+        rows, skipped = parse_chunk(chunk, columns)
+        summary["rows"] += len(chunk)
+        summary["skipped"] += skipped
+
+        new_rows = []
+        for collection, date, description, amount in rows:
+            base = (collection, date, identity_description(description), amount)
+            row_hash = content_hash(collection, date, description, amount, occurrences[base])
+            occurrences[base] += 1
+            if row_hash in known_hashes:
+                summary["duplicates"] += 1
+                continue
+            known_hashes.add(row_hash)
+            new_rows.append((collection, date, description, amount, row_hash))
+
+        categories = categorizer.categorize_many(user_id, [row[2] for row in new_rows if row[0] == 'expenses'])
+        pending = []
+        pending_months = set()
+        for collection, date, description, amount, row_hash in new_rows:
+            data = {
+                "user_id": user_id,
+                "description": description,
+                "amount": amount,
+                "date": date,
+                "content_hash": row_hash,
+                "created_at": firestore.SERVER_TIMESTAMP,
+                "updated_at": firestore.SERVER_TIMESTAMP,
+            }
+            if collection == 'expenses':
+                data["category"] = categories[description]
+            pending.append((collection, data))
+            pending_months.add((collection, date[:7]))
+            summary[collection] += 1
+            # One write per document plus one rollup write per (collection, month), so the next
+            # row can add two
+            if len(pending) + len(pending_months) >= MAX_BATCH_WRITES - 1:
+                _commit(db, user_id, pending)
+                summary["batches"] += 1
+                pending = []
+                pending_months = set()
+        if pending:
+            _commit(db, user_id, pending)
+            summary["batches"] += 1
+
+        if on_progress:
+            on_progress(summary["rows"], total_rows, time.perf_counter() - started)
+
+    summary["seconds"] = time.perf_counter() - started
+    return summary
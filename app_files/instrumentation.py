@@ -0,0 +1,469 @@
+"""
+Lightweight timing spans for the app's hot paths.
+
+A Tracer collects spans (kind, name, duration and counts such as documents, bytes and
+tokens). Each Streamlit rerun is bracketed with begin_rerun()/end_rerun(), so spans are
+attributed to the page being rendered, including work done on the I/O pool. The
+Firestore and Groq clients are wrapped in proxies that record a span for every read,
+write and completion; DataFrame construction and chart rendering are wrapped with
+tracer.span() at the call sites.
+"""
+import contextvars
+import itertools
+import json
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+DEFAULT_MAX_SPANS = 20000
+DEFAULT_MAX_RERUNS = 2000
+QUANTILES = (0.5, 0.9, 0.99)
+COUNT_FIELDS = ("documents", "writes", "bytes", "rows", "prompt_tokens", "completion_tokens")
+
+_current_rerun = contextvars.ContextVar("finance_manager_rerun", default=None)
+
+
+def percentile(sorted_values, q):
+    """
+    Nearest-rank percentile of an already sorted list; None when it is empty.
+    """
+    if not sorted_values:
+        return None
+    rank = min(max(math.ceil(q * len(sorted_values)) - 1, 0), len(sorted_values) - 1)
+    return sorted_values[rank]
+
+
+def document_size(data):
+    """
+    Approximates a Firestore document's stored size in bytes (strings count their length
+    plus one, numbers, booleans and timestamps a fixed amount, maps and arrays their contents).
+    """
+    if data is None:
+        return 1
+    if isinstance(data, str):
+        return len(data.encode("utf-8")) + 1
+    if isinstance(data, bool):
+        return 1
+    if isinstance(data, (int, float, datetime)):
+        return 8
+    if isinstance(data, dict):
+        return 32 + sum(len(str(key)) + 1 + document_size(value) for key, value in data.items())
+    if isinstance(data, (list, tuple)):
+        return sum(document_size(value) for value in data)
+    return 8
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class Tracer:
+    """
+    Process-wide, thread-safe collector of timing spans.
+    Keeps the most recent `max_spans` spans and `max_reruns` rerun totals. When `log_path`
+    is set, every finished rerun's spans are appended to it as JSON lines.
+    """
+
+    def __init__(self, max_spans=DEFAULT_MAX_SPANS, max_reruns=DEFAULT_MAX_RERUNS, log_path=None):
+        self.log_path = log_path
+        self._spans = deque(maxlen=max_spans)
+        self._reruns = deque(maxlen=max_reruns)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    # --- Recording ---
+
+    def begin_rerun(self, page):
+        """
+        Starts attributing spans on this thread (and work it submits to the I/O pool) to `page`.
+        """
+        rerun = {"rerun": next(self._ids), "page": page, "started": time.time(), "start": time.perf_counter(), "spans": []}
+        _current_rerun.set(rerun)
+        return rerun
+
+    def end_rerun(self):
+        """
+        Finishes the current rerun and records its total time. Returns the rerun, or None.
+        """
+        rerun = _current_rerun.get()
+        if rerun is None:
+            return None
+        _current_rerun.set(None)
+        rerun["seconds"] = time.perf_counter() - rerun.pop("start")
+        with self._lock:
+            self._reruns.append({key: rerun[key] for key in ("rerun", "page", "started", "seconds")})
+            spans = list(rerun["spans"])
+        if self.log_path:
+            self._append_log(rerun, spans)
+        return rerun
+
+    def record(self, kind, name, seconds, **counts):
+        """
+        Records a finished span. `counts` are numbers such as documents, bytes or tokens;
+        an "error" entry holds the exception type of a failed operation.
+        """
+        rerun = _current_rerun.get()
+        span = {
+            "rerun": rerun["rerun"] if rerun else None,
+            "page": rerun["page"] if rerun else None,
+            "kind": kind,
+            "name": name,
+            "at": time.time(),
+            "seconds": seconds,
+            **counts,
+        }
+        with self._lock:
+            self._spans.append(span)
+            if rerun is not None:
+                rerun["spans"].append(span)
+        return span
+
+    @contextmanager
+    def span(self, kind, name, **counts):
+        """
+        Times the enclosed block. The yielded dict can be updated with counts inside the block.
+        """
+        counts = dict(counts)
+        started = time.perf_counter()
+        try:
+            yield counts
+        except Exception as e:
+            counts["error"] = type(e).__name__
+            raise
+        finally:
+            self.record(kind, name, time.perf_counter() - started, **counts)
+
+    # --- Reading ---
+
+    def current_spans(self):
+        """
+        Returns the spans recorded so far in this thread's rerun.
+        """
+        rerun = _current_rerun.get()
+        if rerun is None:
+            return []
+        with self._lock:
+            return list(rerun["spans"])
+
+    def spans(self):
+        """
+        Returns a copy of the retained spans, oldest first.
+        """
+        with self._lock:
+            return list(self._spans)
+
+    def reruns(self):
+        """
+        Returns a copy of the retained rerun totals, oldest first.
+        """
+        with self._lock:
+            return list(self._reruns)
+
+    def summary(self):
+        """
+        Aggregates the retained spans per (page, kind, name): count, errors, latency
+        percentiles in milliseconds and summed counts.
+        """
+        groups = {}
+        for span in self.spans():
+            groups.setdefault((span["page"], span["kind"], span["name"]), []).append(span)
+        rows = []
+        for (page, kind, name), spans in sorted(groups.items(), key=lambda item: tuple(str(part) for part in item[0])):
+            durations = sorted(span["seconds"] * 1000 for span in spans)
+            row = {
+                "page": page,
+                "kind": kind,
+                "name": name,
+                "count": len(spans),
+                "errors": sum(1 for span in spans if span.get("error")),
+                "total_ms": sum(durations),
+            }
+            for q in QUANTILES:
+                row[f"p{int(q * 100)}_ms"] = percentile(durations, q)
+            for field in COUNT_FIELDS:
+                row[field] = sum(span.get(field, 0) for span in spans)
+            rows.append(row)
+        return rows
+
+    # --- Export ---
+
+    def export_jsonl(self):
+        """
+        Returns the retained spans as JSON lines.
+        """
+        return "".join(json.dumps(span, default=str) + "\n" for span in self.spans())
+
+    def prometheus(self):
+        """
+        Returns the retained spans and reruns in the Prometheus text exposition format:
+        per-page latency summaries with quantiles, and counters for documents, bytes and tokens.
+        """
+        lines = [
+            "# HELP finance_manager_span_seconds Duration of instrumented operations.",
+            "# TYPE finance_manager_span_seconds summary",
+        ]
+        by_kind = {}
+        for span in self.spans():
+            by_kind.setdefault((span["page"] or "", span["kind"]), []).append(span)
+        for (page, kind), spans in sorted(by_kind.items()):
+            labels = f'page="{_escape_label(page)}",kind="{_escape_label(kind)}"'
+            durations = sorted(span["seconds"] for span in spans)
+            for q in QUANTILES:
+                lines.append(f'finance_manager_span_seconds{{{labels},quantile="{q}"}} {percentile(durations, q):.6f}')
+            lines.append(f"finance_manager_span_seconds_sum{{{labels}}} {sum(durations):.6f}")
+            lines.append(f"finance_manager_span_seconds_count{{{labels}}} {len(durations)}")
+        for field in COUNT_FIELDS:
+            lines.append(f"# TYPE finance_manager_span_{field}_total counter")
+            for (page, kind), spans in sorted(by_kind.items()):
+                total = sum(span.get(field, 0) for span in spans)
+                if total:
+                    lines.append(f'finance_manager_span_{field}_total{{page="{_escape_label(page)}",kind="{_escape_label(kind)}"}} {total}')
+
+        lines += [
+            "# HELP finance_manager_rerun_seconds Duration of full page reruns.",
+            "# TYPE finance_manager_rerun_seconds summary",
+        ]
+        by_page = {}
+        for rerun in self.reruns():
+            by_page.setdefault(rerun["page"], []).append(rerun["seconds"])
+        for page, durations in sorted(by_page.items()):
+            durations.sort()
+            labels = f'page="{_escape_label(page)}"'
+            for q in QUANTILES:
+                lines.append(f'finance_manager_rerun_seconds{{{labels},quantile="{q}"}} {percentile(durations, q):.6f}')
+            lines.append(f"finance_manager_rerun_seconds_sum{{{labels}}} {sum(durations):.6f}")
+            lines.append(f"finance_manager_rerun_seconds_count{{{labels}}} {len(durations)}")
+        return "\n".join(lines) + "\n"
+
+    def _append_log(self, rerun, spans):
+        record = {key: rerun[key] for key in ("rerun", "page", "started", "seconds")}
+        with self._lock, open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"type": "rerun", **record}, default=str) + "\n")
+            for span in spans:
+                f.write(json.dumps({"type": "span", **span}, default=str) + "\n")
+
+
+# --- Firestore ---
+
+def _unwrap(value):
+    return getattr(value, "_wrapped", value)
+
+
+def _snapshot_size(snapshot):
+    data = getattr(snapshot, "_data", None)
+    return document_size(data if data is not None else snapshot.to_dict())
+
+
+class _Proxy:
+    def __init__(self, wrapped, tracer):
+        self._wrapped = wrapped
+        self._tracer = tracer
+
+    def __getattr__(self, name):
+        if name == "_wrapped":
+            raise AttributeError(name)
+        return getattr(self._wrapped, name)
+
+
+class InstrumentedFirestore(_Proxy):
+    """
+    Wraps a Firestore client so every query, document read/write and batch commit records a span.
+    """
+
+    def collection(self, name):
+        return _QueryProxy(self._wrapped.collection(name), self._tracer, name)
+
+    def batch(self):
+        return _BatchProxy(self._wrapped.batch(), self._tracer)
+
+    def get_all(self, references, *args, **kwargs):
+        with self._tracer.span("firestore.read", "get_all") as counts:
+            snapshots = list(self._wrapped.get_all([_unwrap(reference) for reference in references], *args, **kwargs))
+            found = [snapshot for snapshot in snapshots if snapshot.exists]
+            counts["documents"] = len(found)
+            counts["bytes"] = sum(_snapshot_size(snapshot) for snapshot in found)
+            return snapshots
+
+
+class _QueryProxy(_Proxy):
+    def __init__(self, wrapped, tracer, collection):
+        super().__init__(wrapped, tracer)
+        self._collection = collection
+
+    def _chain(self, method, *args, **kwargs):
+        return _QueryProxy(getattr(self._wrapped, method)(*args, **kwargs), self._tracer, self._collection)
+
+    def where(self, *args, **kwargs):
+        return self._chain("where", *args, **kwargs)
+
+    def order_by(self, *args, **kwargs):
+        return self._chain("order_by", *args, **kwargs)
+
+    def limit(self, *args, **kwargs):
+        return self._chain("limit", *args, **kwargs)
+
+    def start_after(self, *args, **kwargs):
+        return self._chain("start_after", *args, **kwargs)
+
+    def document(self, *args, **kwargs):
+        return _DocumentProxy(self._wrapped.document(*args, **kwargs), self._tracer, self._collection)
+
+    def add(self, data, *args, **kwargs):
+        with self._tracer.span("firestore.write", f"{self._collection}.add", writes=1, bytes=document_size(data)):
+            return self._wrapped.add(data, *args, **kwargs)
+
+    def stream(self, *args, **kwargs):
+        # Timed until the caller has consumed (or closed) the stream
+        started = time.perf_counter()
+        counts = {"documents": 0, "bytes": 0}
+        try:
+            for snapshot in self._wrapped.stream(*args, **kwargs):
+                counts["documents"] += 1
+                counts["bytes"] += _snapshot_size(snapshot)
+                yield snapshot
+        except Exception as e:
+            counts["error"] = type(e).__name__
+            raise
+        finally:
+            self._tracer.record("firestore.read", f"{self._collection}.stream", time.perf_counter() - started, **counts)
+
+    def get(self, *args, **kwargs):
+        return list(self.stream(*args, **kwargs))
+
+
+class _DocumentProxy(_Proxy):
+    def __init__(self, wrapped, tracer, collection):
+        super().__init__(wrapped, tracer)
+        self._collection = collection
+
+    def get(self, *args, **kwargs):
+        with self._tracer.span("firestore.read", f"{self._collection}.get") as counts:
+            snapshot = self._wrapped.get(*args, **kwargs)
+            counts["documents"] = 1 if snapshot.exists else 0
+            counts["bytes"] = _snapshot_size(snapshot) if snapshot.exists else 0
+            return snapshot
+
+    def set(self, data, *args, **kwargs):
+        with self._tracer.span("firestore.write", f"{self._collection}.set", writes=1, bytes=document_size(data)):
+            return self._wrapped.set(data, *args, **kwargs)
+
+    def update(self, data, *args, **kwargs):
+        with self._tracer.span("firestore.write", f"{self._collection}.update", writes=1, bytes=document_size(data)):
+            return self._wrapped.update(data, *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with self._tracer.span("firestore.write", f"{self._collection}.delete", writes=1):
+            return self._wrapped.delete(*args, **kwargs)
+
+    def collection(self, name):
+        return _QueryProxy(self._wrapped.collection(name), self._tracer, f"{self._collection}/{name}")
+
+
+class _BatchProxy(_Proxy):
+    def __init__(self, wrapped, tracer):
+        super().__init__(wrapped, tracer)
+        self._writes = 0
+        self._bytes = 0
+
+    def set(self, reference, data, *args, **kwargs):
+        self._writes += 1
+        self._bytes += document_size(data)
+        return self._wrapped.set(_unwrap(reference), data, *args, **kwargs)
+
+    def create(self, reference, data, *args, **kwargs):
+        self._writes += 1
+        self._bytes += document_size(data)
+        return self._wrapped.create(_unwrap(reference), data, *args, **kwargs)
+
+    def update(self, reference, data, *args, **kwargs):
+        self._writes += 1
+        self._bytes += document_size(data)
+        return self._wrapped.update(_unwrap(reference), data, *args, **kwargs)
+
+    def delete(self, reference, *args, **kwargs):
+        self._writes += 1
+        return self._wrapped.delete(_unwrap(reference), *args, **kwargs)
+
+    def commit(self, *args, **kwargs):
+        with self._tracer.span("firestore.write", "batch.commit", writes=self._writes, bytes=self._bytes):
+            result = self._wrapped.commit(*args, **kwargs)
+        self._writes = 0
+        self._bytes = 0
+        return result
+
+
+# --- Groq ---
+
+def _usage_counts(usage):
+    if usage is None:
+        return {}
+    return {"prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0, "completion_tokens": getattr(usage, "completion_tokens", 0) or 0}
+
+
+class InstrumentedGroq(_Proxy):
+    """
+    Wraps a Groq client so every chat completion records a span with its token usage.
+    Streamed completions are timed until the stream is exhausted or closed and also
+    record the time to the first chunk.
+    """
+
+    def __init__(self, wrapped, tracer):
+        super().__init__(wrapped, tracer)
+        self.chat = _Proxy(wrapped.chat, tracer)
+        self.chat.completions = _CompletionsProxy(wrapped.chat.completions, tracer)
+
+
+class _CompletionsProxy(_Proxy):
+    def create(self, *args, **kwargs):
+        name = kwargs.get("model", "completion")
+        if not kwargs.get("stream"):
+            with self._tracer.span("groq", name) as counts:
+                completion = self._wrapped.create(*args, **kwargs)
+                counts.update(_usage_counts(getattr(completion, "usage", None)))
+                return completion
+        started = time.perf_counter()
+        try:
+            stream = self._wrapped.create(*args, **kwargs)
+        except Exception as e:
+            self._tracer.record("groq", name, time.perf_counter() - started, error=type(e).__name__)
+            raise
+        return _StreamProxy(stream, self._tracer, name, started)
+
+
+class _StreamProxy(_Proxy):
+    def __init__(self, wrapped, tracer, name, started):
+        super().__init__(wrapped, tracer)
+        self._name = name
+        self._started = started
+        self._counts = {"chunks": 0}
+        self._recorded = False
+
+    def __iter__(self):
+        try:
+            for chunk in self._wrapped:
+                if self._counts["chunks"] == 0:
+                    self._counts["first_chunk_seconds"] = time.perf_counter() - self._started
+                self._counts["chunks"] += 1
+                # Groq reports usage on the last chunk
+                usage = getattr(getattr(chunk, "x_groq", None), "usage", None) or getattr(chunk, "usage", None)
+                self._counts.update(_usage_counts(usage))
+                yield chunk
+        except Exception as e:
+            self._counts["error"] = type(e).__name__
+            raise
+        finally:
+            self._finish()
+
+    def close(self):
+        close = getattr(self._wrapped, "close", None)
+        if close is not None:
+            close()
+        self._finish()
+
+    def _finish(self):
+        if not self._recorded:
+            self._recorded = True
+            self._tracer.record("groq", self._name, time.perf_counter() - self._started, **self._counts)
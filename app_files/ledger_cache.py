@@ -0,0 +1,179 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 300
+
+
+def estimate_size(value):
+    """
+    Roughly estimates the memory footprint of a cached value in bytes.
+    Walks lists, tuples, sets and dicts so that a ledger (a list of document
+    dicts) is charged for its contents, not just for the outer list.
+    """
+    seen = set()
+    stack = [value]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+    return total
+
+
+class LedgerCache:
+    """
+    Process-wide cache of per-user ledger data, shared by every Streamlit session.
+
+    Entries are keyed by (user_id, kind), e.g. (uid, 'expenses'). The cache is
+    bounded by an approximate byte budget with least-recently-used eviction, and
+    every entry expires after `ttl_seconds`. Writers call `invalidate()` after a
+    successful add/delete so the next read goes back to Firestore.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # (user_id, kind) -> (value, size, expires_at)
+        self._versions = {}  # user_id -> int, bumped on every invalidation
+        self._loading = {}  # (user_id, kind) -> threading.Event
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id, kind, loader):
+        """
+        Returns the cached value for (user_id, kind), calling `loader()` on a miss.
+        Concurrent misses for the same key wait for a single load instead of each
+        hitting Firestore. Cached values are shared between sessions and must be
+        treated as read-only by callers.
+        """
+        key = (user_id, kind)
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    value, size, expires_at = entry
+                    if expires_at > time.monotonic():
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                        return value
+                    self._remove(key)
+                pending = self._loading.get(key)
+                if pending is None:
+                    self.misses += 1
+                    pending = threading.Event()
+                    self._loading[key] = pending
+                    version = self._versions.get(user_id, 0)
+                    break
+            # Another session is already loading this key; wait and re-check.
+            pending.wait()
+
+        try:
+            value = loader()
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            pending.set()
+
+        with self._lock:
+            # Only store the result if no write invalidated the user mid-load.
+            if self._versions.get(user_id, 0) == version:
+                self._store(key, value)
+        return value
+
+    def invalidate(self, user_id, kind=None):
+        """
+        Drops cached data for a user. With `kind`, only that entry is dropped.
+        """
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            if kind is not None:
+                self._remove((user_id, kind))
+            else:
+                for key in [k for k in self._entries if k[0] == user_id]:
+                    self._remove(key)
+
+    def update(self, user_id, kind, fn):
+        """
+        Replaces the cached value for (user_id, kind) with `fn(value)` after a write, so the
+        next read does not have to reload it. Bumps the user's version like invalidate();
+        if the entry is not cached there is nothing to patch and the next read loads it.
+        """
+        key = (user_id, kind)
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            entry = self._entries.get(key)
+            if entry is None or entry[2] <= time.monotonic():
+                self._remove(key)
+                return
+        try:
+            value = fn(entry[0])
+        except Exception:
+            with self._lock:
+                self._remove(key)
+            raise
+        with self._lock:
+            # Drop the entry instead if it changed while `fn` ran
+            if self._entries.get(key) is entry:
+                self._store(key, value, expires_at=entry[2])
+            else:
+                self._remove(key)
+
+    def version(self, user_id):
+        """
+        Returns a counter that changes every time the user's data is invalidated.
+        """
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def clear(self):
+        """
+        Empties the cache.
+        """
+        with self._lock:
+            for user_id in {k[0] for k in self._entries}:
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """
+        Returns a snapshot of the cache counters.
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _store(self, key, value, expires_at=None):
+        size = estimate_size(value)
+        self._remove(key)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size, expires_at if expires_at is not None else time.monotonic() + self.ttl_seconds)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[1]
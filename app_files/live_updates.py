@@ -0,0 +1,141 @@
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+from app_files.columnar import COLUMNAR_COLLECTIONS
+from app_files.replica import REPLICATED_COLLECTIONS, SYNC_OVERLAP, TOMBSTONES_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IDLE_SECONDS = 15 * 60
+
+
+class LiveUpdates:
+    """
+    Keeps the cached ledgers of active users current with Firestore snapshot listeners.
+
+    Each watched user gets one listener per ledger collection, limited to documents whose
+    `updated_at` is recent, plus one on their tombstones, so subscribing reads almost
+    nothing and every later write (from this process or another device) arrives as a
+    change. Changed incomes/expenses are patched into the cached columnar ledgers, other
+    collections and the monthly rollups are invalidated, and the replica is marked stale.
+    Users that have not been seen for `idle_seconds` are unsubscribed.
+    """
+
+    def __init__(self, db, ledger_cache, ledger_store, idle_seconds=DEFAULT_IDLE_SECONDS):
+        self.db = db
+        self.ledger_cache = ledger_cache
+        self.ledger_store = ledger_store
+        self.idle_seconds = idle_seconds
+        self._watches = {}  # user_id -> list of listener handles
+        self._last_seen = {}  # user_id -> time.monotonic()
+        self._lock = threading.Lock()
+        self.changes = 0
+        self.errors = 0
+
+    def watch(self, user_id):
+        """
+        Starts listening for the user's changes if not already listening, and marks them active.
+        """
+        with self._lock:
+            self._last_seen[user_id] = time.monotonic()
+            previous = self._watches.get(user_id)
+            # A listener that hit an error (e.g. a missing index) closes itself; start over
+            if previous is not None and not any(getattr(watch, "_closed", False) for watch in previous):
+                return
+            self._watches[user_id] = watches = []
+        if previous:
+            self._unsubscribe(previous)
+        since = datetime.now(timezone.utc) - SYNC_OVERLAP
+        try:
+            for collection in REPLICATED_COLLECTIONS:
+                query = self.db.collection(collection).where('user_id', '==', user_id).where('updated_at', '>', since)
+                watches.append(query.on_snapshot(self._document_callback(user_id, collection)))
+            query = self.db.collection(TOMBSTONES_COLLECTION).where('user_id', '==', user_id).where('deleted_at', '>', since)
+            watches.append(query.on_snapshot(self._tombstone_callback(user_id)))
+        except Exception:
+            self.errors += 1
+            logger.exception("Could not start live updates for %s", user_id)
+            self.unwatch(user_id)
+            raise
+        finally:
+            self.prune()
+
+    def unwatch(self, user_id):
+        """
+        Stops listening for the user's changes.
+        """
+        with self._lock:
+            watches = self._watches.pop(user_id, [])
+            self._last_seen.pop(user_id, None)
+        self._unsubscribe(watches)
+
+    def prune(self):
+        """
+        Unsubscribes users that have been idle for longer than `idle_seconds`.
+        """
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            idle = [user_id for user_id, seen in self._last_seen.items() if seen < cutoff]
+        for user_id in idle:
+            self.unwatch(user_id)
+
+    def stats(self):
+        """
+        Returns a snapshot of the listener counters.
+        """
+        with self._lock:
+            return {
+                "users": len(self._watches),
+                "listeners": sum(len(watches) for watches in self._watches.values()),
+                "changes": self.changes,
+                "errors": self.errors,
+            }
+
+    def _unsubscribe(self, watches):
+        for watch in watches:
+            try:
+                watch.unsubscribe()
+            except Exception:
+                logger.exception("Could not stop a listener")
+
+    def _document_callback(self, user_id, collection):
+        def on_snapshot(snapshots, changes, read_time):
+            try:
+                upserted = [{**change.document.to_dict(), "id": change.document.id} for change in changes if change.type.name != "REMOVED"]
+                removed = [change.document.id for change in changes if change.type.name == "REMOVED"]
+                self._apply(user_id, collection, upserted, removed)
+            except Exception:
+                self.errors += 1
+                logger.exception("Live update failed for %s/%s", user_id, collection)
+        return on_snapshot
+
+    def _tombstone_callback(self, user_id):
+        def on_snapshot(snapshots, changes, read_time):
+            try:
+                deleted = {}
+                for change in changes:
+                    if change.type.name == "ADDED":
+                        tombstone = change.document.to_dict()
+                        deleted.setdefault(tombstone['collection'], []).append(tombstone['doc_id'])
+                for collection, doc_ids in deleted.items():
+                    self._apply(user_id, collection, [], doc_ids)
+            except Exception:
+                self.errors += 1
+                logger.exception("Live update failed for %s tombstones", user_id)
+        return on_snapshot
+
+    def _apply(self, user_id, collection, upserted, removed):
+        if not upserted and not removed:
+            return
+        with self._lock:
+            self.changes += len(upserted) + len(removed)
+        if collection in COLUMNAR_COLLECTIONS:
+            # Idempotent, so our own writes (already patched in) arriving again are harmless
+            changed_ids = [row['id'] for row in upserted] + removed
+            self.ledger_cache.update(user_id, collection, lambda ledger: ledger.delete(changed_ids).append(upserted))
+            self.ledger_cache.invalidate(user_id, 'rollups')
+        else:
+            self.ledger_cache.invalidate(user_id, collection)
+        self.ledger_store.mark_stale(user_id, collection)
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from groq import APIError, APITimeoutError
+
+from app_files.llm_gateway import GatewayTimeout
+
+logger = logging.getLogger(__name__)
+
+MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+DEFAULT_TIMEOUT_SECONDS = 60
+TIMEOUT_NOTICE = "\n\n_(The response took too long and was cut off. Please try again.)_"
+ERROR_NOTICE = "\n\n_(The AI service could not answer right now. Please try again in a moment.)_"
+
+
+def new_timings():
+    """
+    Returns an empty timing record for one streamed completion.
+    """
+    return {
+        "time_to_first_token": None,
+        "total_seconds": None,
+        "chunks": 0,
+        "status": "running",
+        "error": None,
+    }
+
+
+def stream_chat(groq_client, messages, timings=None, model=MODEL, timeout=DEFAULT_TIMEOUT_SECONDS, **kwargs):
+    """
+    Streams a chat completion, yielding text fragments as they arrive.
+
+    `timings` (see new_timings()) is filled in with the time to first token, the total
+    time and a final status: "complete", "timeout", "error" or "cancelled". The whole
+    response must finish within `timeout` seconds. A Groq API error (e.g. a rate limit or
+    5xx that outlasted the gateway's retries) ends the stream with a notice and is kept in
+    timings["error"]. If the consumer stops early (Streamlit stops a script when the user
+    navigates away), the HTTP stream is closed.
+    """
+    if timings is None:
+        timings = new_timings()
+    started = time.perf_counter()
+    deadline = started + timeout
+    stream = None
+    try:
+        stream = groq_client.chat.completions.create(messages=messages, model=model, stream=True, timeout=timeout, **kwargs)
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if text:
+                if timings["time_to_first_token"] is None:
+                    timings["time_to_first_token"] = time.perf_counter() - started
+                timings["chunks"] += 1
+                yield text
+            if time.perf_counter() > deadline:
+                timings["status"] = "timeout"
+                break
+        else:
+            timings["status"] = "complete"
+    except (APITimeoutError, GatewayTimeout):
+        timings["status"] = "timeout"
+    except APIError as e:
+        logger.warning("Chat completion failed: %s", e)
+        timings["status"] = "error"
+        timings["error"] = f"{type(e).__name__}: {e}"
+    except GeneratorExit:
+        timings["status"] = "cancelled"
+        raise
+    finally:
+        timings["total_seconds"] = time.perf_counter() - started
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+    if timings["status"] == "timeout":
+        yield TIMEOUT_NOTICE
+    elif timings["status"] == "error":
+        yield ERROR_NOTICE
+
+
+def format_timings(timings):
+    """
+    Returns a short human-readable summary of a timing record.
+    """
+    if timings["time_to_first_token"] is None:
+        return f"No response after {timings['total_seconds']:.1f}s ({timings['status']})"
+    return f"First token in {timings['time_to_first_token']:.2f}s · {timings['total_seconds']:.2f}s total"
+
+
+def completion_cache_key(model, template, inputs):
+    """
+    Returns a content address for a completion: a hash of the model, the prompt
+    template and the (JSON-serializable) inputs that are substituted into it.
+    """
+    payload = json.dumps({"model": model, "template": template, "inputs": inputs}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """
+    Process-wide cache of finished completions keyed by completion_cache_key().
+    Bounded to `max_entries` with least-recently-used eviction; entries expire after `ttl_seconds`.
+    """
+
+    def __init__(self, max_entries=1000, ttl_seconds=24 * 60 * 60):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (text, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Returns the cached text for `key`, or None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def put(self, key, text):
+        """
+        Stores a finished completion.
+        """
+        with self._lock:
+            self._entries[key] = (text, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """
+        Returns a snapshot of the cache counters.
+        """
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
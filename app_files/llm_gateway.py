@@ -0,0 +1,391 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+from app_files.instrumentation import percentile
+from app_files.retry import retry_delay
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_REQUESTS_PER_MINUTE = 30
+DEFAULT_TIMEOUT_SECONDS = 60
+DEFAULT_MAX_RETRIES = 3
+BASE_BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 20
+# Rate limits and transient server errors are retried; other errors are raised at once
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+LATENCY_SAMPLES = 1000
+
+
+class GatewayTimeout(TimeoutError):
+    """
+    Raised when a request could not start within its timeout: all slots stayed busy,
+    the rate limit left no room, or the retries ran out of time.
+    """
+
+
+def request_key(kwargs):
+    """
+    Returns a content address for a completion request, ignoring its timeout.
+    """
+    payload = json.dumps({k: v for k, v in kwargs.items() if k != "timeout"}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _status_code(error):
+    return getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, holding at most `capacity`.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline):
+        """
+        Takes one token, waiting for it until `deadline` (a time.monotonic() value).
+        Returns False if none became available in time.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class _Call:
+    # One in-flight request, shared by every identical request that arrives while it runs
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _SharedStream:
+    """
+    Fans one streamed completion out to several readers. Chunks are kept as they arrive, so
+    a reader that joins late replays them from the start; whichever reader is furthest ahead
+    pulls the next chunk from the underlying stream.
+    """
+
+    def __init__(self, stream, on_done):
+        self._stream = stream
+        self._chunks_iter = iter(stream)
+        self._on_done = on_done
+        self._chunks = []
+        self._finished = False  # the underlying stream is exhausted, failed or closed
+        self._cancelled = False  # closed because every reader left early
+        self._error = None
+        self._pulling = False
+        self._readers = 0
+        self._cond = threading.Condition()
+
+    def reader(self):
+        """
+        Returns a new reader, or None if the stream was abandoned by its earlier readers.
+        """
+        with self._cond:
+            if self._cancelled:
+                return None
+            self._readers += 1
+        return _StreamReader(self)
+
+    def chunk(self, index):
+        # Returns chunk number `index`, or raises StopIteration at the end of the stream
+        with self._cond:
+            while True:
+                if index < len(self._chunks):
+                    return self._chunks[index]
+                if self._error is not None:
+                    raise self._error
+                if self._finished:
+                    raise StopIteration
+                if not self._pulling:
+                    self._pulling = True
+                    break
+                self._cond.wait()
+        chunk, error, finished = None, None, False
+        try:
+            chunk = next(self._chunks_iter)
+        except StopIteration:
+            finished = True
+        except Exception as e:
+            error, finished = e, True
+        with self._cond:
+            self._pulling = False
+            if finished:
+                self._finished = True
+                self._error = error
+            else:
+                self._chunks.append(chunk)
+            self._cond.notify_all()
+        if finished:
+            self._finish()
+        return self.chunk(index)
+
+    def release(self):
+        # A reader finished or left; the last one to leave early closes the underlying stream
+        with self._cond:
+            self._readers -= 1
+            abandon = self._readers == 0 and not self._finished
+            if abandon:
+                self._cancelled = True
+        if abandon:
+            close = getattr(self._stream, "close", None)
+            if close is not None:
+                try:
+                    close()
+                except Exception:
+                    logger.exception("Could not close a completion stream")
+            self._finish()
+
+    def _finish(self):
+        with self._cond:
+            self._finished = True
+            on_done, self._on_done = self._on_done, None
+        if on_done is not None:
+            on_done()
+
+
+class _StreamReader:
+    # What callers of a streamed create() get: iterable once, and closable like a Groq stream
+    def __init__(self, shared):
+        self._shared = shared
+        self._index = 0
+        self._closed = False
+
+    def __iter__(self):
+        try:
+            while not self._closed:
+                try:
+                    chunk = self._shared.chunk(self._index)
+                except StopIteration:
+                    return
+                self._index += 1
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._shared.release()
+
+    def __del__(self):
+        self.close()
+
+
+class LLMGateway:
+    """
+    Process-wide gateway in front of the Groq client, offering the same
+    `chat.completions.create()` so callers do not change.
+
+    - At most `max_concurrency` requests (or open streams) run at once; the others queue.
+    - Requests start at no more than `requests_per_minute`, with bursts of up to
+      `max_concurrency` (a token bucket).
+    - Identical requests that arrive while one is in flight share its result; streamed
+      ones share its chunks.
+    - Rate limits (429) and 5xx errors are retried up to `max_retries` times with jittered
+      exponential backoff starting at `backoff_seconds`.
+    - Every call has a timeout (`timeout` unless the caller passes one) covering the queue
+      wait, the retries and the request itself. A request that cannot start in time raises
+      GatewayTimeout.
+    stats() reports the queue depth, counters and latency percentiles.
+    """
+
+    def __init__(self, client, max_concurrency=DEFAULT_MAX_CONCURRENCY, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                 timeout=DEFAULT_TIMEOUT_SECONDS, max_retries=DEFAULT_MAX_RETRIES, backoff_seconds=BASE_BACKOFF_SECONDS):
+        self.client = client
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._bucket = TokenBucket(requests_per_minute / 60, max_concurrency)
+        self._inflight = {}  # request_key -> _Call
+        self._lock = threading.Lock()
+        self._queue_waits = deque(maxlen=LATENCY_SAMPLES)
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.active = 0
+        self.requests = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def __getattr__(self, name):
+        if name == "client":
+            raise AttributeError(name)
+        return getattr(self.client, name)
+
+    def create(self, **kwargs):
+        """
+        Runs a chat completion through the gateway; takes the Groq client's keyword arguments.
+        """
+        timeout = kwargs.pop("timeout", None) or self.timeout
+        deadline = time.monotonic() + timeout
+        key = request_key(kwargs)
+        with self._lock:
+            self.requests += 1
+        while True:
+            with self._lock:
+                call = self._inflight.get(key)
+                leader = call is None
+                if leader:
+                    call = self._inflight[key] = _Call()
+                else:
+                    self.coalesced += 1
+            if leader:
+                return self._lead(call, key, kwargs, deadline)
+            if not call.done.wait(max(deadline - time.monotonic(), 0)):
+                with self._lock:
+                    self.timeouts += 1
+                raise GatewayTimeout(f"No response within {timeout:.0f}s")
+            if isinstance(call.error, Exception):
+                raise call.error
+            if call.error is None:
+                if not kwargs.get("stream"):
+                    return call.result
+                reader = call.result.reader()
+                if reader is not None:
+                    return reader
+            # The leading request was stopped (its session went away) or its stream was
+            # abandoned just before we joined; start a new request
+            with self._lock:
+                self.coalesced -= 1
+
+    def _lead(self, call, key, kwargs, deadline):
+        slot_held = False
+
+        def done():
+            with self._lock:
+                if self._inflight.get(key) is call:
+                    del self._inflight[key]
+            if slot_held:
+                self._release_slot()
+
+        try:
+            started = self._acquire_slot(deadline)
+            slot_held = True
+            result = self._call_with_retries(kwargs, deadline)
+            self._record_latency(time.monotonic() - started)
+        except BaseException as e:
+            # Exceptions are shared with coalesced callers; anything else (e.g. Streamlit
+            # stopping this session's script) only makes them retry
+            call.error = e
+            with self._lock:
+                if isinstance(e, GatewayTimeout):
+                    self.timeouts += 1
+                elif isinstance(e, Exception):
+                    self.errors += 1
+            done()
+            call.done.set()
+            raise
+        if kwargs.get("stream"):
+            # The slot and the coalescing entry are held until the stream ends
+            call.result = _SharedStream(result, done)
+            reader = call.result.reader()
+            call.done.set()
+            return reader
+        call.result = result
+        done()
+        call.done.set()
+        return result
+
+    def _acquire_slot(self, deadline):
+        queued = time.monotonic()
+        with self._lock:
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            if not self._slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+                raise GatewayTimeout("All LLM request slots stayed busy")
+            if not self._bucket.acquire(deadline):
+                self._slots.release()
+                raise GatewayTimeout("LLM rate limit left no room before the timeout")
+        finally:
+            with self._lock:
+                self.queue_depth -= 1
+        started = time.monotonic()
+        with self._lock:
+            self.active += 1
+            self._queue_waits.append(started - queued)
+        return started
+
+    def _release_slot(self):
+        with self._lock:
+            self.active -= 1
+        self._slots.release()
+
+    def _call_with_retries(self, kwargs, deadline):
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise GatewayTimeout("LLM request ran out of time")
+            try:
+                return self.client.chat.completions.create(timeout=remaining, **kwargs)
+            except Exception as e:
+                if _status_code(e) not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    raise
+                delay = retry_delay(attempt, e, base=self.backoff_seconds, cap=MAX_BACKOFF_SECONDS)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                logger.warning("LLM request failed with status %s, retrying in %.1fs", _status_code(e), delay)
+                with self._lock:
+                    self.retries += 1
+                time.sleep(delay)
+                # A retry is a new request for the rate limit, but keeps its slot
+                if not self._bucket.acquire(deadline):
+                    raise GatewayTimeout("LLM rate limit left no room before the timeout")
+                attempt += 1
+
+    def _record_latency(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def stats(self):
+        """
+        Returns a snapshot of the gateway's counters and percentiles (in milliseconds) of the
+        time spent queued and of the request latency (for streams, until the stream opened).
+        """
+        with self._lock:
+            waits = sorted(self._queue_waits)
+            latencies = sorted(self._latencies)
+            stats = {
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "active": self.active,
+                "in_flight": len(self._inflight),
+                "requests": self.requests,
+                "coalesced": self.coalesced,
+                "retries": self.retries,
+                "timeouts": self.timeouts,
+                "errors": self.errors,
+            }
+        for name, values in (("queue_wait", waits), ("latency", latencies)):
+            for q in (0.5, 0.95, 0.99):
+                value = percentile(values, q)
+                stats[f"{name}_p{int(q * 100)}_ms"] = None if value is None else value * 1000
+        return stats
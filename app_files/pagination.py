@@ -0,0 +1,127 @@
+from collections import namedtuple
+
+from firebase_admin import firestore
+
+from app_files.data_fetch import submit
+
+DEFAULT_PAGE_SIZE = 25
+PAGE_SIZES = (10, 25, 50, 100)
+
+# rows: the page's documents with their "id"; cursor: position of the last row (a Firestore
+# snapshot for start_after(), or a replica key); has_more: whether another page exists.
+Page = namedtuple('Page', ('rows', 'cursor', 'has_more'))
+
+
+def build_query(db, collection, user_id, start_date=None, end_date=None, category=None):
+    """
+    Builds the newest-first query for a user's incomes or expenses, with optional
+    server-side date range and category filters.
+    Filtering by category needs a (user_id, category, date) composite index.
+    """
+    query = db.collection(collection).where('user_id', '==', user_id)
+    if category:
+        query = query.where('category', '==', category)
+    if start_date:
+        query = query.where('date', '>=', str(start_date))
+    if end_date:
+        query = query.where('date', '<=', str(end_date))
+    return query.order_by('date', direction=firestore.Query.DESCENDING)
+
+
+def fetch_page(query, page_size, after=None):
+    """
+    Reads one page of `query` starting after the `after` snapshot.
+    One extra document is requested to find out whether another page exists.
+    """
+    if after is not None:
+        query = query.start_after(after)
+    snapshots = list(query.limit(page_size + 1).stream())
+    has_more = len(snapshots) > page_size
+    snapshots = snapshots[:page_size]
+    rows = [{**snapshot.to_dict(), "id": snapshot.id} for snapshot in snapshots]
+    return Page(rows, snapshots[-1] if snapshots else None, has_more)
+
+
+class Paginator:
+    """
+    Session-scoped cursor pagination over one transaction collection.
+
+    `fetch(page_size, after, **filters)` returns a Page; `after` is the previous page's
+    cursor (None for the first page). Keeps the start cursor of every page visited so far
+    (for "Previous"), the current page, and a background prefetch of the next page.
+    Memory is bounded by the page size, not by the length of the user's history.
+    """
+
+    def __init__(self, fetch, page_size=DEFAULT_PAGE_SIZE):
+        self.fetch = fetch
+        self.page_size = page_size
+        self.filters = {}
+        self._cursors = [None]
+        self._page = None
+        self._prefetch = None
+
+    @property
+    def page_number(self):
+        """
+        The 1-based number of the current page.
+        """
+        return len(self._cursors)
+
+    def configure(self, page_size, **filters):
+        """
+        Applies a page size and filters, going back to the first page if either changed.
+        """
+        if page_size != self.page_size or filters != self.filters:
+            self.page_size = page_size
+            self.filters = filters
+            self.reset()
+
+    def reset(self):
+        """
+        Returns to the first page and drops everything fetched so far.
+        """
+        self._cursors = [None]
+        self.refresh()
+
+    def refresh(self):
+        """
+        Re-reads the current page on the next access, e.g. after a write.
+        """
+        self._page = None
+        self._prefetch = None
+
+    def current(self):
+        """
+        Returns the current Page, reading it if needed, and starts prefetching the next one.
+        """
+        if self._page is None:
+            self._page = self.fetch(self.page_size, self._cursors[-1], **self.filters)
+        if self._page.has_more and self._prefetch is None:
+            self._prefetch = submit(self.fetch, self.page_size, self._page.cursor, **self.filters)
+        return self._page
+
+    def has_previous(self):
+        """
+        Whether there is a page before the current one.
+        """
+        return len(self._cursors) > 1
+
+    def next(self):
+        """
+        Moves to the next page, using the prefetched result when it is ready.
+        """
+        page = self.current()
+        if not page.has_more:
+            return
+        prefetch = self._prefetch
+        self._cursors.append(page.cursor)
+        self._page = prefetch.result() if prefetch is not None else None
+        self._prefetch = None
+
+    def previous(self):
+        """
+        Moves back one page.
+        """
+        if self.has_previous():
+            self._cursors.pop()
+            self.refresh()
@@ -0,0 +1,161 @@
+import argparse
+import json
+import math
+import os
+import re
+import time
+
+from app_files.llm import MODEL
+
+CONFIDENCE_THRESHOLD = 0.75
+# Hand-labeled examples. FEATURES were tuned on the eval set; the holdout set was written
+# afterwards and is never used for tuning, so its numbers estimate unseen queries
+EVAL_SET_PATH = os.path.join(os.path.dirname(__file__), "data", "advisor_routing_eval.jsonl")
+HOLDOUT_SET_PATH = os.path.join(os.path.dirname(__file__), "data", "advisor_routing_holdout.jsonl")
+
+CLASSIFICATION_PROMPT = "Is the following query general or specific to the user's financial data? Respond with only one word: 'general' or 'specific'.\n\nQuery: {query}"
+
+# (pattern, weight). Positive weights push towards 'specific' (needs the user's data),
+# negative weights towards 'general'. Scores go through a logistic function.
+FEATURES = [
+    (r"\b(my|mine)\b", 1.6),
+    (r"\b(i|i'm|im|i've|ive|i'd|me)\b", 0.8),
+    (r"\b(did|have|do|am|can|should|could|will) i\b", 0.9),
+    (r"\bhow much (did|do|have|am|can) i\b", 1.4),
+    (r"\b(spent|spend|spending|earned|earn|income|incomes|expenses?|saved|savings?|budget|goals?|balance|net)\b", 0.6),
+    (r"\b(last|this|next|past) (week|month|year|quarter)\b", 0.9),
+    (r"\b(so far|lately|recently|this year)\b", 0.5),
+    (r"\bon track\b", 1.0),
+    (r"\bcan i afford\b", 1.5),
+    (r"\b(food|transportation|entertainment|utilities|shopping|health) (expenses?|spending|costs?|bills?)\b", 0.6),
+    (r"\b(biggest|largest|top|highest|most) (expense|expenses|category|categories|spending)\b", 0.8),
+    (r"\b(summari[sz]e|analy[sz]e|review|break ?down)\b", 0.5),
+    (r"\b(what is|what's|what are|whats) (a|an|the)?\b", -0.9),
+    (r"\b(explain|define|definition|meaning of|difference between|vs\.?|versus)\b", -1.4),
+    (r"\b(how does|how do) (a|an|the|\w+s)\b", -0.8),
+    (r"\b(in general|generally|typically|usually|people|someone|anyone|beginners?)\b", -1.0),
+    (r"\b(tips?|advice|strategies|strategy|best way|rule of thumb|ideas)\b", -0.4),
+    (r"\b(inflation|interest rates?|compound interest|index funds?|etfs?|stocks?|bonds?|crypto|bitcoin|401k|401\(k\)|ira|roth|mutual funds?|credit score|mortgage rates?|recession|diversification|emergency fund)\b", -0.7),
+]
+BIAS = -0.6
+
+_COMPILED = [(re.compile(pattern), weight) for pattern, weight in FEATURES]
+
+
+def classify_locally(query):
+    """
+    Decides in-process whether a query needs the user's financial data.
+    Returns (label, confidence) with label 'specific' or 'general' and confidence in [0.5, 1].
+    """
+    text = str(query).lower()
+    score = BIAS + sum(weight for pattern, weight in _COMPILED if pattern.search(text))
+    p_specific = 1.0 / (1.0 + math.exp(-score))
+    if p_specific >= 0.5:
+        return "specific", p_specific
+    return "general", 1.0 - p_specific
+
+
+def classify_with_llm(groq_client, query):
+    """
+    Asks the LLM whether a query is 'general' or 'specific'.
+    """
+    completion = groq_client.chat.completions.create(
+        messages=[
+            {
+                "role": "user",
+                "content": CLASSIFICATION_PROMPT.format(query=query),
+            }
+        ],
+        model=MODEL,
+        max_tokens=3,
+        temperature=0,
+    )
+    return "specific" if "specific" in completion.choices[0].message.content.strip().lower() else "general"
+
+
+def route_query(groq_client, query, threshold=CONFIDENCE_THRESHOLD):
+    """
+    Routes an Advisor query. The local classifier decides on its own when it is at least
+    `threshold` confident; otherwise the LLM is consulted.
+    Returns (label, confidence, source) where source is 'local' or 'llm'.
+    """
+    label, confidence = classify_locally(query)
+    if confidence >= threshold or groq_client is None:
+        return label, confidence, "local"
+    return classify_with_llm(groq_client, query), confidence, "llm"
+
+
+def load_eval_set(path=EVAL_SET_PATH):
+    """
+    Loads the labeled routing examples (one {"query", "label"} object per line).
+    """
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(examples, threshold=CONFIDENCE_THRESHOLD):
+    """
+    Measures the local classifier against labeled examples.
+    Returns overall agreement, the share of queries it would decide alone (coverage),
+    agreement on that confident subset, the misses, and the mean classification time.
+    """
+    results = []
+    started = time.perf_counter()
+    for example in examples:
+        label, confidence = classify_locally(example["query"])
+        results.append((example, label, confidence))
+    elapsed = time.perf_counter() - started
+
+    confident = [r for r in results if r[2] >= threshold]
+    return {
+        "examples": len(results),
+        "agreement": sum(r[1] == r[0]["label"] for r in results) / len(results) if results else 0.0,
+        "coverage": len(confident) / len(results) if results else 0.0,
+        "confident_agreement": sum(r[1] == r[0]["label"] for r in confident) / len(confident) if confident else 0.0,
+        "mean_microseconds": elapsed / len(results) * 1e6 if results else 0.0,
+        "misses": [(r[0]["query"], r[0]["label"], r[1], round(r[2], 3)) for r in results if r[1] != r[0]["label"]],
+    }
+
+
+def main():
+    """
+    Command-line entry point: report agreement between the local classifier and the
+    labeled example sets (by default the tuning set and the held-out set).
+
+        python -m app_files.query_router [--live]
+
+    The stored labels are hand-written. With --live the examples are re-labeled by the
+    current LLM routing prompt first (needs GROQ_API_KEY), which measures agreement with
+    LLM routing itself.
+    """
+    parser = argparse.ArgumentParser(description="Evaluate the local Advisor query router.")
+    parser.add_argument("--eval-set", nargs="+", default=[EVAL_SET_PATH, HOLDOUT_SET_PATH])
+    parser.add_argument("--threshold", type=float, default=CONFIDENCE_THRESHOLD)
+    parser.add_argument("--live", action="store_true", help="Label the examples with the LLM instead of the stored labels")
+    args = parser.parse_args()
+
+    groq_client = None
+    if args.live:
+        from dotenv import load_dotenv
+        from groq import Groq
+
+        load_dotenv()
+        groq_client = Groq(api_key=os.environ["GROQ_API_KEY"])
+
+    for path in args.eval_set:
+        examples = load_eval_set(path)
+        if groq_client is not None:
+            examples = [{**example, "label": classify_with_llm(groq_client, example["query"])} for example in examples]
+        report = evaluate(examples, threshold=args.threshold)
+        print(f"# {os.path.basename(path)} ({'LLM' if groq_client is not None else 'hand'} labels)")
+        print(f"examples:            {report['examples']}")
+        print(f"agreement:           {report['agreement']:.1%}")
+        print(f"coverage @ {args.threshold:.2f}:     {report['coverage']:.1%}")
+        print(f"confident agreement: {report['confident_agreement']:.1%}")
+        print(f"mean time:           {report['mean_microseconds']:.1f} us")
+        for query, expected, got, confidence in report["misses"]:
+            print(f"  miss: expected={expected} got={got} ({confidence}) {query}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,383 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from firebase_admin import firestore
+
+from app_files.data_fetch import submit
+from app_files.pagination import Page, build_query, fetch_page
+
+logger = logging.getLogger(__name__)
+
+REPLICATED_COLLECTIONS = ('incomes', 'expenses', 'savings_goals')
+TOMBSTONES_COLLECTION = 'tombstones'
+# Re-read this much before the watermark so writes committed slightly out of order are not missed
+SYNC_OVERLAP = timedelta(seconds=60)
+DEFAULT_MIN_SYNC_INTERVAL = 5.0
+# Documents/tombstones read from Firestore and upserted per SQLite transaction
+SYNC_PAGE_SIZE = 1000
+# Tombstones older than this are deleted. A replica that has not synced a collection for
+# longer than MAX_INCREMENTAL_GAP may have missed pruned tombstones, so it resyncs in full.
+TOMBSTONE_RETENTION = timedelta(days=30)
+MAX_INCREMENTAL_GAP = TOMBSTONE_RETENTION - timedelta(days=1)
+# Firestore's limit on writes per batch. Every caller counts what it stages, rollup
+# increments included, so batches are filled to the limit rather than kept below it.
+MAX_BATCH_WRITES = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ledger (
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    date TEXT,
+    category TEXT,
+    amount REAL,
+    doc TEXT NOT NULL,
+    PRIMARY KEY (collection, id)
+);
+CREATE INDEX IF NOT EXISTS ledger_user_date ON ledger (user_id, collection, date DESC, id);
+CREATE INDEX IF NOT EXISTS ledger_user_category ON ledger (user_id, collection, category, date DESC);
+CREATE TABLE IF NOT EXISTS sync_state (
+    user_id TEXT NOT NULL,
+    stream TEXT NOT NULL,
+    watermark TEXT,
+    PRIMARY KEY (user_id, stream)
+);
+"""
+
+
+def remove_replica_files(path):
+    """
+    Deletes a replica database along with its WAL and shared-memory files, if present.
+    """
+    for name in (path, f"{path}-wal", f"{path}-shm"):
+        try:
+            os.remove(name)
+        except FileNotFoundError:
+            pass
+
+
+def stage_delete(batch, db, user_id, collection, doc_id, must_exist=False):
+    """
+    Adds a document delete to `batch` together with the tombstone replicas use to drop their copy.
+    With `must_exist`, the whole batch fails with NotFound if the document is already gone.
+    """
+    options = {"option": db.write_option(exists=True)} if must_exist else {}
+    batch.delete(db.collection(collection).document(doc_id), **options)
+    batch.set(db.collection(TOMBSTONES_COLLECTION).document(), {
+        "user_id": user_id,
+        "collection": collection,
+        "doc_id": doc_id,
+        "deleted_at": firestore.SERVER_TIMESTAMP,
+    })
+
+
+def prune_tombstones(db, user_id, collection, retention=TOMBSTONE_RETENTION):
+    """
+    Deletes the user's tombstones for `collection` that are older than `retention`.
+    Every replica has either synced past them or will resync in full. Returns the number deleted.
+    """
+    cutoff = datetime.now(timezone.utc) - retention
+    query = db.collection(TOMBSTONES_COLLECTION).where('user_id', '==', user_id).where('collection', '==', collection).where('deleted_at', '<', cutoff)
+    deleted = 0
+    while True:
+        snapshots = list(query.limit(MAX_BATCH_WRITES).stream())
+        if not snapshots:
+            return deleted
+        batch = db.batch()
+        for snapshot in snapshots:
+            batch.delete(snapshot.reference)
+        batch.commit()
+        deleted += len(snapshots)
+
+
+def _pages(query, page_size):
+    """
+    Yields the query's snapshots one page at a time, continuing after each page's last document.
+    """
+    after = None
+    while True:
+        snapshots = list((query.start_after(after) if after is not None else query).limit(page_size).stream())
+        if snapshots:
+            yield snapshots
+        if len(snapshots) < page_size:
+            return
+        after = snapshots[-1]
+
+
+@contextmanager
+def _transaction(connection):
+    connection.execute("BEGIN")
+    try:
+        yield connection
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    connection.execute("COMMIT")
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    raise TypeError(f"Cannot store {type(value).__name__} in the replica")
+
+
+def _decode(value):
+    if "__datetime__" in value:
+        return datetime.fromisoformat(value["__datetime__"])
+    return value
+
+
+def _as_utc(value):
+    if value is None:
+        return None
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+class FirestoreStore:
+    """
+    Reads ledger data straight from Firestore. Same interface as ReplicaStore.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def rows(self, user_id, collection):
+        """
+        Returns all of the user's documents in `collection`, each with its "id".
+        """
+        docs = self.db.collection(collection).where('user_id', '==', user_id).stream()
+        return [{**doc.to_dict(), "id": doc.id} for doc in docs]
+
+    def fetch_page(self, user_id, collection, page_size, after=None, **filters):
+        """
+        Returns one newest-first Page of the user's documents.
+        """
+        return fetch_page(build_query(self.db, collection, user_id, **filters), page_size, after)
+
+    def mark_stale(self, user_id, collection=None):
+        """
+        Nothing to do: every read goes to Firestore.
+        """
+
+
+class ReplicaStore:
+    """
+    Serves ledger reads from a per-process SQLite (WAL) replica of Firestore.
+
+    Each (user, collection) is synced incrementally: documents with an `updated_at`
+    after the stored watermark are upserted, and tombstones written by deletes remove
+    rows. Documents written before `updated_at` existed are picked up by the first full
+    sync, which pages through the collection and removes local rows that no longer exist
+    once it has read every page. If Firestore is slow or unavailable the last synced data
+    is served. Each process also prunes expired tombstones of the collections it syncs.
+    """
+
+    def __init__(self, upstream, path, min_sync_interval=DEFAULT_MIN_SYNC_INTERVAL):
+        self.upstream = upstream
+        self.path = path
+        self.min_sync_interval = min_sync_interval
+        self._local = threading.local()
+        self._sync_locks = {}
+        self._last_sync = {}
+        self._pruned = set()
+        self._lock = threading.Lock()
+        self.sync_errors = 0
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(_SCHEMA)
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.row_factory = sqlite3.Row
+            self._local.connection = connection
+        return connection
+
+    # --- Sync ---
+
+    def mark_stale(self, user_id, collection=None):
+        """
+        Forces the next read of the user's data (or one collection) to sync first.
+        """
+        with self._lock:
+            for key in list(self._last_sync):
+                if key[0] == user_id and (collection is None or key[1] == collection):
+                    del self._last_sync[key]
+
+    def sync(self, user_id, collection, force=False):
+        """
+        Brings the local copy of one of the user's collections up to date.
+        Returns the number of upserted plus deleted rows, or None if the sync was skipped.
+        """
+        key = (user_id, collection)
+        with self._lock:
+            lock = self._sync_locks.setdefault(key, threading.Lock())
+        with lock:
+            with self._lock:
+                last = self._last_sync.get(key)
+            if not force and last is not None and time.monotonic() - last < self.min_sync_interval:
+                return None
+            try:
+                self._expire_watermarks(user_id, collection)
+                changed = self._pull_documents(user_id, collection) + self._pull_tombstones(user_id, collection)
+            except Exception:
+                with self._lock:
+                    self.sync_errors += 1
+                logger.exception("Replica sync failed for %s/%s; serving local data", user_id, collection)
+                return None
+            with self._lock:
+                self._last_sync[key] = time.monotonic()
+                prune = key not in self._pruned
+                self._pruned.add(key)
+            if prune:
+                submit(self._prune, user_id, collection)
+            return changed
+
+    def _prune(self, user_id, collection):
+        try:
+            prune_tombstones(self.upstream, user_id, collection)
+        except Exception:
+            logger.exception("Pruning tombstones failed for %s/%s", user_id, collection)
+
+    def _expire_watermarks(self, user_id, collection):
+        """
+        Drops the watermarks of a collection whose tombstones may have been pruned since
+        its last sync, so the next pull is a full sync.
+        """
+        watermark = self._watermark(user_id, f"{TOMBSTONES_COLLECTION}:{collection}")
+        if watermark is not None and watermark < datetime.now(timezone.utc) - MAX_INCREMENTAL_GAP:
+            self._connection().execute(
+                "DELETE FROM sync_state WHERE user_id = ? AND stream IN (?, ?)",
+                (user_id, collection, f"{TOMBSTONES_COLLECTION}:{collection}"),
+            )
+
+    def _watermark(self, user_id, stream):
+        row = self._connection().execute("SELECT watermark FROM sync_state WHERE user_id = ? AND stream = ?", (user_id, stream)).fetchone()
+        return datetime.fromisoformat(row["watermark"]) if row and row["watermark"] else None
+
+    def _set_watermark(self, connection, user_id, stream, watermark):
+        connection.execute(
+            "INSERT INTO sync_state (user_id, stream, watermark) VALUES (?, ?, ?) "
+            "ON CONFLICT (user_id, stream) DO UPDATE SET watermark = excluded.watermark",
+            (user_id, stream, watermark.isoformat() if watermark else None),
+        )
+
+    def _pull_documents(self, user_id, collection):
+        watermark = self._watermark(user_id, collection)
+        query = self.upstream.collection(collection).where('user_id', '==', user_id)
+        if watermark is not None:
+            query = query.where('updated_at', '>', watermark - SYNC_OVERLAP).order_by('updated_at')
+        # First sync: the upstream result is the complete set, so rows it does not contain are removed at the end
+        seen = set() if watermark is None else None
+
+        newest = watermark
+        changed = 0
+        connection = self._connection()
+        for docs in _pages(query, SYNC_PAGE_SIZE):
+            with _transaction(connection):
+                for doc in docs:
+                    data = doc.to_dict()
+                    # Undated rows are stored with an empty date, which sorts last and still
+                    # compares in the keyset cursor (NULL would drop them from every page)
+                    connection.execute(
+                        "INSERT OR REPLACE INTO ledger (collection, id, user_id, date, category, amount, doc) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (collection, doc.id, user_id, data.get('date') or '', data.get('category'), data.get('amount'), json.dumps(data, default=_encode)),
+                    )
+                    stamp = _as_utc(data.get('updated_at') or data.get('created_at'))
+                    if isinstance(stamp, datetime) and (newest is None or stamp > newest):
+                        newest = stamp
+                    if seen is not None:
+                        seen.add(doc.id)
+            changed += len(docs)
+
+        with _transaction(connection):
+            if seen is not None:
+                rows = connection.execute("SELECT id FROM ledger WHERE user_id = ? AND collection = ?", (user_id, collection)).fetchall()
+                removed = [(collection, row["id"]) for row in rows if row["id"] not in seen]
+                connection.executemany("DELETE FROM ledger WHERE collection = ? AND id = ?", removed)
+                changed += len(removed)
+            if newest is None:
+                newest = datetime.now(timezone.utc) - SYNC_OVERLAP
+            self._set_watermark(connection, user_id, collection, newest)
+        return changed
+
+    def _pull_tombstones(self, user_id, collection):
+        stream = f"{TOMBSTONES_COLLECTION}:{collection}"
+        watermark = self._watermark(user_id, stream)
+        query = self.upstream.collection(TOMBSTONES_COLLECTION).where('user_id', '==', user_id).where('collection', '==', collection)
+        if watermark is not None:
+            query = query.where('deleted_at', '>', watermark - SYNC_OVERLAP).order_by('deleted_at')
+        # Tombstones are only written, never updated, so every one deleted before this sync
+        # started has been read; advancing to here also tells _expire_watermarks the last sync time
+        synced_up_to = datetime.now(timezone.utc) - SYNC_OVERLAP
+
+        newest = watermark
+        changed = 0
+        connection = self._connection()
+        for snapshots in _pages(query, SYNC_PAGE_SIZE):
+            with _transaction(connection):
+                for snapshot in snapshots:
+                    tombstone = snapshot.to_dict()
+                    connection.execute("DELETE FROM ledger WHERE collection = ? AND id = ?", (collection, tombstone['doc_id']))
+                    stamp = _as_utc(tombstone.get('deleted_at'))
+                    if isinstance(stamp, datetime) and (newest is None or stamp > newest):
+                        newest = stamp
+            changed += len(snapshots)
+
+        if newest is None or newest < synced_up_to:
+            newest = synced_up_to
+        with _transaction(connection):
+            self._set_watermark(connection, user_id, stream, newest)
+        return changed
+
+    # --- Reads ---
+
+    def _decode_rows(self, rows):
+        return [{**json.loads(row["doc"], object_hook=_decode), "id": row["id"]} for row in rows]
+
+    def rows(self, user_id, collection):
+        """
+        Returns all of the user's documents in `collection`, each with its "id", newest first.
+        """
+        self.sync(user_id, collection)
+        rows = self._connection().execute(
+            "SELECT id, doc FROM ledger WHERE user_id = ? AND collection = ? ORDER BY date DESC, id",
+            (user_id, collection),
+        ).fetchall()
+        return self._decode_rows(rows)
+
+    def fetch_page(self, user_id, collection, page_size, after=None, start_date=None, end_date=None, category=None):
+        """
+        Returns one newest-first Page using keyset pagination on (date, id).
+        The cursor is the (date, id) of the previous page's last row.
+        """
+        self.sync(user_id, collection)
+        sql = "SELECT id, date, doc FROM ledger WHERE user_id = ? AND collection = ?"
+        params = [user_id, collection]
+        if category:
+            sql += " AND category = ?"
+            params.append(category)
+        if start_date:
+            sql += " AND date >= ?"
+            params.append(str(start_date))
+        if end_date:
+            sql += " AND date <= ?"
+            params.append(str(end_date))
+        if after is not None:
+            sql += " AND (date < ? OR (date = ? AND id > ?))"
+            params.extend([after[0], after[0], after[1]])
+        sql += " ORDER BY date DESC, id LIMIT ?"
+        params.append(page_size + 1)
+        rows = self._connection().execute(sql, params).fetchall()
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        cursor = (rows[-1]["date"], rows[-1]["id"]) if rows else None
+        return Page(self._decode_rows(rows), cursor, has_more)
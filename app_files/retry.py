@@ -0,0 +1,15 @@
+import random
+
+
+def retry_delay(attempt, error=None, base=0.5, cap=20):
+    """
+    Returns how long to wait before retry number `attempt` (0-based): exponential backoff
+    with full jitter, but at least as long as the server's Retry-After header asks.
+    """
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        delay = max(delay, float(headers.get("retry-after", 0)))
+    except (TypeError, ValueError):
+        pass
+    return delay
@@ -0,0 +1,245 @@
+import argparse
+from collections import defaultdict
+
+from firebase_admin import firestore
+from google.api_core.exceptions import NotFound
+
+from app_files.columnar import amount_to_cents
+from app_files.replica import MAX_BATCH_WRITES, stage_delete
+
+ROLLUPS_COLLECTION = 'rollups'
+# Version 2 stores integer cents; older rollups are rebuilt by ensure_rollups()
+ROLLUPS_VERSION = 2
+
+# Ledger collection -> (cents field, count field) in a monthly rollup document
+ROLLUP_FIELDS = {
+    'incomes': ('income_cents', 'income_count'),
+    'expenses': ('expense_cents', 'expense_count'),
+}
+
+
+def month_key(date_value):
+    """
+    Returns the 'YYYY-MM' month of a transaction `date` string.
+    """
+    return str(date_value)[:7]
+
+
+def rollup_ref(db, user_id, month):
+    """
+    Returns the document holding a user's totals for one month.
+    """
+    return db.collection(ROLLUPS_COLLECTION).document(f"{user_id}_{month}")
+
+
+def stage_rollup_update(batch, db, user_id, collection, transaction, sign=1):
+    """
+    Adds the increments for one income/expense to `batch`.
+    Use sign=1 when the transaction is created and sign=-1 when it is deleted.
+    """
+    stage_rollup_updates(batch, db, user_id, collection, [transaction], sign=sign)
+
+
+def stage_rollup_updates(batch, db, user_id, collection, transactions, sign=1):
+    """
+    Adds the combined increments for many incomes/expenses of one collection to `batch`,
+    one write per affected month. Amounts are added as integer cents, so totals do not
+    drift however many increments they receive. Returns the number of writes staged.
+    """
+    cents_field, count_field = ROLLUP_FIELDS[collection]
+    months = defaultdict(lambda: {"cents": 0, "count": 0, "categories": defaultdict(int)})
+    for transaction in transactions:
+        totals = months[month_key(transaction['date'])]
+        cents = amount_to_cents(transaction['amount'])
+        totals["cents"] += cents
+        totals["count"] += 1
+        if collection == 'expenses':
+            totals["categories"][transaction.get('category', 'Other')] += cents
+    for month, totals in months.items():
+        update = {
+            "user_id": user_id,
+            "month": month,
+            cents_field: firestore.Increment(sign * totals["cents"]),
+            count_field: firestore.Increment(sign * totals["count"]),
+        }
+        if totals["categories"]:
+            update["category_cents"] = {category: firestore.Increment(sign * cents) for category, cents in totals["categories"].items()}
+        batch.set(rollup_ref(db, user_id, month), update, merge=True)
+    return len(months)
+
+
+def add_transaction(db, user_id, collection, data):
+    """
+    Writes a new income/expense and its rollup increments in one atomic batch.
+    Returns the new document id.
+    """
+    batch = db.batch()
+    doc_ref = db.collection(collection).document()
+    batch.set(doc_ref, {**data, "updated_at": firestore.SERVER_TIMESTAMP})
+    stage_rollup_update(batch, db, user_id, collection, data, sign=1)
+    batch.commit()
+    return doc_ref.id
+
+
+def delete_transaction(db, user_id, collection, transaction):
+    """
+    Deletes an income/expense (a ledger row with its "id") and reverses its rollup increments atomically.
+    The delete only applies if the document still exists, so deleting a row twice (two tabs,
+    a double click, a stale table) does not subtract it twice. Returns False if it was already gone.
+    """
+    batch = db.batch()
+    stage_delete(batch, db, user_id, collection, transaction['id'], must_exist=True)
+    stage_rollup_update(batch, db, user_id, collection, transaction, sign=-1)
+    try:
+        batch.commit()
+    except NotFound:
+        return False
+    return True
+
+
+def load_rollups(db, user_id):
+    """
+    Returns the user's monthly rollup rows sorted by month.
+    """
+    docs = db.collection(ROLLUPS_COLLECTION).where('user_id', '==', user_id).stream()
+    return sorted((doc.to_dict() for doc in docs), key=lambda row: row['month'])
+
+
+def compute_rollups(incomes, expenses):
+    """
+    Computes monthly rollup rows from raw incomes and expenses.
+    Returns a dict of month -> row with the same fields as the stored documents.
+    """
+    rows = defaultdict(lambda: {"income_cents": 0, "income_count": 0, "expense_cents": 0, "expense_count": 0, "category_cents": defaultdict(int)})
+    for income in incomes:
+        row = rows[month_key(income['date'])]
+        row["income_cents"] += amount_to_cents(income['amount'])
+        row["income_count"] += 1
+    for expense in expenses:
+        row = rows[month_key(expense['date'])]
+        cents = amount_to_cents(expense['amount'])
+        row["expense_cents"] += cents
+        row["expense_count"] += 1
+        row["category_cents"][expense.get('category', 'Other')] += cents
+    return {month: {**row, "month": month, "category_cents": dict(row["category_cents"])} for month, row in rows.items()}
+
+
+def find_drift(stored_rows, expected_rows):
+    """
+    Compares stored rollup rows with freshly computed ones.
+    Returns a list of (month, field, stored, expected) tuples for every mismatch, with
+    amounts in currency units.
+    """
+    stored_by_month = {row['month']: row for row in stored_rows}
+    drift = []
+    for month in sorted(set(stored_by_month) | set(expected_rows)):
+        stored = stored_by_month.get(month, {})
+        expected = expected_rows.get(month, {})
+        for field in ("income_cents", "income_count", "expense_cents", "expense_count"):
+            stored_value = stored.get(field, 0)
+            expected_value = expected.get(field, 0)
+            if stored_value != expected_value:
+                if field.endswith("_cents"):
+                    drift.append((month, field[:-len("_cents")], stored_value / 100, expected_value / 100))
+                else:
+                    drift.append((month, field, stored_value, expected_value))
+        stored_categories = stored.get("category_cents", {})
+        expected_categories = expected.get("category_cents", {})
+        for category in sorted(set(stored_categories) | set(expected_categories)):
+            stored_value = stored_categories.get(category, 0)
+            expected_value = expected_categories.get(category, 0)
+            if stored_value != expected_value:
+                drift.append((month, f"categories.{category}", stored_value / 100, expected_value / 100))
+    return drift
+
+
+def _read_ledger(db, user_id, collection):
+    return [doc.to_dict() for doc in db.collection(collection).where('user_id', '==', user_id).stream()]
+
+
+def verify_rollups(db, user_id):
+    """
+    Recomputes the user's rollups from raw data and reports drift without writing anything.
+    """
+    expected = compute_rollups(_read_ledger(db, user_id, 'incomes'), _read_ledger(db, user_id, 'expenses'))
+    return find_drift(load_rollups(db, user_id), expected)
+
+
+def rebuild_rollups(db, user_id):
+    """
+    Recomputes the user's rollups from raw data, overwrites the stored documents and
+    marks the user profile as rolled up. Returns the drift that was corrected.
+
+    This is not a transaction: the ledger is read first and the rollups are overwritten
+    afterwards, so an income/expense written or deleted in between is not reflected in the
+    rebuilt totals. Rebuild while the user is not making changes, or verify afterwards.
+    """
+    stored = load_rollups(db, user_id)
+    expected = compute_rollups(_read_ledger(db, user_id, 'incomes'), _read_ledger(db, user_id, 'expenses'))
+    drift = find_drift(stored, expected)
+
+    batch = db.batch()
+    pending = 0
+
+    def staged():
+        nonlocal batch, pending
+        pending += 1
+        if pending >= MAX_BATCH_WRITES:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+
+    for row in stored:
+        if row['month'] not in expected:
+            batch.delete(rollup_ref(db, user_id, row['month']))
+            staged()
+    for month, row in expected.items():
+        batch.set(rollup_ref(db, user_id, month), {**row, "user_id": user_id})
+        staged()
+    batch.set(db.collection('users').document(user_id), {"rollups_version": ROLLUPS_VERSION}, merge=True)
+    batch.commit()
+    return drift
+
+
+def ensure_rollups(db, user_id, user_data):
+    """
+    Builds the rollups once for users whose history predates them.
+    Returns True if a rebuild was needed.
+    """
+    if (user_data or {}).get('rollups_version') == ROLLUPS_VERSION:
+        return False
+    rebuild_rollups(db, user_id)
+    return True
+
+
+def main():
+    """
+    Command-line entry point: verify or rebuild a user's rollups.
+
+        python -m app_files.rollups verify <user_id>
+        python -m app_files.rollups rebuild <user_id>
+    """
+    import toml
+    from app_files.firebase_utils import initialize_firebase, get_firestore_db
+
+    parser = argparse.ArgumentParser(description="Verify or rebuild monthly Dashboard rollups.")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    parser.add_argument("user_ids", nargs="+")
+    parser.add_argument("--secrets", default=".streamlit/secrets.toml", help="Path to the Streamlit secrets file")
+    args = parser.parse_args()
+
+    initialize_firebase(toml.load(args.secrets)["firebase"])
+    db = get_firestore_db()
+    exit_code = 0
+    for user_id in args.user_ids:
+        drift = verify_rollups(db, user_id) if args.command == "verify" else rebuild_rollups(db, user_id)
+        print(f"{user_id}: {len(drift)} drifted field(s)")
+        for month, field, stored, expected in drift:
+            print(f"  {month} {field}: stored={stored} expected={expected}")
+        if drift and args.command == "verify":
+            exit_code = 1
+    return exit_code
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,30 @@
+import time
+
+PROFILE_KEY = 'profile_cache'
+DEFAULT_PROFILE_TTL_SECONDS = 10 * 60
+
+
+def cached_profile(state, user_id, ttl_seconds=DEFAULT_PROFILE_TTL_SECONDS):
+    """
+    Returns the user document cached in this session's `state` (st.session_state), or None
+    when it has not been read yet, belongs to another user or is older than `ttl_seconds`.
+    """
+    entry = state.get(PROFILE_KEY)
+    if entry is None or entry['user_id'] != user_id or entry['loaded_at'] + ttl_seconds < time.monotonic():
+        return None
+    return entry['profile']
+
+
+def store_profile(state, user_id, profile):
+    """
+    Caches a freshly read user document in this session and returns it.
+    """
+    state[PROFILE_KEY] = {"user_id": user_id, "profile": profile or {}, "loaded_at": time.monotonic()}
+    return state[PROFILE_KEY]['profile']
+
+
+def invalidate_profile(state):
+    """
+    Drops this session's cached user document, e.g. after the profile was updated.
+    """
+    state.pop(PROFILE_KEY, None)
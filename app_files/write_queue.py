@@ -0,0 +1,365 @@
+import atexit
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import wait
+
+from firebase_admin import firestore
+
+from app_files.data_fetch import submit
+from app_files.instrumentation import percentile
+from app_files.replica import MAX_BATCH_WRITES
+from app_files.retry import retry_delay
+from app_files.rollups import stage_rollup_updates
+
+logger = logging.getLogger(__name__)
+
+# Transactions per commit. Each also adds at most one rollup write (per month), so max_batch
+# is capped at half of MAX_BATCH_WRITES
+DEFAULT_MAX_BATCH = 200
+# How long the first write of a batch waits for others to join it
+DEFAULT_MAX_WAIT_SECONDS = 0.25
+DEFAULT_MAX_RETRIES = 5
+BASE_BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 30
+# How long an exiting process waits for queued writes to be committed
+DEFAULT_SHUTDOWN_SECONDS = 10
+# How long a batch waits for its expenses to be categorized before saving them as FALLBACK_CATEGORY
+DEFAULT_CATEGORIZE_TIMEOUT_SECONDS = 5
+FALLBACK_CATEGORY = "Other"
+LAG_SAMPLES = 1000
+
+
+class _Write:
+    # One new income/expense on its way to Firestore
+    def __init__(self, user_id, collection, doc_id, data):
+        self.user_id = user_id
+        self.collection = collection
+        self.doc_id = doc_id
+        self.data = data
+        self.submitted_at = time.monotonic()
+        self.attempts = 0
+        self.error = None
+
+    def row(self):
+        return {**self.data, "id": self.doc_id}
+
+
+class WriteQueue:
+    """
+    Process-wide background writer for new incomes and expenses.
+
+    submit() assigns the document id locally and returns at once. A worker thread collects
+    the writes that arrive within `max_wait_seconds` (up to `max_batch`), categorizes the
+    expenses submitted without a category (waiting at most `categorize_timeout_seconds`),
+    and commits the documents with their rollup increments in one batch. When a commit
+    fails, its writes are split by user and each user's are retried on their own, up to
+    `max_retries` times with jittered backoff; retries are scheduled rather than slept on,
+    so other writes keep flowing. Writes that run out of retries are kept as failed until
+    retry_failed() or discard_failed(). Documents are written with create(),
+    so a commit that reached Firestore but reported an error cannot be applied (and its
+    rollups incremented) twice: before retrying, writes whose documents exist are counted
+    as committed.
+
+    Writes only live in this process's memory until they are committed. When the process
+    exits normally it waits up to `shutdown_seconds` for them to be flushed; a process that
+    is killed loses the writes still queued.
+
+    Until they are committed, writes are listed by pending(). `on_committed(user_id,
+    collection, rows)` runs on the worker thread after each commit, and version(user_id)
+    changes so sessions know to re-read their tables.
+    """
+
+    def __init__(self, db, categorizer=None, on_committed=None, max_batch=DEFAULT_MAX_BATCH,
+                 max_wait_seconds=DEFAULT_MAX_WAIT_SECONDS, max_retries=DEFAULT_MAX_RETRIES, backoff_seconds=BASE_BACKOFF_SECONDS,
+                 shutdown_seconds=DEFAULT_SHUTDOWN_SECONDS, categorize_timeout_seconds=DEFAULT_CATEGORIZE_TIMEOUT_SECONDS):
+        self.db = db
+        self.categorizer = categorizer
+        self.on_committed = on_committed
+        self.max_batch = min(max_batch, MAX_BATCH_WRITES // 2)
+        self.max_wait_seconds = max_wait_seconds
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.shutdown_seconds = shutdown_seconds
+        self.categorize_timeout_seconds = categorize_timeout_seconds
+        self._queue = deque()
+        self._retry_at = []  # heap of (monotonic due time, sequence, one user's writes)
+        self._retry_sequence = itertools.count()
+        self._pending = {}  # user_id -> OrderedDict(doc_id -> _Write), queued or being written
+        self._failed = {}  # user_id -> OrderedDict(doc_id -> _Write)
+        self._versions = {}  # user_id -> number of commits that included the user's writes
+        self._cond = threading.Condition()
+        self._thread = None
+        self._lags = deque(maxlen=LAG_SAMPLES)
+        self.max_queue_depth = 0
+        self.submitted = 0
+        self.written = 0
+        self.commits = 0
+        self.retries = 0
+        self.errors = 0
+        self.categorize_errors = 0
+
+    def submit(self, user_id, collection, data):
+        """
+        Queues a new income/expense document and returns its id. Expenses without a
+        "category" are categorized before they are written.
+        """
+        doc_id = self.db.collection(collection).document().id
+        self._enqueue([_Write(user_id, collection, doc_id, dict(data))])
+        with self._cond:
+            self.submitted += 1
+        return doc_id
+
+    def pending(self, user_id, collection=None):
+        """
+        Returns the user's rows (with their "id") that are queued or being written, oldest first.
+        """
+        with self._cond:
+            writes = list(self._pending.get(user_id, {}).values())
+        return [write.row() for write in writes if collection is None or write.collection == collection]
+
+    def failed(self, user_id, collection=None):
+        """
+        Returns the user's rows that could not be written, with the last "error".
+        """
+        with self._cond:
+            writes = list(self._failed.get(user_id, {}).values())
+        return [{**write.row(), "error": write.error} for write in writes if collection is None or write.collection == collection]
+
+    def retry_failed(self, user_id, collection=None):
+        """
+        Queues the user's failed writes again. Returns how many were queued.
+        """
+        with self._cond:
+            failed = self._failed.get(user_id, {})
+            writes = [write for write in failed.values() if collection is None or write.collection == collection]
+            for write in writes:
+                del failed[write.doc_id]
+                write.attempts = 0
+                write.submitted_at = time.monotonic()
+        self._enqueue(writes)
+        return len(writes)
+
+    def discard_failed(self, user_id, collection=None):
+        """
+        Drops the user's failed writes. Returns how many were dropped.
+        """
+        with self._cond:
+            failed = self._failed.get(user_id, {})
+            doc_ids = [doc_id for doc_id, write in failed.items() if collection is None or write.collection == collection]
+            for doc_id in doc_ids:
+                del failed[doc_id]
+        return len(doc_ids)
+
+    def version(self, user_id):
+        """
+        Returns a number that changes whenever some of the user's writes are committed.
+        """
+        with self._cond:
+            return self._versions.get(user_id, 0)
+
+    def flush(self, timeout=None):
+        """
+        Waits until every queued write has been committed or has failed.
+        Returns False if that did not happen within `timeout` seconds.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not any(self._pending.values()), timeout)
+
+    def stats(self):
+        """
+        Returns a snapshot of the queue depth, counters and percentiles (in milliseconds) of
+        the lag between submitting a write and committing it.
+        """
+        with self._cond:
+            now = time.monotonic()
+            pending = [write for writes in self._pending.values() for write in writes.values()]
+            lags = sorted(self._lags)
+            stats = {
+                "queue_depth": len(self._queue),
+                "max_queue_depth": self.max_queue_depth,
+                "pending": len(pending),
+                "failed": sum(len(writes) for writes in self._failed.values()),
+                "oldest_pending_seconds": max((now - write.submitted_at for write in pending), default=0.0),
+                "submitted": self.submitted,
+                "written": self.written,
+                "commits": self.commits,
+                "retries": self.retries,
+                "errors": self.errors,
+                "categorize_errors": self.categorize_errors,
+            }
+        for q in (0.5, 0.95, 0.99):
+            value = percentile(lags, q)
+            stats[f"lag_p{int(q * 100)}_ms"] = None if value is None else value * 1000
+        return stats
+
+    def _enqueue(self, writes):
+        if not writes:
+            return
+        with self._cond:
+            for write in writes:
+                self._pending.setdefault(write.user_id, OrderedDict())[write.doc_id] = write
+                self._queue.append(write)
+            self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+            self._cond.notify_all()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+                self._thread.start()
+                atexit.register(self._flush_at_exit)
+
+    def _flush_at_exit(self):
+        if not self.flush(self.shutdown_seconds):
+            logger.error("Exiting with %d unsaved write(s)", self.stats()['pending'])
+
+    def _run(self):
+        while True:
+            writes = self._next_batch()
+            try:
+                self._write(writes)
+            except Exception:
+                logger.exception("Write queue batch failed unexpectedly")
+
+    def _next_batch(self):
+        with self._cond:
+            while True:
+                # Retries that are due go first, each user's on their own
+                if self._retry_at and self._retry_at[0][0] <= time.monotonic():
+                    return heapq.heappop(self._retry_at)[2]
+                if self._queue:
+                    break
+                self._cond.wait(self._retry_at[0][0] - time.monotonic() if self._retry_at else None)
+            # Let a burst of submits gather into one commit
+            deadline = self._queue[0].submitted_at + self.max_wait_seconds
+            while len(self._queue) < self.max_batch and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+            return [self._queue.popleft() for _ in range(min(len(self._queue), self.max_batch))]
+
+    def _write(self, writes):
+        self._categorize(writes)
+        try:
+            self._commit(writes)
+        except Exception as e:
+            # A commit is atomic: either all of its documents exist now or none do
+            committed = self._find_committed(writes)
+            if committed:
+                self._finish(committed, committed=True)
+            self._schedule_retries([write for write in writes if write not in committed], e)
+            return
+        self._finish(writes, committed=True)
+
+    def _schedule_retries(self, writes, error):
+        """
+        Splits the writes of a failed commit by user and schedules each user's retry
+        separately, so one user's failing writes neither hold up nor fail anyone else's.
+        Writes that have used up `max_retries` are kept as failed.
+        """
+        by_user = OrderedDict()
+        for write in writes:
+            write.attempts += 1
+            write.error = f"{type(error).__name__}: {error}"
+            by_user.setdefault(write.user_id, []).append(write)
+        for user_writes in by_user.values():
+            given_up = [write for write in user_writes if write.attempts > self.max_retries]
+            if given_up:
+                logger.error("Could not write %d transaction(s) after %d attempts; keeping them as failed: %s", len(given_up), self.max_retries + 1, error)
+                self._finish(given_up, committed=False)
+            retry = [write for write in user_writes if write.attempts <= self.max_retries]
+            if not retry:
+                continue
+            delay = retry_delay(retry[0].attempts - 1, error, base=self.backoff_seconds, cap=MAX_BACKOFF_SECONDS)
+            logger.warning("Write queue commit failed (%s), retrying %d write(s) in %.1fs", error, len(retry), delay)
+            with self._cond:
+                self.retries += 1
+                heapq.heappush(self._retry_at, (time.monotonic() + delay, next(self._retry_sequence), retry))
+                self._cond.notify_all()
+
+    def _find_committed(self, writes):
+        """
+        Returns the writes whose documents already exist in Firestore, or an empty list when
+        that cannot be checked (the next create() would then fail instead of writing twice).
+        """
+        try:
+            snapshots = self.db.get_all([self.db.collection(write.collection).document(write.doc_id) for write in writes])
+            existing = {snapshot.id for snapshot in snapshots if snapshot.exists}
+        except Exception:
+            logger.warning("Could not check which writes were committed", exc_info=True)
+            return []
+        return [write for write in writes if write.doc_id in existing]
+
+    def _categorize(self, writes):
+        """
+        Categorizes the expenses submitted without a category, one categorize_many() call per
+        user on the I/O pool. Whatever is not done within `categorize_timeout_seconds` is saved
+        as FALLBACK_CATEGORY, so a slow LLM does not hold up the commit.
+        """
+        uncategorized = OrderedDict()
+        for write in writes:
+            if write.collection == 'expenses' and not write.data.get('category'):
+                uncategorized.setdefault(write.user_id, []).append(write)
+        if not uncategorized:
+            return
+        futures = {}
+        if self.categorizer is not None:
+            for user_id, user_writes in uncategorized.items():
+                futures[user_id] = submit(self.categorizer.categorize_many, user_id, [write.data['description'] for write in user_writes])
+            wait(futures.values(), timeout=self.categorize_timeout_seconds)
+        for user_id, user_writes in uncategorized.items():
+            categories = {}
+            future = futures.get(user_id)
+            if future is not None:
+                if not future.done():
+                    logger.warning("Categorizing %d expense(s) timed out; saving them as %s", len(user_writes), FALLBACK_CATEGORY)
+                    with self._cond:
+                        self.categorize_errors += 1
+                elif future.exception() is not None:
+                    logger.error("Could not categorize %d expense(s)", len(user_writes), exc_info=future.exception())
+                    with self._cond:
+                        self.categorize_errors += 1
+                else:
+                    categories = future.result()
+            for write in user_writes:
+                write.data = {**write.data, 'category': categories.get(write.data['description']) or FALLBACK_CATEGORY}
+
+    def _commit(self, writes):
+        batch = self.db.batch()
+        groups = OrderedDict()
+        for write in writes:
+            batch.create(self.db.collection(write.collection).document(write.doc_id), {**write.data, "updated_at": firestore.SERVER_TIMESTAMP})
+            groups.setdefault((write.user_id, write.collection), []).append(write.data)
+        for (user_id, collection), rows in groups.items():
+            stage_rollup_updates(batch, self.db, user_id, collection, rows)
+        batch.commit()
+
+    def _finish(self, writes, committed):
+        if committed and self.on_committed is not None:
+            # Before the writes leave pending(), so a session never sees them in neither place
+            groups = OrderedDict()
+            for write in writes:
+                groups.setdefault((write.user_id, write.collection), []).append(write.row())
+            for (user_id, collection), rows in groups.items():
+                try:
+                    self.on_committed(user_id, collection, rows)
+                except Exception:
+                    logger.exception("Write queue callback failed for %s/%s", user_id, collection)
+        now = time.monotonic()
+        with self._cond:
+            for write in writes:
+                self._pending.get(write.user_id, {}).pop(write.doc_id, None)
+                if committed:
+                    self._lags.append(now - write.submitted_at)
+                else:
+                    self._failed.setdefault(write.user_id, OrderedDict())[write.doc_id] = write
+            for user_id in {write.user_id for write in writes}:
+                if user_id in self._pending and not self._pending[user_id]:
+                    del self._pending[user_id]
+            if committed:
+                self.commits += 1
+                self.written += len(writes)
+                for user_id in {write.user_id for write in writes}:
+                    self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            else:
+                self.errors += 1
+            self._cond.notify_all()
@@ -0,0 +1,4 @@
+"""
+Benchmarks for the app's hot paths against synthetic users, an in-memory Firestore
+and a latency-simulating Groq stub. Run with `python -m benchmarks.run --help`.
+"""
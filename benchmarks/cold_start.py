@@ -0,0 +1,111 @@
+"""
+Measures how long a fresh process takes to render the login page, and checks it against a budget.
+
+    python -m benchmarks.cold_start [--runs 5] [--budget 1.5]
+
+Each run starts a new interpreter and renders app.py with Streamlit's AppTest and a
+placeholder Firebase config (signing in is not attempted, so no credentials are needed).
+Importing Streamlit itself is timed separately and not counted against the budget. The
+exit status is 1 when the median render is over budget, the page raises, or the render
+imported any of DEFERRED_MODULES, which should only load after sign-in.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BUDGET_SECONDS = 1.5
+DEFERRED_MODULES = (
+    'altair',
+    'firebase_admin',
+    'groq',
+    'app_files.analytics',
+    'app_files.columnar',
+    'app_files.importer',
+    'app_files.live_updates',
+    'app_files.llm_gateway',
+    'app_files.replica',
+    'app_files.rollups',
+    'app_files.write_queue',
+)
+PLACEHOLDER_FIREBASE = {
+    "apiKey": "cold-start",
+    "authDomain": "cold-start.firebaseapp.com",
+    "databaseURL": "https://cold-start.firebaseio.com",
+    "projectId": "cold-start",
+    "storageBucket": "cold-start.appspot.com",
+}
+
+
+def probe():
+    """
+    Renders the login page once in this (fresh) process and prints the timings as JSON.
+    """
+    started = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    streamlit_seconds = time.perf_counter() - started
+
+    before = set(sys.modules)
+    app = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+    app.secrets["firebase"] = PLACEHOLDER_FIREBASE
+    started = time.perf_counter()
+    app.run()
+    render_seconds = time.perf_counter() - started
+    loaded = set(sys.modules) - before
+    print(json.dumps({
+        "streamlit_seconds": streamlit_seconds,
+        "render_seconds": render_seconds,
+        "exceptions": [str(exception.value) for exception in app.exception],
+        "deferred_loaded": sorted(name for name in DEFERRED_MODULES if name in loaded),
+    }))
+
+
+def run_probe():
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    env.pop("GROQ_API_KEY", None)  # the login page must not need it
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.cold_start", "--probe"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        sys.exit(f"The cold start probe failed with exit status {result.returncode}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the Finance Manager cold start against a budget.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes to time")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET_SECONDS, help="Allowed median seconds to render the login page")
+    parser.add_argument("--probe", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.probe:
+        probe()
+        return
+
+    runs = [run_probe() for _ in range(args.runs)]
+    streamlit_median = statistics.median(run["streamlit_seconds"] for run in runs)
+    render_median = statistics.median(run["render_seconds"] for run in runs)
+    print(f"import streamlit: {streamlit_median * 1000:.0f} ms (median of {len(runs)})")
+    print(f"login page:       {render_median * 1000:.0f} ms (median of {len(runs)}, budget {args.budget * 1000:.0f} ms)")
+
+    failures = []
+    if render_median > args.budget:
+        failures.append(f"login page took {render_median:.2f}s, over the {args.budget:.2f}s budget")
+    for exception in sorted({exception for run in runs for exception in run["exceptions"]}):
+        failures.append(f"login page raised: {exception}")
+    deferred = sorted({name for run in runs for name in run["deferred_loaded"]})
+    if deferred:
+        failures.append(f"login page imported {', '.join(deferred)}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+A local HTTP server that speaks Groq's chat completions API, for exercising the real Groq
+client and the LLM gateway without network access or an API key.
+
+    python -m benchmarks.groq_server --port 8787     # then GROQ_BASE_URL=http://127.0.0.1:8787
+    python -m benchmarks.groq_server --check         # run the gateway checks against it
+
+Responses (streamed or not) wait `first_token_seconds` before the first token and
+`token_seconds` between tokens. fail_next() makes the next requests fail with a status
+code, and the server counts requests and the highest number served at once.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.groq_stub import DEFAULT_REPLY
+
+COMPLETIONS_PATH = "/openai/v1/chat/completions"
+
+
+class GroqStubServer:
+    """
+    Serves chat completions on 127.0.0.1 from a background thread; use as a context manager.
+    """
+
+    def __init__(self, port=0, first_token_seconds=0.05, token_seconds=0.005, reply=DEFAULT_REPLY):
+        self.first_token_seconds = first_token_seconds
+        self.token_seconds = token_seconds
+        self.reply = reply
+        self.requests = 0
+        self.concurrent = 0
+        self.max_concurrent = 0
+        self.statuses = {}
+        self._failures = []  # (status, retry_after) for the next requests
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def fail_next(self, status, count=1, retry_after=None):
+        """
+        Makes the next `count` requests fail with `status`, optionally with a Retry-After header.
+        """
+        with self._lock:
+            self._failures.extend([(status, retry_after)] * count)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with server._lock:
+                    server.requests += 1
+                    server.concurrent += 1
+                    server.max_concurrent = max(server.max_concurrent, server.concurrent)
+                    failure = server._failures.pop(0) if server._failures else None
+                try:
+                    if self.path != COMPLETIONS_PATH:
+                        self._json(404, {"error": {"message": "Not found"}})
+                    elif failure is not None:
+                        status, retry_after = failure
+                        headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+                        self._json(status, {"error": {"message": f"Stub failure {status}", "type": "stub"}}, headers)
+                    elif body.get("stream"):
+                        self._stream(body)
+                    else:
+                        self._complete(body)
+                finally:
+                    with server._lock:
+                        server.concurrent -= 1
+
+            def _tokens(self, body):
+                tokens = [word + " " for word in server.reply.split()]
+                if body.get("max_tokens"):
+                    tokens = tokens[:body["max_tokens"]]
+                prompt_tokens = sum(len(message.get("content") or "") for message in body.get("messages", [])) // 4
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens)}
+                return tokens, usage
+
+            def _complete(self, body):
+                tokens, usage = self._tokens(body)
+                time.sleep(server.first_token_seconds + server.token_seconds * max(len(tokens) - 1, 0))
+                self._json(200, {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", ""),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens).strip()}, "finish_reason": "stop"}],
+                    "usage": usage,
+                })
+
+            def _stream(self, body):
+                tokens, usage = self._tokens(body)
+                self._record(200)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                try:
+                    for position, token in enumerate(tokens):
+                        time.sleep(server.first_token_seconds if position == 0 else server.token_seconds)
+                        chunk = {
+                            "id": "chatcmpl-stub",
+                            "object": "chat.completion.chunk",
+                            "created": int(time.time()),
+                            "model": body.get("model", ""),
+                            "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                        }
+                        if position == len(tokens) - 1:
+                            chunk["choices"][0]["finish_reason"] = "stop"
+                            chunk["x_groq"] = {"id": "req-stub", "usage": usage}
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                        self.wfile.flush()
+                    self.wfile.write(b"data: [DONE]\n\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                self.close_connection = True
+
+            def _json(self, status, payload, headers=None):
+                self._record(status)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                try:
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up waiting, e.g. in the timeout check
+                    self.close_connection = True
+
+            def _record(self, status):
+                with server._lock:
+                    server.statuses[status] = server.statuses.get(status, 0) + 1
+
+        return Handler
+
+
+# --- Gateway checks ---
+
+def _groq(server, **kwargs):
+    from groq import Groq
+    return Groq(api_key="stub", base_url=server.url, max_retries=0, **kwargs)
+
+
+def _ask(client, content, stream=False):
+    messages = [{"role": "user", "content": content}]
+    if stream:
+        return "".join(chunk.choices[0].delta.content or "" for chunk in client.chat.completions.create(messages=messages, model="stub", stream=True))
+    return client.chat.completions.create(messages=messages, model="stub").choices[0].message.content
+
+
+def check_coalescing(server, gateway):
+    with ThreadPoolExecutor(8) as pool:
+        replies = list(pool.map(lambda _: _ask(gateway, "summary"), range(8)))
+    assert server.requests == 1, f"{server.requests} upstream requests for 8 identical calls"
+    assert len(set(replies)) == 1
+
+
+def check_stream_coalescing(server, gateway):
+    with ThreadPoolExecutor(4) as pool:
+        replies = list(pool.map(lambda _: _ask(gateway, "summary", stream=True), range(4)))
+    assert server.requests == 1, f"{server.requests} upstream requests for 4 identical streams"
+    assert all(reply.strip() == server.reply for reply in replies), "a stream reader missed chunks"
+
+
+def check_backoff(server, gateway):
+    server.fail_next(429, count=2, retry_after=0)
+    server.fail_next(503)
+    assert _ask(gateway, "retry me")
+    assert gateway.stats()["retries"] == 3 and server.requests == 4
+
+
+def check_concurrency(server, gateway):
+    with ThreadPoolExecutor(10) as pool:
+        list(pool.map(lambda n: _ask(gateway, f"question {n}"), range(10)))
+    assert server.max_concurrent <= 3, f"{server.max_concurrent} requests ran at once"
+    assert gateway.stats()["max_queue_depth"] > 0
+
+
+def check_rate_limit(server, gateway):
+    started = time.monotonic()
+    for n in range(6):
+        _ask(gateway, f"question {n}")
+    # Three requests of burst, then one every 0.1s
+    assert time.monotonic() - started >= 0.25, "requests were not rate limited"
+
+
+def check_timeout(server, gateway):
+    from app_files.llm_gateway import GatewayTimeout
+    from groq import APITimeoutError
+    server.first_token_seconds = 1.0
+    try:
+        _ask(gateway, "slow")
+    except (APITimeoutError, GatewayTimeout):
+        return
+    raise AssertionError("a slow response did not time out")
+
+
+CHECKS = [
+    ("coalescing", check_coalescing, {}),
+    ("stream coalescing", check_stream_coalescing, {}),
+    ("backoff on 429/5xx", check_backoff, {}),
+    ("concurrency limit", check_concurrency, {"max_concurrency": 3}),
+    ("rate limit", check_rate_limit, {"max_concurrency": 3, "requests_per_minute": 600}),
+    ("timeout", check_timeout, {"timeout": 0.3}),
+]
+
+
+def run_checks():
+    """
+    Runs each gateway check against a fresh stub server. Returns the number of failures.
+    """
+    from app_files.llm_gateway import LLMGateway
+    failures = 0
+    for name, check, options in CHECKS:
+        with GroqStubServer(first_token_seconds=0.2 if "coalescing" in name else 0.02) as server:
+            gateway = LLMGateway(_groq(server), **{"requests_per_minute": 6000, "backoff_seconds": 0.01, **options})
+            try:
+                check(server, gateway)
+                print(f"PASS {name}")
+            except Exception as e:
+                failures += 1
+                print(f"FAIL {name}: {type(e).__name__}: {e}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for Groq's chat completions API.")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--token-ms", type=float, default=10)
+    parser.add_argument("--check", action="store_true", help="Run the LLM gateway checks and exit")
+    args = parser.parse_args()
+    if args.check:
+        sys.exit(1 if run_checks() else 0)
+    server = GroqStubServer(args.port, args.first_token_ms / 1000, args.token_ms / 1000)
+    print(f"Serving Groq chat completions on {server.url} (Ctrl+C to stop)")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
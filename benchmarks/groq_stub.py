@@ -0,0 +1,75 @@
+import threading
+import time
+from types import SimpleNamespace
+
+DEFAULT_REPLY = (
+    "You are spending most of your budget on food and utilities. Setting a weekly grocery "
+    "limit and reviewing subscriptions would free up money for your savings goals."
+)
+
+
+def _usage(prompt_chars, tokens):
+    # Roughly four characters per prompt token
+    return SimpleNamespace(prompt_tokens=prompt_chars // 4, completion_tokens=len(tokens), total_tokens=prompt_chars // 4 + len(tokens))
+
+
+class _Stream:
+    def __init__(self, tokens, usage, first_token_seconds, token_seconds):
+        self._tokens = tokens
+        self._usage = usage
+        self._first_token_seconds = first_token_seconds
+        self._token_seconds = token_seconds
+        self.closed = False
+
+    def __iter__(self):
+        for position, token in enumerate(self._tokens):
+            if self.closed:
+                return
+            time.sleep(self._first_token_seconds if position == 0 else self._token_seconds)
+            # Like Groq, the last chunk carries the usage
+            x_groq = SimpleNamespace(usage=self._usage) if position == len(self._tokens) - 1 else None
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))], x_groq=x_groq)
+
+    def close(self):
+        self.closed = True
+
+
+class _Completions:
+    def __init__(self, stub):
+        self._stub = stub
+
+    def create(self, messages, model, stream=False, max_tokens=None, **kwargs):
+        stub = self._stub
+        prompt_chars = sum(len(message["content"]) for message in messages)
+        with stub._lock:
+            stub.calls += 1
+            stub.prompt_chars += prompt_chars
+        prompt = messages[-1]["content"]
+        reply = stub.respond(prompt) if stub.respond is not None else stub.reply
+        tokens = [word + " " for word in reply.split()]
+        if max_tokens is not None:
+            tokens = tokens[:max_tokens]
+        if stream:
+            return _Stream(tokens, _usage(prompt_chars, tokens), stub.first_token_seconds, stub.token_seconds)
+        time.sleep(stub.first_token_seconds + stub.token_seconds * max(len(tokens) - 1, 0))
+        message = SimpleNamespace(content="".join(tokens).strip())
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=_usage(prompt_chars, tokens))
+
+
+class GroqStub:
+    """
+    Stands in for the Groq client's chat.completions.create(), with and without stream=True.
+    Each response waits `first_token_seconds` before its first token and `token_seconds`
+    between tokens. `respond(prompt)` can pick the reply per prompt; `calls` and
+    `prompt_chars` count usage.
+    """
+
+    def __init__(self, first_token_seconds=0.3, token_seconds=0.01, reply=DEFAULT_REPLY, respond=None):
+        self.first_token_seconds = first_token_seconds
+        self.token_seconds = token_seconds
+        self.reply = reply
+        self.respond = respond
+        self.calls = 0
+        self.prompt_chars = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=_Completions(self))
@@ -0,0 +1,398 @@
+"""
+An in-memory stand-in for the parts of the Firestore client this app uses.
+
+It supports collection/document references, chained where()/order_by()/limit()/
+start_after() queries, get_all(), write batches (create/set/update/delete, with write_option(exists=True)), merge writes
+with Increment and SERVER_TIMESTAMP transforms, and on_snapshot() listeners. It is meant
+for local development, tests and benchmarks, e.g. as the upstream of the SQLite replica;
+it is not a full emulator.
+"""
+import copy
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+try:
+    from google.api_core.exceptions import AlreadyExists, NotFound
+except ImportError:
+    class AlreadyExists(Exception):
+        pass
+
+    class NotFound(Exception):
+        pass
+
+DESCENDING = "DESCENDING"
+ASCENDING = "ASCENDING"
+
+
+def _is_server_timestamp(value):
+    return type(value).__name__ == "Sentinel" and "timestamp" in getattr(value, "description", "").lower()
+
+
+def _is_delete_field(value):
+    return type(value).__name__ == "Sentinel" and "delete" in getattr(value, "description", "").lower()
+
+
+def _is_increment(value):
+    return type(value).__name__ == "Increment" and hasattr(value, "value")
+
+
+def _apply(target, data, now):
+    """
+    Writes `data` into `target` (a dict), resolving transforms and merging nested maps.
+    """
+    for key, value in data.items():
+        if _is_delete_field(value):
+            target.pop(key, None)
+        elif _is_server_timestamp(value):
+            target[key] = now
+        elif _is_increment(value):
+            current = target.get(key)
+            target[key] = (current if isinstance(current, (int, float)) else 0) + value.value
+        elif isinstance(value, dict):
+            nested = target.get(key)
+            if not isinstance(nested, dict):
+                nested = {}
+            target[key] = _apply(nested, value, now)
+        else:
+            target[key] = copy.deepcopy(value)
+    return target
+
+
+def _field(data, field):
+    value = data
+    for part in field.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def _rank(value):
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    return 5
+
+
+def _sort_key(value):
+    if isinstance(value, datetime) and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (_rank(value), value)
+
+
+def _matches(value, op, expected):
+    if op == "==":
+        return value == expected
+    if op == "!=":
+        return value is not None and value != expected
+    if op == "in":
+        return value in expected
+    if op == "not-in":
+        return value is not None and value not in expected
+    if op == "array_contains":
+        return isinstance(value, list) and expected in value
+    if op == "array_contains_any":
+        return isinstance(value, list) and any(item in value for item in expected)
+    # Range filters only match values of the same type, like Firestore
+    if value is None or _rank(value) != _rank(expected):
+        return False
+    left, right = _sort_key(value)[1], _sort_key(expected)[1]
+    return {"<": left < right, "<=": left <= right, ">": left > right, ">=": left >= right}[op]
+
+
+class DocumentSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return _field(self._data, field)
+
+
+class DocumentReference:
+    def __init__(self, client, collection, doc_id):
+        self._client = client
+        self.collection_name = collection
+        self.id = doc_id
+
+    @property
+    def path(self):
+        return f"{self.collection_name}/{self.id}"
+
+    def get(self):
+        self._client._tick(reads=1)
+        with self._client._lock:
+            data = self._client._collections.get(self.collection_name, {}).get(self.id)
+            return DocumentSnapshot(self, copy.deepcopy(data))
+
+    def set(self, data, merge=False):
+        self._client._commit([("set", self, data, merge)])
+
+    def update(self, data):
+        self._client._commit([("update", self, data, True)])
+
+    def delete(self):
+        self._client._commit([("delete", self, None, False)])
+
+
+class Query:
+    def __init__(self, client, collection, filters=(), orders=(), limit=None, cursor=None):
+        self._client = client
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._cursor = cursor
+
+    def _copy(self, **changes):
+        state = {"filters": self._filters, "orders": self._orders, "limit": self._limit, "cursor": self._cursor}
+        state.update(changes)
+        return Query(self._client, self._collection, **state)
+
+    def where(self, field, op, value):
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def order_by(self, field, direction=ASCENDING):
+        return self._copy(orders=self._orders + ((field, direction),))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_after(self, cursor):
+        return self._copy(cursor=cursor)
+
+    def _results(self):
+        with self._client._lock:
+            docs = [(doc_id, copy.deepcopy(data)) for doc_id, data in self._client._collections.get(self._collection, {}).items()]
+        docs = [(doc_id, data) for doc_id, data in docs if all(_matches(_field(data, field), op, value) for field, op, value in self._filters)]
+        # Firestore only returns documents that have every ordered field
+        docs = [(doc_id, data) for doc_id, data in docs if all(_field(data, field) is not None for field, _ in self._orders)]
+        docs.sort(key=lambda doc: doc[0])
+        for field, direction in reversed(self._orders):
+            docs.sort(key=lambda doc: _sort_key(_field(doc[1], field)), reverse=(direction == DESCENDING))
+        if self._cursor is not None:
+            docs = self._after_cursor(docs)
+        if self._limit is not None:
+            docs = docs[:self._limit]
+        return [DocumentSnapshot(DocumentReference(self._client, self._collection, doc_id), data) for doc_id, data in docs]
+
+    def _after_cursor(self, docs):
+        cursor_id = self._cursor.id if isinstance(self._cursor, DocumentSnapshot) else None
+        cursor_key = [_sort_key(self._cursor.get(field)) for field, _ in self._orders]
+        remaining = []
+        for doc_id, data in docs:
+            after = None
+            for (field, direction), expected in zip(self._orders, cursor_key):
+                actual = _sort_key(_field(data, field))
+                if actual != expected:
+                    after = actual > expected if direction != DESCENDING else actual < expected
+                    break
+            if after is None:
+                after = cursor_id is not None and doc_id > cursor_id
+            if after:
+                remaining.append((doc_id, data))
+        return remaining
+
+    def stream(self):
+        results = self._results()
+        self._client._tick(reads=max(len(results), 1))
+        return iter(results)
+
+    def get(self):
+        return list(self.stream())
+
+    def on_snapshot(self, callback):
+        return self._client._listen(self, callback)
+
+
+class CollectionReference(Query):
+    def __init__(self, client, name):
+        super().__init__(client, name)
+        self.id = name
+
+    def document(self, doc_id=None):
+        return DocumentReference(self._client, self._collection, doc_id or uuid.uuid4().hex[:20])
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return self._client._now(), ref
+
+
+class WriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def create(self, reference, data):
+        self._ops.append(("create", reference, data, False))
+
+    def set(self, reference, data, merge=False):
+        self._ops.append(("set", reference, data, merge))
+
+    def update(self, reference, data):
+        self._ops.append(("update", reference, data, True))
+
+    def delete(self, reference, option=None):
+        kind = "delete_existing" if option is not None and option.exists else "delete"
+        self._ops.append((kind, reference, None, False))
+
+    def commit(self):
+        if len(self._ops) > 500:
+            raise ValueError("A write batch can contain at most 500 operations.")
+        self._client._commit(self._ops)
+        self._ops = []
+
+
+class _WriteOption:
+    def __init__(self, exists):
+        self.exists = exists
+
+
+class _Watch:
+    def __init__(self, client, query, callback):
+        self._client = client
+        self.query = query
+        self.callback = callback
+
+    def unsubscribe(self):
+        self._client._unlisten(self)
+
+
+class MemoryClient:
+    """
+    In-memory Firestore client. `latency_seconds` is slept once per read and per
+    commit to mimic network round trips; `reads`/`writes`/`round_trips` count usage.
+    """
+
+    def __init__(self, latency_seconds=0.0):
+        self.latency_seconds = latency_seconds
+        self._collections = {}
+        self._lock = threading.RLock()
+        self._watches = []
+        self._last_timestamp = None
+        self.reads = 0
+        self.writes = 0
+        self.round_trips = 0
+
+    def collection(self, name):
+        return CollectionReference(self, name)
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def write_option(self, exists=None):
+        return _WriteOption(exists)
+
+    def get_all(self, references):
+        references = list(references)
+        self._tick(reads=max(len(references), 1))
+        with self._lock:
+            return [
+                DocumentSnapshot(reference, copy.deepcopy(self._collections.get(reference.collection_name, {}).get(reference.id)))
+                for reference in references
+            ]
+
+    def load(self, collection, documents):
+        """
+        Bulk-loads {doc_id: data} into `collection` without counting writes or notifying
+        listeners. For seeding large synthetic datasets.
+        """
+        with self._lock:
+            self._collections.setdefault(collection, {}).update(documents)
+
+    def _now(self):
+        # Strictly increasing timestamps so "changed since" queries are deterministic
+        with self._lock:
+            now = datetime.now(timezone.utc)
+            if self._last_timestamp is not None and now <= self._last_timestamp:
+                now = self._last_timestamp + timedelta(microseconds=1)
+            self._last_timestamp = now
+            return now
+
+    def _tick(self, reads=0, writes=0):
+        with self._lock:
+            self.reads += reads
+            self.writes += writes
+            self.round_trips += 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+    def _commit(self, ops):
+        self._tick(writes=len(ops))
+        now = self._now()
+        with self._lock:
+            # Like Firestore, a commit whose preconditions fail writes nothing
+            for kind, reference, data, merge in ops:
+                exists = reference.id in self._collections.get(reference.collection_name, {})
+                if kind == "create" and exists:
+                    raise AlreadyExists(f"Document already exists: {reference.path}")
+                if kind in ("update", "delete_existing") and not exists:
+                    raise NotFound(f"No document to {kind.split('_')[0]}: {reference.path}")
+            for kind, reference, data, merge in ops:
+                documents = self._collections.setdefault(reference.collection_name, {})
+                if kind in ("delete", "delete_existing"):
+                    documents.pop(reference.id, None)
+                elif kind == "update":
+                    _apply(documents[reference.id], data, now)
+                else:
+                    base = documents.get(reference.id, {}) if merge else {}
+                    documents[reference.id] = _apply(base, data, now)
+            watches = list(self._watches)
+        for watch in watches:
+            self._notify(watch)
+
+    def _listen(self, query, callback):
+        watch = _Watch(self, query, callback)
+        watch.last = {}
+        with self._lock:
+            self._watches.append(watch)
+        self._notify(watch)
+        return watch
+
+    def _unlisten(self, watch):
+        with self._lock:
+            if watch in self._watches:
+                self._watches.remove(watch)
+
+    def _notify(self, watch):
+        snapshots = watch.query._results()
+        current = {snapshot.id: snapshot for snapshot in snapshots}
+        changes = []
+        for doc_id, snapshot in current.items():
+            previous = watch.last.get(doc_id)
+            if previous is None:
+                changes.append(_Change("ADDED", snapshot))
+            elif previous.to_dict() != snapshot.to_dict():
+                changes.append(_Change("MODIFIED", snapshot))
+        for doc_id, snapshot in watch.last.items():
+            if doc_id not in current:
+                changes.append(_Change("REMOVED", snapshot))
+        first = not hasattr(watch, "delivered")
+        watch.last = current
+        if changes or first:
+            watch.delivered = True
+            watch.callback(snapshots, changes, datetime.now(timezone.utc))
+
+
+class _Change:
+    def __init__(self, kind, document):
+        self.type = _ChangeType(kind)
+        self.document = document
+
+
+class _ChangeType:
+    def __init__(self, name):
+        self.name = name
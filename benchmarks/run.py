@@ -0,0 +1,448 @@
+"""
+Times the app's hot paths for synthetic users of growing size.
+
+    python -m benchmarks.run [--sizes 1000 10000 100000] [--output results.json] [--compare baseline.json]
+
+Every case is run against an in-memory Firestore (benchmarks.memory_firestore) and a
+Groq stub, so results only reflect this process's CPU work plus the simulated latency.
+With --compare, cases whose median got slower than the baseline by more than
+--tolerance are reported and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from app_files.advisor_context import AdvisorIndex, build_context
+from app_files.analytics import build_cash_flow_index, net_flow_since, rollup_category_totals
+from app_files.chart_data import category_frame, trend_frame
+from app_files.columnar import ColumnarLedger
+from app_files.export import iter_chunks, write_csv, write_parquet
+from app_files.forecast import forecast_goals
+from app_files.llm import new_timings, stream_chat
+from app_files.llm_gateway import LLMGateway
+from app_files.pagination import DEFAULT_PAGE_SIZE
+from app_files.query_router import load_eval_set, route_query
+from app_files.replica import FirestoreStore, ReplicaStore
+from app_files.rollups import add_transaction, compute_rollups
+from app_files.write_queue import WriteQueue
+from benchmarks.groq_stub import GroqStub
+from benchmarks.memory_firestore import MemoryClient
+from benchmarks.synthetic import seed
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+USER_ID = "bench-user"
+ADVISOR_QUESTIONS = ["How much did I spend last month?", "What did I spend on groceries in March?", "Am I on track for my vacation goal?"]
+BURST_ROWS = [{"user_id": USER_ID, "description": "Lunch", "amount": 12.5, "date": "2025-06-01", "category": "Food"} for _ in range(20)]
+SYSTEM_PROMPT = "You are a friendly and helpful financial advisor. Your goal is to provide insightful and actionable advice. Be encouraging and supportive."
+
+CASES = []
+
+
+def case(name, max_size=None):
+    """
+    Registers a benchmark case. The function gets the size's Context and runs the path once.
+    Cases with a `max_size` are skipped for larger users (used for the quadratic legacy paths).
+    """
+    def register(fn):
+        CASES.append((name, fn, max_size))
+        return fn
+    return register
+
+
+class Context:
+    """
+    One synthetic user loaded into a MemoryClient, plus the stores and stubs the cases use.
+    """
+
+    def __init__(self, size, latency_seconds, groq_first_token_seconds, groq_token_seconds, workdir):
+        self.size = size
+        self.client = MemoryClient()
+        started = time.perf_counter()
+        self.data = seed(self.client, USER_ID, size, seed=size)
+        self.seed_seconds = time.perf_counter() - started
+        self.client.latency_seconds = latency_seconds
+        self.incomes = self.data['incomes']
+        self.expenses = self.data['expenses']
+        self.goals = self.data['savings_goals']
+        self.rollups = sorted(self.data['rollups'], key=lambda row: row['month'])
+        self.income_ledger = ColumnarLedger.from_rows(self.incomes)
+        self.expense_ledger = ColumnarLedger.from_rows(self.expenses)
+        self.advisor_index = AdvisorIndex(self.income_ledger, self.expense_ledger)
+        self.firestore_store = FirestoreStore(self.client)
+        self.workdir = workdir
+        self.replica = ReplicaStore(self.client, self._replica_path("shared"), min_sync_interval=0)
+        self.replica.sync(USER_ID, 'expenses', force=True)
+        self.page = self.replica.fetch_page(USER_ID, 'expenses', DEFAULT_PAGE_SIZE)
+        self.groq = GroqStub(first_token_seconds=groq_first_token_seconds, token_seconds=groq_token_seconds, respond=lambda prompt: "general")
+        self.groq_stream = GroqStub(first_token_seconds=groq_first_token_seconds, token_seconds=groq_token_seconds)
+        self.queries = [example["query"] for example in load_eval_set()]
+        self._replicas = 0
+
+    def _replica_path(self, name):
+        return os.path.join(self.workdir, f"replica_{self.size}_{name}.sqlite3")
+
+    def fresh_replica(self):
+        self._replicas += 1
+        return ReplicaStore(self.client, self._replica_path(self._replicas), min_sync_interval=0)
+
+
+# --- Dashboard ---
+
+@case("dashboard.totals")
+def bench_totals(ctx):
+    income_df = pd.DataFrame(ctx.incomes)
+    expense_df = pd.DataFrame(ctx.expenses)
+    return income_df['amount'].sum() - expense_df['amount'].sum()
+
+
+@case("dashboard.resample_trend")
+def bench_resample_trend(ctx):
+    # The per-transaction trend the Dashboard drew before monthly rollups ('ME' is the month-end alias of 'M')
+    frames = []
+    for rows, label in ((ctx.incomes, 'Income'), (ctx.expenses, 'Expense')):
+        df = pd.DataFrame(rows)
+        df['date'] = pd.to_datetime(df['date'])
+        df = df.set_index('date').resample('ME')['amount'].sum().reset_index()
+        df['type'] = label
+        frames.append(df)
+    return pd.concat(frames)
+
+
+@case("dashboard.category_groupby")
+def bench_category_groupby(ctx):
+    return pd.DataFrame(ctx.expenses).groupby('category')['amount'].sum().reset_index()
+
+
+@case("dashboard.compute_rollups")
+def bench_compute_rollups(ctx):
+    return compute_rollups(ctx.incomes, ctx.expenses)
+
+
+def _monthly_series(rows, field, label):
+    # Continuous month-end series, matching the old resample('M') output
+    series = pd.Series({pd.Period(row['month'], freq='M'): row[field] for row in rows})
+    series = series.reindex(pd.period_range(series.index.min(), series.index.max(), freq='M'), fill_value=0)
+    df = pd.DataFrame({"date": series.index.to_timestamp(how='end').normalize(), "amount": series.values / 100})
+    df['type'] = label
+    return df
+
+
+@case("dashboard.rollup_charts")
+def bench_rollup_charts(ctx):
+    # The monthly trend and category totals as the Dashboard drew them from rollups, before chart_data
+    income_months = [row for row in ctx.rollups if row.get('income_count', 0) > 0]
+    expense_months = [row for row in ctx.rollups if row.get('expense_count', 0) > 0]
+    trend = pd.concat([_monthly_series(income_months, 'income_cents', 'Income'), _monthly_series(expense_months, 'expense_cents', 'Expense')])
+    return trend, rollup_category_totals(expense_months)
+
+
+@case("dashboard.chart_trend")
+def bench_chart_trend(ctx):
+    # Daily over the whole history: the longest series, downsampled to MAX_POINTS
+    return trend_frame(ctx.income_ledger, ctx.expense_ledger, "Daily")
+
+
+@case("dashboard.chart_categories")
+def bench_chart_categories(ctx):
+    return category_frame(ctx.expense_ledger)
+
+
+# --- Expense / Income tracker ---
+
+def _tracker_frame(rows):
+    df = pd.DataFrame(rows)
+    df['date'] = pd.to_datetime(df['date'])
+    return df[['date', 'description', 'category', 'amount']]
+
+
+@case("tracker.page_table")
+def bench_page_table(ctx):
+    return _tracker_frame(ctx.page.rows)
+
+
+@case("tracker.full_table")
+def bench_full_table(ctx):
+    return _tracker_frame(ctx.expenses)
+
+
+@case("tracker.delete_lookup")
+def bench_delete_lookup(ctx):
+    expenses_by_id = {expense['id']: expense for expense in ctx.page.rows}
+    labels = [f"{e['description']} - {e['amount']} - {e['date']}" for e in expenses_by_id.values()]
+    return expenses_by_id[ctx.page.rows[-1]['id']], labels
+
+
+@case("tracker.delete_lookup_legacy", max_size=100000)
+def bench_delete_lookup_legacy(ctx):
+    # Label matching with DataFrame.apply over the whole history, as the tracker did before paging
+    df = pd.DataFrame(ctx.expenses)
+    df['date'] = pd.to_datetime(df['date'])
+    target = ctx.expenses[-1]
+    label = f"{target['description']} - {target['amount']} - {target['date']}"
+    matches = df.apply(lambda x: x['description'] + " - " + str(x['amount']) + " - " + x['date'].strftime('%Y-%m-%d') == label, axis=1)
+    return df[matches]['id'].iloc[0]
+
+
+@case("tracker.add_burst")
+def bench_add_burst(ctx):
+    # Twenty expenses submitted in quick succession, through the background write queue
+    client = MemoryClient(latency_seconds=ctx.client.latency_seconds)
+    write_queue = WriteQueue(client, max_wait_seconds=0.05)
+    for row in BURST_ROWS:
+        write_queue.submit(USER_ID, 'expenses', row)
+    write_queue.flush()
+    return write_queue.stats()
+
+
+@case("tracker.add_burst_legacy")
+def bench_add_burst_legacy(ctx):
+    # The same expenses, each written in its own commit as the forms did before the queue
+    client = MemoryClient(latency_seconds=ctx.client.latency_seconds)
+    return [add_transaction(client, USER_ID, 'expenses', row) for row in BURST_ROWS]
+
+
+# --- Columnar ledger ---
+
+@case("ledger.columnar_build")
+def bench_columnar_build(ctx):
+    return ColumnarLedger.from_rows(ctx.expenses)
+
+
+@case("ledger.columnar_frame")
+def bench_columnar_frame(ctx):
+    return ctx.expense_ledger.frame()
+
+
+@case("ledger.columnar_append")
+def bench_columnar_append(ctx):
+    return ctx.expense_ledger.append([{"id": "bench-new", "date": "2025-06-01", "amount": 12.5, "category": "Food", "description": "Lunch"}])
+
+
+@case("ledger.columnar_delete")
+def bench_columnar_delete(ctx):
+    return ctx.expense_ledger.delete([ctx.expenses[0]['id']])
+
+
+# --- Savings goals ---
+
+@case("goals.progress")
+def bench_goal_progress(ctx):
+    index = build_cash_flow_index(ctx.income_ledger, ctx.expense_ledger)
+    return [net_flow_since(index, goal['created_at']) / goal['price'] for goal in ctx.goals]
+
+
+@case("goals.forecast")
+def bench_goal_forecast(ctx):
+    # Forty goals (the user's five, eight times over) on the default number of paths
+    goals = [{**goal, "id": f"{goal['id']}-{n}"} for n in range(8) for goal in ctx.goals]
+    return forecast_goals(goals, ctx.income_ledger, ctx.expense_ledger, today=date(2025, 12, 31))
+
+
+# --- AI Advisor ---
+
+@case("advisor.index_build")
+def bench_advisor_index_build(ctx):
+    return AdvisorIndex(ctx.income_ledger, ctx.expense_ledger)
+
+
+@case("advisor.context")
+def bench_advisor_context(ctx):
+    return [build_context(ctx.advisor_index, ctx.goals, question, today=date(2025, 12, 31)) for question in ADVISOR_QUESTIONS]
+
+
+@case("advisor.context_legacy", max_size=100000)
+def bench_advisor_context_legacy(ctx):
+    # Every transaction's repr in the prompt, as the Advisor did before retrieval
+    financial_context = f"Here is the user's financial data:\n- Incomes: {ctx.income_ledger.to_rows()}\n- Expenses: {ctx.expense_ledger.to_rows()}\n- Savings Goals: {ctx.goals}"
+    return f"{SYSTEM_PROMPT}\n\n{financial_context}\n\nUser question: How much did I spend last month?"
+
+
+@case("advisor.route_queries")
+def bench_route_queries(ctx):
+    return [route_query(ctx.groq, query) for query in ctx.queries]
+
+
+@case("advisor.stream_reply")
+def bench_stream_reply(ctx):
+    timings = new_timings()
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": "How can I save more?"}]
+    return "".join(stream_chat(ctx.groq_stream, messages, timings))
+
+
+@case("advisor.coalesced_summaries")
+def bench_coalesced_summaries(ctx):
+    # Eight sessions opening the Dashboard at once share one streamed summary
+    gateway = LLMGateway(ctx.groq_stream, requests_per_minute=6000)
+    messages = [{"role": "user", "content": "Summarize my finances."}]
+    with ThreadPoolExecutor(8) as pool:
+        return list(pool.map(lambda _: "".join(stream_chat(gateway, messages)), range(8)))
+
+
+# --- Ledger reads ---
+
+@case("store.firestore_rows")
+def bench_firestore_rows(ctx):
+    return ctx.firestore_store.rows(USER_ID, 'expenses')
+
+
+@case("store.replica_initial_sync")
+def bench_replica_initial_sync(ctx):
+    return ctx.fresh_replica().sync(USER_ID, 'expenses', force=True)
+
+
+@case("store.replica_incremental_sync")
+def bench_replica_incremental_sync(ctx):
+    return ctx.replica.sync(USER_ID, 'expenses', force=True)
+
+
+@case("store.replica_rows")
+def bench_replica_rows(ctx):
+    ctx.replica.min_sync_interval = float("inf")
+    return ctx.replica.rows(USER_ID, 'expenses')
+
+
+@case("store.replica_page")
+def bench_replica_page(ctx):
+    ctx.replica.min_sync_interval = float("inf")
+    return ctx.replica.fetch_page(USER_ID, 'expenses', DEFAULT_PAGE_SIZE, after=ctx.page.cursor, category='Food')
+
+
+# --- Export ---
+
+def _export(ctx, writer, suffix):
+    ctx.replica.min_sync_interval = float("inf")
+    path = os.path.join(ctx.workdir, f"export_{ctx.size}{suffix}")
+    return writer(iter_chunks(ctx.replica, USER_ID), path)
+
+
+@case("export.csv")
+def bench_export_csv(ctx):
+    return _export(ctx, write_csv, ".csv")
+
+
+@case("export.parquet")
+def bench_export_parquet(ctx):
+    return _export(ctx, write_parquet, ".parquet")
+
+
+def time_case(fn, ctx, repeat, budget_seconds):
+    """
+    Runs `fn` once as a warm-up and then up to `repeat` more times, stopping early once
+    `budget_seconds` have been spent. Returns the timed durations in seconds.
+    """
+    started = time.perf_counter()
+    fn(ctx)
+    durations = []
+    while len(durations) < repeat:
+        run_started = time.perf_counter()
+        fn(ctx)
+        durations.append(time.perf_counter() - run_started)
+        if time.perf_counter() - started > budget_seconds:
+            break
+    return durations
+
+
+def summarize(name, size, durations):
+    """
+    Reduces a case's durations to the machine-readable result record (milliseconds).
+    """
+    ms = sorted(d * 1000 for d in durations)
+    return {
+        "case": name,
+        "size": size,
+        "runs": len(ms),
+        "median_ms": round(statistics.median(ms), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "min_ms": round(ms[0], 4),
+        "mean_ms": round(statistics.fmean(ms), 4),
+    }
+
+
+def compare(results, baseline, tolerance, min_delta_ms=1.0):
+    """
+    Returns the results whose median is more than `tolerance` (a fraction) and
+    `min_delta_ms` slower than the same case and size in `baseline`.
+    """
+    previous = {(r["case"], r["size"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get((result["case"], result["size"]))
+        if before is None:
+            continue
+        delta = result["median_ms"] - before["median_ms"]
+        if delta > min_delta_ms and result["median_ms"] > before["median_ms"] * (1 + tolerance):
+            regressions.append({**result, "baseline_median_ms": before["median_ms"], "change": round(delta / before["median_ms"], 4)})
+    return regressions
+
+
+def environment():
+    """
+    Describes the machine and library versions the numbers were taken on.
+    """
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Finance Manager hot paths on synthetic users.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Transactions per synthetic user")
+    parser.add_argument("--cases", nargs="+", help="Only run cases whose name starts with one of these prefixes")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case (after one warm-up)")
+    parser.add_argument("--budget", type=float, default=10.0, help="Seconds per case before repeats stop early")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated Firestore round-trip latency")
+    parser.add_argument("--groq-first-token-ms", type=float, default=0.0, help="Simulated Groq time to first token")
+    parser.add_argument("--groq-token-ms", type=float, default=0.0, help="Simulated Groq time per further token")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed median slowdown against the baseline")
+    args = parser.parse_args()
+
+    cases = [c for c in CASES if not args.cases or c[0].startswith(tuple(args.cases))]
+    results = []
+    with tempfile.TemporaryDirectory(prefix="finance_manager_bench_") as workdir:
+        for size in args.sizes:
+            ctx = Context(size, args.latency_ms / 1000, args.groq_first_token_ms / 1000, args.groq_token_ms / 1000, workdir)
+            print(f"# {size} transactions (seeded in {ctx.seed_seconds:.1f}s)", file=sys.stderr)
+            for name, fn, max_size in cases:
+                if max_size is not None and size > max_size:
+                    continue
+                result = summarize(name, size, time_case(fn, ctx, args.repeat, args.budget))
+                results.append(result)
+                print(f"{name:34} {size:>9}  median {result['median_ms']:>11.3f} ms  p95 {result['p95_ms']:>11.3f} ms  ({result['runs']} runs)", file=sys.stderr)
+
+    report = {"environment": environment(), "settings": vars(args), "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for r in regressions:
+            print(f"REGRESSION {r['case']} @ {r['size']}: {r['baseline_median_ms']:.3f} ms -> {r['median_ms']:.3f} ms (+{r['change']:.0%})", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
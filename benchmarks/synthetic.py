@@ -0,0 +1,107 @@
+import random
+from datetime import date, datetime, timedelta, timezone
+
+from app_files.categories import CATEGORIES
+from app_files.rollups import ROLLUPS_COLLECTION, ROLLUPS_VERSION, compute_rollups
+
+# Descriptions are drawn per category so the keyword classifier sees realistic text
+DESCRIPTIONS = {
+    "Food": ["Groceries", "Dinner with friends", "Coffee", "Lunch", "Pizza night"],
+    "Transportation": ["Uber ride", "Fuel", "Train ticket", "Parking", "Bus pass"],
+    "Entertainment": ["Netflix", "Movie tickets", "Concert", "Steam game", "Spotify"],
+    "Utilities": ["Electricity bill", "Internet", "Phone bill", "Water bill", "Rent"],
+    "Shopping": ["Amazon order", "Shoes", "Clothes", "Books", "Headphones"],
+    "Health": ["Pharmacy", "Gym membership", "Doctor visit", "Dentist", "Vitamins"],
+    "Other": ["Misc", "Cash withdrawal", "Bank fee", "Donation", "Transfer"],
+}
+INCOME_DESCRIPTIONS = ["Salary", "Freelance work", "Dividends", "Bonus", "Refund"]
+GOAL_NAMES = ["New Laptop", "Vacation", "Car", "Emergency Fund", "Phone", "Bike", "Course"]
+
+
+def _timestamp(day, rng):
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc) + timedelta(seconds=rng.randrange(86400))
+
+
+def generate_user(user_id, transactions, goals=5, years=5, seed=0, end=date(2025, 12, 31)):
+    """
+    Generates one synthetic user with `transactions` rows split 1:4 between incomes and
+    expenses over the last `years` years, plus `goals` savings goals.
+    Returns a dict of collection -> {doc_id: data}, shaped like the app's documents.
+    """
+    rng = random.Random(seed)
+    start = end - timedelta(days=365 * years)
+    span = (end - start).days
+    incomes_count = max(transactions // 5, 1)
+    expenses_count = max(transactions - incomes_count, 1)
+
+    def random_day():
+        return start + timedelta(days=rng.randrange(span + 1))
+
+    incomes = {}
+    for i in range(incomes_count):
+        day = random_day()
+        stamp = _timestamp(day, rng)
+        incomes[f"{user_id}-i{i}"] = {
+            "user_id": user_id,
+            "description": rng.choice(INCOME_DESCRIPTIONS),
+            "amount": round(rng.uniform(200, 5000), 2),
+            "date": day.isoformat(),
+            "created_at": stamp,
+            "updated_at": stamp,
+        }
+
+    expenses = {}
+    for i in range(expenses_count):
+        day = random_day()
+        stamp = _timestamp(day, rng)
+        category = rng.choice(CATEGORIES)
+        expenses[f"{user_id}-e{i}"] = {
+            "user_id": user_id,
+            "description": rng.choice(DESCRIPTIONS[category]),
+            "amount": round(rng.lognormvariate(3.5, 1.0), 2),
+            "date": day.isoformat(),
+            "category": category,
+            "created_at": stamp,
+            "updated_at": stamp,
+        }
+
+    savings_goals = {}
+    for i in range(goals):
+        created = random_day()
+        target = created + timedelta(days=rng.randrange(90, 1095))
+        months = max((target.year - created.year) * 12 + (target.month - created.month), 1)
+        price = round(rng.uniform(300, 20000), 2)
+        stamp = _timestamp(created, rng)
+        savings_goals[f"{user_id}-g{i}"] = {
+            "user_id": user_id,
+            "product_name": rng.choice(GOAL_NAMES),
+            "price": price,
+            "target_date": target.isoformat(),
+            "monthly_saving": price / months,
+            "created_at": stamp,
+            "updated_at": stamp,
+        }
+
+    rollups = {
+        f"{user_id}_{month}": {**row, "user_id": user_id}
+        for month, row in compute_rollups(incomes.values(), expenses.values()).items()
+    }
+    profile = {"email": f"{user_id}@example.com", "name": user_id, "currency": "USD", "theme": "Light", "rollups_version": ROLLUPS_VERSION}
+    return {
+        "users": {user_id: profile},
+        "incomes": incomes,
+        "expenses": expenses,
+        "savings_goals": savings_goals,
+        ROLLUPS_COLLECTION: rollups,
+    }
+
+
+def seed(client, user_id, transactions, **kwargs):
+    """
+    Generates a synthetic user and loads it into a MemoryClient.
+    Returns the generated collections, with each row's "id" added, for direct use.
+    """
+    collections = generate_user(user_id, transactions, **kwargs)
+    for name, documents in collections.items():
+        client.load(name, documents)
+    return {name: [{**data, "id": doc_id} for doc_id, data in documents.items()] for name, documents in collections.items()}
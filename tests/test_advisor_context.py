@@ -0,0 +1,39 @@
+from datetime import date
+
+from app_files.advisor_context import AdvisorIndex, build_context, estimate_tokens, question_window
+
+TODAY = date(2025, 6, 15)
+INCOMES = [{"id": "i1", "date": "2025-05-01", "amount": 3000.0, "description": "Salary"}]
+EXPENSES = [
+    {"id": "e1", "date": "2025-05-03", "amount": 12.5, "description": "Coffee beans", "category": "Food"},
+    {"id": "e2", "date": "2025-05-20", "amount": 900.0, "description": "Rent May", "category": "Housing"},
+    {"id": "e3", "date": "2025-06-02", "amount": 4.0, "description": "Coffee", "category": "Food"},
+]
+
+
+def test_question_window_reads_common_periods():
+    assert question_window("How much did I spend last month?", TODAY)[:2] == (date(2025, 5, 1), date(2025, 5, 31))
+    assert question_window("past 7 days", TODAY)[:2] == (date(2025, 6, 8), TODAY)
+    assert question_window("Spending in March 2024", TODAY)[:2] == (date(2024, 3, 1), date(2024, 3, 31))
+    assert question_window("May I buy a car?", TODAY) is None
+
+
+def test_search_ranks_matching_transactions_newest_first():
+    index = AdvisorIndex(INCOMES, EXPENSES)
+
+    matches = index.search("coffee")
+
+    ledger = index.ledgers['expense']
+    assert [ledger.ids[position] for _, position in matches] == ["e3", "e1"]
+    assert index.search("coffee", window=(date(2025, 5, 1), date(2025, 5, 31))) == [("expense", 0)]
+
+
+def test_build_context_stays_within_the_token_budget():
+    index = AdvisorIndex(INCOMES, EXPENSES)
+
+    context = build_context(index, [], "What did I spend on coffee last month?", today=TODAY)
+    short = build_context(index, [], "What did I spend on coffee last month?", today=TODAY, token_budget=40)
+
+    assert "Coffee beans" in context and "Last month" in context
+    assert sum(estimate_tokens(line) + 1 for line in short.splitlines()) <= 40
+    assert short and len(short) < len(context)
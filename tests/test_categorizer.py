@@ -0,0 +1,47 @@
+import pytest
+
+pytest.importorskip("firebase_admin")
+
+from app_files.categorizer import GLOBAL_SCOPE, MEMO_COLLECTION, Categorizer, memo_doc_id
+from benchmarks.groq_stub import GroqStub
+from benchmarks.memory_firestore import MemoryClient
+
+
+def make_categorizer(db, reply="Shopping"):
+    return Categorizer(db, GroqStub(first_token_seconds=0, token_seconds=0, reply=reply))
+
+
+def test_memo_entries_are_stored_one_document_each():
+    db = MemoryClient()
+    categorizer = make_categorizer(db)
+    assert categorizer.categorize("user-1", "Weekly groceries") == "Food"
+    assert categorizer.categorize("user-1", "Zxq Holdings 991") == "Shopping"
+    categorizer.save_memos()
+
+    memos = {doc.id: doc.to_dict() for doc in db.collection(MEMO_COLLECTION).stream()}
+    assert memos[memo_doc_id("user-1", "weekly groceries")]["category"] == "Food"
+    assert memos[memo_doc_id("user-1", "zxq holdings")]["category"] == "Shopping"
+    # Only the LLM's answer is shared with other users
+    assert memos[memo_doc_id(GLOBAL_SCOPE, "zxq holdings")]["scope"] == GLOBAL_SCOPE
+    assert memo_doc_id(GLOBAL_SCOPE, "weekly groceries") not in memos
+
+
+def test_memos_are_read_once_and_reused_by_a_new_process():
+    db = MemoryClient()
+    first = make_categorizer(db)
+    first.categorize("user-1", "Zxq Holdings 991")
+    first.categorize("user-1", "Plorb")
+    first.save_memos()
+
+    llm = GroqStub(first_token_seconds=0, token_seconds=0, reply="Health")
+    second = Categorizer(db, llm)
+    second.preload("user-1")
+    assert second.categorize_many("user-1", ["Zxq holdings", "plorb!", "Plorb"]) == {"Zxq holdings": "Shopping", "plorb!": "Shopping", "Plorb": "Shopping"}
+    assert second.categorize("user-2", "zxq holdings") == "Shopping"
+    assert llm.calls == 0
+
+    # Further lookups are served from memory
+    reads = db.reads
+    second.categorize("user-1", "Plorb")
+    second.categorize("user-2", "Zxq Holdings")
+    assert db.reads == reads
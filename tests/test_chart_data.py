@@ -0,0 +1,49 @@
+import numpy as np
+
+from app_files.chart_data import category_frame, downsample, top_categories, trend_frame
+from app_files.columnar import ColumnarLedger
+
+
+def ledger(rows):
+    return ColumnarLedger.from_rows({"id": str(n), **r} for n, r in enumerate(rows))
+
+
+def test_downsample_keeps_the_ends_and_the_peaks():
+    x = np.arange(1000)
+    y = np.zeros(1000)
+    y[500] = 10
+
+    xs, ys = downsample(x, y, max_points=20)
+
+    assert len(xs) == 20 and xs[0] == 0 and xs[-1] == 999
+    assert 10 in ys
+
+
+def test_trend_frame_fills_periods_without_activity():
+    incomes = ledger([{"date": "2025-01-10", "amount": 100.0}, {"date": "2025-03-10", "amount": 50.0}])
+    expenses = ledger([{"date": "2025-02-01", "amount": 20.0, "category": "Food"}])
+
+    frame = trend_frame(incomes, expenses, "Monthly")
+
+    income = frame[frame["type"] == "Income"]
+    assert list(income["amount"]) == [100.0, 0.0, 50.0]
+    assert list(frame[frame["type"] == "Expense"]["amount"]) == [0.0, 20.0, 0.0]
+
+
+def test_top_categories_folds_the_rest_into_other():
+    totals = {"Food": 50.0, "Rent": 500.0, "Travel": 30.0, "Other": 5.0, "Gifts": 0.0}
+
+    frame = top_categories(totals, top=2)
+
+    assert list(frame.itertuples(index=False, name=None)) == [("Rent", 500.0), ("Food", 50.0), ("Other", 35.0)]
+
+
+def test_category_frame_uses_the_date_window():
+    expenses = ledger([
+        {"date": "2025-01-05", "amount": 10.0, "category": "Food"},
+        {"date": "2025-02-05", "amount": 30.0, "category": "Travel"},
+    ])
+
+    frame = category_frame(expenses, start="2025-02-01", end="2025-02-28")
+
+    assert list(frame["category"]) == ["Travel"]
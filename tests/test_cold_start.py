@@ -0,0 +1,17 @@
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("streamlit.testing.v1")
+
+from benchmarks.cold_start import ROOT
+
+
+def test_login_page_renders_within_budget_without_deferred_modules():
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.cold_start", "--runs", "3"],
+        cwd=ROOT, capture_output=True, text=True, timeout=300,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "FAIL" not in result.stdout
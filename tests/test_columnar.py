@@ -0,0 +1,33 @@
+from app_files.columnar import ColumnarLedger
+
+
+def row(row_id, day, amount=1.0, category="Food"):
+    return {"id": row_id, "date": f"2025-03-{day:02d}", "amount": amount, "description": row_id, "category": category}
+
+
+def test_append_keeps_the_order_a_full_build_gives():
+    existing = [row("b", 1), row("d", 1), row("a", 2)]
+    added = [row("c", 1), row("e", 1), row("a0", 1), row("z", 3)]
+
+    appended = ColumnarLedger.from_rows(existing).append(added)
+    rebuilt = ColumnarLedger.from_rows(existing + added)
+
+    assert list(appended.ids) == list(rebuilt.ids) == ["e", "d", "c", "b", "a0", "a", "z"]
+    assert [r["id"] for r in appended.to_rows()] == ["z", "a", "a0", "b", "c", "d", "e"]
+
+
+def test_totals_are_exact_in_cents():
+    ledger = ColumnarLedger.from_rows([row(str(n), 1 + n % 28, 0.1) for n in range(10)] + [row("x", 5, 2.675, "Travel")])
+
+    assert ledger.total() == 3.68
+    assert ledger.category_totals() == {"Food": 1.0, "Travel": 2.68}
+    months, cents = ledger.monthly_totals()
+    assert list(cents) == [368] and str(months[0]) == "2025-03"
+
+
+def test_between_and_delete_return_the_matching_rows():
+    ledger = ColumnarLedger.from_rows([row(str(day), day) for day in range(1, 11)])
+
+    assert list(ledger.between("2025-03-03", "2025-03-05").ids) == ["3", "4", "5"]
+    assert len(ledger.between(start="2025-03-09")) == 2
+    assert "4" not in ledger.delete(["4", "missing"]).ids and len(ledger.delete(["4"])) == 9
@@ -0,0 +1,47 @@
+import os
+import time
+
+import pytest
+
+from app_files.export import EXPORT_FILE_PREFIX, ExportJob, cleanup_exports
+
+USER_ID = "user-1"
+
+
+def test_cleanup_exports_deletes_only_old_export_files(tmp_path):
+    old = tmp_path / f"{EXPORT_FILE_PREFIX}old.csv"
+    recent = tmp_path / f"{EXPORT_FILE_PREFIX}recent.csv"
+    other = tmp_path / "notes.csv"
+    for path in (old, recent, other):
+        path.write_text("type,id\n")
+    two_hours_ago = time.time() - 2 * 60 * 60
+    os.utime(old, (two_hours_ago, two_hours_ago))
+    os.utime(other, (two_hours_ago, two_hours_ago))
+
+    assert cleanup_exports(max_age_seconds=60 * 60, directory=str(tmp_path)) == 1
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted([recent.name, other.name])
+
+
+def test_finished_export_is_read_on_request_and_deleted_on_discard():
+    pytest.importorskip("firebase_admin")
+    from app_files.replica import FirestoreStore
+    from benchmarks.memory_firestore import MemoryClient
+
+    db = MemoryClient()
+    db.load('expenses', {
+        f"e{day}": {"user_id": USER_ID, "date": f"2025-01-{day:02d}", "description": "Lunch", "category": "Food", "amount": 12.5}
+        for day in range(1, 6)
+    })
+    job = ExportJob(FirestoreStore(db), USER_ID, "CSV", ('expenses',), chunk_rows=2).start()
+    job._future.result(timeout=10)
+    assert job.error is None and job.rows == 5
+    assert job.data is None
+
+    job.load()
+    assert job.data.decode("utf-8").count("\n") == 6
+    job.release()
+    assert job.data is None
+
+    path = job.path
+    job.discard()
+    assert not os.path.exists(path)
@@ -0,0 +1,35 @@
+from datetime import date
+
+from app_files.forecast import forecast_goals
+
+TODAY = date(2026, 1, 15)
+# A steady 100.00 a month for the whole of 2025
+INCOMES = [{"amount": 100.0, "date": f"2025-{month:02d}-01", "description": "Salary"} for month in range(1, 13)]
+
+
+def goal(goal_id, price, target_date):
+    return {"id": goal_id, "price": price, "target_date": target_date, "created_at": TODAY.isoformat()}
+
+
+def test_goals_share_the_cash_flow_in_target_date_order():
+    goals = [goal("later", 600.0, "2027-06-01"), goal("sooner", 600.0, "2026-12-01")]
+
+    forecasts = forecast_goals(goals, INCOMES, [], today=TODAY, paths=200)
+
+    assert forecasts["sooner"]["likely_month"] == "2026-07"
+    assert forecasts["later"]["likely_month"] == "2027-01"
+    assert forecasts["sooner"]["probability"] == 1.0
+
+
+def test_savings_so_far_are_not_counted_twice():
+    goals = [
+        {**goal("first", 300.0, "2026-06-01"), "created_at": "2025-01-01"},
+        {**goal("second", 1000.0, "2026-09-01"), "created_at": "2025-01-01"},
+    ]
+
+    forecasts = forecast_goals(goals, INCOMES, [], today=TODAY, paths=200)
+
+    assert forecasts["first"]["saved"] == 300.0
+    assert forecasts["second"]["saved"] == 900.0
+    # 100.00 still needed: one more month
+    assert forecasts["second"]["likely_month"] == "2026-02"
@@ -0,0 +1,45 @@
+import io
+
+import pytest
+
+pytest.importorskip("firebase_admin")
+
+from app_files.importer import content_hash, existing_hashes, import_statement
+from benchmarks.memory_firestore import MemoryClient
+
+USER_ID = "user-1"
+
+
+class KeywordCategorizer:
+    def categorize_many(self, user_id, descriptions):
+        return {description: "Other" for description in descriptions}
+
+
+def run_import(db, csv_text, known_hashes=()):
+    return import_statement(db, KeywordCategorizer(), USER_ID, io.BytesIO(csv_text.encode("utf-8")), known_hashes)
+
+
+def test_rows_that_differ_only_in_a_reference_number_are_both_imported():
+    db = MemoryClient()
+    summary = run_import(db, "Date,Description,Amount\n2025-03-01,Cheque 1001,-50.00\n2025-03-01,Cheque 1002,-50.00\n")
+
+    assert summary["expenses"] == 2
+    assert summary["duplicates"] == 0
+    assert sorted(doc.to_dict()['description'] for doc in db.collection('expenses').stream()) == ["Cheque 1001", "Cheque 1002"]
+
+
+def test_reimporting_a_statement_skips_every_row():
+    db = MemoryClient()
+    csv_text = "Date,Description,Amount\n2025-03-01,Coffee,-3.50\n2025-03-01,Coffee,-3.50\n2025-03-02,Salary  ACME,2000\n"
+    run_import(db, csv_text)
+    rows = {collection: [doc.to_dict() for doc in db.collection(collection).stream()] for collection in ('incomes', 'expenses')}
+
+    summary = run_import(db, csv_text, existing_hashes(rows['incomes'], rows['expenses']))
+
+    assert summary["duplicates"] == 3
+    assert summary["incomes"] == summary["expenses"] == 0
+
+
+def test_hash_ignores_case_and_spacing_only():
+    assert content_hash('expenses', "2025-03-01", "Transfer  ref 88231", 10) == content_hash('expenses', "2025-03-01", "transfer ref 88231 ", 10)
+    assert content_hash('expenses', "2025-03-01", "Transfer ref 88231", 10) != content_hash('expenses', "2025-03-01", "Transfer ref 88232", 10)
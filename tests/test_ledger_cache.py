@@ -0,0 +1,58 @@
+import threading
+
+from app_files.ledger_cache import LedgerCache, estimate_size
+
+
+def test_concurrent_misses_share_one_load():
+    cache = LedgerCache()
+    started = threading.Event()
+    release = threading.Event()
+    loads = []
+
+    def loader():
+        loads.append(1)
+        started.set()
+        release.wait(5)
+        return [1, 2, 3]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("u", "expenses", loader))) for _ in range(4)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(loads) == 1 and results == [[1, 2, 3]] * 4
+    assert cache.stats()["misses"] == 1
+
+
+def test_invalidation_during_a_load_is_not_cached_over():
+    cache = LedgerCache()
+
+    def loader():
+        cache.invalidate("u")
+        return "stale"
+
+    assert cache.get("u", "expenses", loader) == "stale"
+    assert cache.get("u", "expenses", lambda: "fresh") == "fresh"
+
+
+def test_update_patches_the_entry_and_eviction_respects_the_budget():
+    cache = LedgerCache()
+    cache.get("u", "expenses", lambda: [1])
+    version = cache.version("u")
+
+    cache.update("u", "expenses", lambda rows: rows + [2])
+
+    assert cache.version("u") != version
+    assert cache.get("u", "expenses", lambda: None) == [1, 2]
+
+    rows = [{"id": str(n)} for n in range(20)]
+    small = LedgerCache(max_bytes=estimate_size(rows) * 3 // 2)
+    small.get("a", "expenses", lambda: rows)
+    small.get("b", "expenses", lambda: list(rows))
+    assert small.stats()["evictions"] == 1 and small.stats()["entries"] == 1
+    assert small.current_bytes <= small.max_bytes
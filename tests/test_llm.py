@@ -0,0 +1,52 @@
+import httpx
+from groq import APIStatusError
+
+from app_files.llm import ERROR_NOTICE, new_timings, stream_chat
+from benchmarks.groq_stub import GroqStub
+
+
+def service_unavailable():
+    response = httpx.Response(503, request=httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions"))
+    return APIStatusError("Service unavailable", response=response, body=None)
+
+
+class FailingCompletions:
+    def create(self, **kwargs):
+        raise service_unavailable()
+
+
+class FailingClient:
+    def __init__(self):
+        self.chat = type("Chat", (), {"completions": FailingCompletions()})()
+
+
+def test_api_error_ends_the_stream_with_a_notice():
+    timings = new_timings()
+    assert list(stream_chat(FailingClient(), [{"role": "user", "content": "Hi"}], timings)) == [ERROR_NOTICE]
+    assert timings["status"] == "error"
+    assert timings["error"].startswith("APIStatusError")
+
+
+def test_api_error_mid_stream_keeps_the_text_so_far():
+    stub = GroqStub(first_token_seconds=0, token_seconds=0, reply="Save more each month")
+    create = stub.chat.completions.create
+
+    def broken_stream(**kwargs):
+        for number, chunk in enumerate(create(**kwargs)):
+            if number == 2:
+                raise service_unavailable()
+            yield chunk
+
+    stub.chat.completions.create = broken_stream
+    timings = new_timings()
+    assert "".join(stream_chat(stub, [{"role": "user", "content": "Hi"}], timings)) == "Save more " + ERROR_NOTICE
+    assert timings["status"] == "error"
+    assert timings["chunks"] == 2
+
+
+def test_complete_stream():
+    timings = new_timings()
+    stub = GroqStub(first_token_seconds=0, token_seconds=0, reply="All good")
+    assert "".join(stream_chat(stub, [{"role": "user", "content": "Hi"}], timings)) == "All good "
+    assert timings["status"] == "complete"
+    assert timings["error"] is None
@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("groq")
+
+from groq import Groq
+
+from app_files.llm_gateway import LLMGateway, TokenBucket, _SharedStream
+from benchmarks.groq_server import CHECKS, GroqStubServer
+
+
+@pytest.mark.parametrize("name, check, options", CHECKS, ids=[name for name, _, _ in CHECKS])
+def test_gateway_against_the_stub_server(name, check, options):
+    # The same checks as `python -m benchmarks.groq_server --check`
+    with GroqStubServer(first_token_seconds=0.2 if "coalescing" in name else 0.02) as server:
+        client = Groq(api_key="stub", base_url=server.url, max_retries=0)
+        gateway = LLMGateway(client, **{"requests_per_minute": 6000, "backoff_seconds": 0.01, **options})
+        check(server, gateway)
+
+
+def test_token_bucket_allows_a_burst_then_the_rate():
+    bucket = TokenBucket(rate=20, capacity=3)
+    started = time.monotonic()
+    for _ in range(5):
+        assert bucket.acquire(started + 5)
+    # Three tokens at once, then one every 0.05s
+    assert time.monotonic() - started >= 0.09
+
+
+def test_token_bucket_gives_up_at_the_deadline():
+    bucket = TokenBucket(rate=1, capacity=1)
+    assert bucket.acquire(time.monotonic())
+    started = time.monotonic()
+    assert not bucket.acquire(started + 0.1)
+    assert time.monotonic() - started < 0.1
+
+
+class FakeStream:
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+        self.pulled = 0
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.pulled += 1
+            yield chunk
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        self.closed = True
+
+
+def test_shared_stream_replays_chunks_to_a_late_reader():
+    stream = FakeStream(["a", "b", "c"])
+    done = threading.Event()
+    shared = _SharedStream(stream, done.set)
+    first = iter(shared.reader())
+    assert [next(first), next(first)] == ["a", "b"]
+
+    late = shared.reader()
+    assert list(late) == ["a", "b", "c"]
+    assert list(first) == ["c"]
+    assert stream.pulled == 3
+    assert done.is_set() and not stream.closed
+
+
+def test_shared_stream_is_closed_when_every_reader_leaves_early():
+    stream = FakeStream(["a", "b", "c"])
+    done = threading.Event()
+    shared = _SharedStream(stream, done.set)
+    first, second = shared.reader(), shared.reader()
+    assert next(iter(first)) == "a"
+    first.close()
+    assert not stream.closed
+
+    second.close()
+    assert stream.closed and done.is_set()
+    # Joining an abandoned stream fails, so the gateway starts a new request
+    assert shared.reader() is None
+
+
+def test_shared_stream_error_reaches_every_reader():
+    shared = _SharedStream(FakeStream(["a"], error=ConnectionError("dropped")), lambda: None)
+    readers = [shared.reader(), shared.reader()]
+    for reader in readers:
+        chunks = []
+        with pytest.raises(ConnectionError):
+            for chunk in reader:
+                chunks.append(chunk)
+        assert chunks == ["a"]
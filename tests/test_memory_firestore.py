@@ -0,0 +1,74 @@
+import pytest
+
+from benchmarks.memory_firestore import DESCENDING, MemoryClient
+
+
+def seeded():
+    db = MemoryClient()
+    db.load('expenses', {
+        "a": {"user_id": "u1", "amount": 5, "date": "2025-01-02"},
+        "b": {"user_id": "u1", "amount": 7, "date": "2025-01-03"},
+        "c": {"user_id": "u1", "amount": 7, "date": "2025-01-01"},
+        "d": {"user_id": "u2", "amount": 1, "date": "2025-01-04"},
+        "e": {"user_id": "u1", "date": "2025-01-05"},
+    })
+    return db
+
+
+def ids(snapshots):
+    return [snapshot.id for snapshot in snapshots]
+
+
+def test_queries_filter_order_and_page_with_cursors():
+    db = seeded()
+    query = db.collection('expenses').where('user_id', '==', "u1").order_by('amount', direction=DESCENDING)
+
+    # "e" has no amount, so ordering by amount leaves it out; ties are broken by document id
+    assert ids(query.stream()) == ["b", "c", "a"]
+    first = query.limit(2).get()
+    assert ids(first) == ["b", "c"]
+    assert ids(query.start_after(first[-1]).limit(2).stream()) == ["a"]
+
+
+def test_unordered_queries_page_by_document_id():
+    db = seeded()
+    query = db.collection('expenses').where('date', '>', "2025-01-01")
+    first = query.limit(2).get()
+    assert ids(first) == ["a", "b"]
+    assert ids(query.start_after(first[-1]).stream()) == ["d", "e"]
+
+
+def test_batches_apply_transforms_and_enforce_the_write_limit():
+    firestore = pytest.importorskip("firebase_admin.firestore")
+    db = MemoryClient()
+    ref = db.collection('rollups').document("u1_2025-01")
+    batch = db.batch()
+    batch.set(ref, {"expense_cents": firestore.Increment(250), "categories": {"Food": firestore.Increment(250)}}, merge=True)
+    batch.set(ref, {"expense_cents": firestore.Increment(-50), "updated_at": firestore.SERVER_TIMESTAMP}, merge=True)
+    batch.commit()
+
+    data = ref.get().to_dict()
+    assert data["expense_cents"] == 200
+    assert data["categories"] == {"Food": 250}
+    assert data["updated_at"] is not None
+    assert db.writes == 2
+
+    batch = db.batch()
+    for index in range(501):
+        batch.set(db.collection('expenses').document(f"x{index}"), {"amount": index})
+    with pytest.raises(ValueError):
+        batch.commit()
+
+
+def test_listeners_receive_changes():
+    db = seeded()
+    received = []
+    watch = db.collection('expenses').where('user_id', '==', "u2").on_snapshot(
+        lambda snapshots, changes, read_time: received.append([(change.type.name, change.document.id) for change in changes])
+    )
+    db.collection('expenses').document("f").set({"user_id": "u2", "amount": 3})
+    db.collection('expenses').document("d").delete()
+    watch.unsubscribe()
+    db.collection('expenses').document("g").set({"user_id": "u2", "amount": 4})
+
+    assert received == [[("ADDED", "d")], [("ADDED", "f")], [("REMOVED", "d")]]
@@ -0,0 +1,54 @@
+import pytest
+
+pytest.importorskip("firebase_admin")
+
+from app_files.pagination import Page, Paginator, build_query, fetch_page
+from benchmarks.memory_firestore import MemoryClient
+
+ROWS = [{"id": f"r{n:02d}", "date": f"2025-01-{n:02d}"} for n in range(1, 8)]
+
+
+def list_fetch(calls):
+    def fetch(page_size, after, **filters):
+        calls.append(after)
+        start = 0 if after is None else after + 1
+        rows = ROWS[start:start + page_size]
+        return Page(rows, start + len(rows) - 1, start + page_size < len(ROWS))
+    return fetch
+
+
+def test_next_uses_the_prefetched_page_and_previous_goes_back():
+    calls = []
+    paginator = Paginator(list_fetch(calls), page_size=3)
+
+    assert [r["id"] for r in paginator.current().rows] == ["r01", "r02", "r03"]
+    paginator.next()
+    assert paginator.page_number == 2
+    assert [r["id"] for r in paginator.current().rows] == ["r04", "r05", "r06"]
+    paginator.next()
+    assert [r["id"] for r in paginator.current().rows] == ["r07"] and not paginator.current().has_more
+    paginator.previous()
+    assert [r["id"] for r in paginator.current().rows] == ["r04", "r05", "r06"]
+    assert calls[:3] == [None, 2, 5]
+
+
+def test_configure_with_new_filters_returns_to_the_first_page():
+    paginator = Paginator(list_fetch([]), page_size=3)
+    paginator.current()
+    paginator.next()
+
+    paginator.configure(3, category="Food")
+
+    assert paginator.page_number == 1 and not paginator.has_previous()
+
+
+def test_fetch_page_reads_firestore_newest_first():
+    db = MemoryClient()
+    db.load('expenses', {row["id"]: {**row, "user_id": "u"} for row in ROWS})
+    query = build_query(db, 'expenses', "u", start_date="2025-01-02")
+
+    first = fetch_page(query, 4)
+    second = fetch_page(query, 4, after=first.cursor)
+
+    assert [r["id"] for r in first.rows] == ["r07", "r06", "r05", "r04"] and first.has_more
+    assert [r["id"] for r in second.rows] == ["r03", "r02"] and not second.has_more
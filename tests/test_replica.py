@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("firebase_admin")
+
+from app_files import replica
+from app_files.replica import TOMBSTONES_COLLECTION, ReplicaStore, prune_tombstones
+from app_files.rollups import add_transaction, delete_transaction
+from benchmarks.memory_firestore import MemoryClient
+
+USER_ID = "user-1"
+
+
+def expense(day):
+    return {"user_id": USER_ID, "amount": 10.0, "date": f"2025-01-{day:02d}", "category": "Food", "description": f"Lunch {day}"}
+
+
+def make_store(db, tmp_path):
+    return ReplicaStore(db, str(tmp_path / "replica.sqlite3"), min_sync_interval=0)
+
+
+def test_first_sync_reads_pages_and_drops_rows_missing_upstream(tmp_path, monkeypatch):
+    monkeypatch.setattr(replica, "SYNC_PAGE_SIZE", 4)
+    db = MemoryClient()
+    db.load('expenses', {f"e{day:02d}": expense(day) for day in range(1, 11)})
+    store = make_store(db, tmp_path)
+    store._connection().execute(
+        "INSERT INTO ledger (collection, id, user_id, doc) VALUES ('expenses', 'gone', ?, '{}')", (USER_ID,)
+    )
+
+    assert store.sync(USER_ID, 'expenses', force=True) == 11
+    assert sorted(row['id'] for row in store.rows(USER_ID, 'expenses')) == [f"e{day:02d}" for day in range(1, 11)]
+
+
+def test_incremental_sync_applies_writes_and_tombstones(tmp_path):
+    db = MemoryClient()
+    ids = [add_transaction(db, USER_ID, 'expenses', expense(day)) for day in range(1, 4)]
+    store = make_store(db, tmp_path)
+    store.sync(USER_ID, 'expenses', force=True)
+
+    added = add_transaction(db, USER_ID, 'expenses', expense(4))
+    delete_transaction(db, USER_ID, 'expenses', {**expense(1), "id": ids[0]})
+
+    store.sync(USER_ID, 'expenses', force=True)
+    assert sorted(row['id'] for row in store.rows(USER_ID, 'expenses')) == sorted(ids[1:] + [added])
+
+
+def test_prune_tombstones_keeps_recent_ones():
+    db = MemoryClient()
+    now = datetime.now(timezone.utc)
+    db.load(TOMBSTONES_COLLECTION, {
+        "old": {"user_id": USER_ID, "collection": 'expenses', "doc_id": "a", "deleted_at": now - timedelta(days=45)},
+        "recent": {"user_id": USER_ID, "collection": 'expenses', "doc_id": "b", "deleted_at": now - timedelta(days=2)},
+        "other": {"user_id": USER_ID, "collection": 'incomes', "doc_id": "c", "deleted_at": now - timedelta(days=45)},
+    })
+
+    assert prune_tombstones(db, USER_ID, 'expenses') == 1
+    assert sorted(doc.id for doc in db.collection(TOMBSTONES_COLLECTION).stream()) == ["other", "recent"]
+
+
+def test_replica_behind_the_tombstone_retention_resyncs_in_full(tmp_path):
+    db = MemoryClient()
+    ids = [add_transaction(db, USER_ID, 'expenses', expense(day)) for day in range(1, 4)]
+    store = make_store(db, tmp_path)
+    store.sync(USER_ID, 'expenses', force=True)
+    connection = store._connection()
+    store._set_watermark(connection, USER_ID, f"{TOMBSTONES_COLLECTION}:expenses", datetime.now(timezone.utc) - timedelta(days=40))
+    # Deleted while the replica was away, and its tombstone already pruned
+    db.collection('expenses').document(ids[0]).delete()
+
+    store.sync(USER_ID, 'expenses', force=True)
+    assert sorted(row['id'] for row in store.rows(USER_ID, 'expenses')) == sorted(ids[1:])
+
+
+def test_failed_sync_serves_local_rows_and_counts_the_error(tmp_path):
+    db = MemoryClient()
+    add_transaction(db, USER_ID, 'expenses', expense(1))
+    store = make_store(db, tmp_path)
+    store.sync(USER_ID, 'expenses', force=True)
+
+    def unavailable(name):
+        raise ConnectionError("Firestore unavailable")
+
+    db.collection = unavailable
+    assert store.sync(USER_ID, 'expenses', force=True) is None
+    assert store.sync_errors == 1
+    assert len(store.rows(USER_ID, 'expenses')) == 1
+
+
+def test_pages_include_undated_rows_after_dated_ones(tmp_path):
+    db = MemoryClient()
+    undated = {key: value for key, value in expense(9).items() if key != 'date'}
+    db.load('expenses', {"e01": expense(1), "e02": expense(2), "u1": undated, "u2": {**undated, "date": None}})
+    store = make_store(db, tmp_path)
+    store.sync(USER_ID, 'expenses', force=True)
+
+    ids, after = [], None
+    while True:
+        page = store.fetch_page(USER_ID, 'expenses', 1, after=after)
+        ids.extend(row['id'] for row in page.rows)
+        if not page.has_more:
+            break
+        after = page.cursor
+    assert ids == ["e02", "e01", "u1", "u2"]
+
+
+def test_remove_replica_files_deletes_the_wal_files(tmp_path):
+    store = make_store(MemoryClient(), tmp_path)
+    store._connection().execute("INSERT INTO sync_state (user_id, stream) VALUES (?, 'expenses')", (USER_ID,))
+    assert any(path.name.endswith("-wal") for path in tmp_path.iterdir())
+
+    store._connection().close()
+    replica.remove_replica_files(store.path)
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,54 @@
+import pytest
+
+pytest.importorskip("firebase_admin")
+
+from benchmarks.memory_firestore import MemoryClient
+from app_files.rollups import (
+    ROLLUPS_COLLECTION, ROLLUPS_VERSION, add_transaction, delete_transaction, load_rollups, rebuild_rollups, verify_rollups,
+)
+
+USER_ID = "user-1"
+
+
+def test_increments_are_exact_cents():
+    db = MemoryClient()
+    ids = [add_transaction(db, USER_ID, 'expenses', {"user_id": USER_ID, "amount": 0.1, "date": "2025-01-15", "category": "Food"}) for _ in range(1000)]
+    delete_transaction(db, USER_ID, 'expenses', {"id": ids[0], "amount": 0.1, "date": "2025-01-15", "category": "Food"})
+
+    [row] = load_rollups(db, USER_ID)
+    assert row['expense_cents'] == 9_990
+    assert row['expense_count'] == 999
+    assert row['category_cents'] == {"Food": 9_990}
+    assert verify_rollups(db, USER_ID) == []
+
+
+def test_rebuild_deletes_many_stale_months_in_several_batches():
+    db = MemoryClient()
+    # 600 months of rollups without any transactions behind them: more deletes than one batch holds
+    db.load(ROLLUPS_COLLECTION, {
+        f"{USER_ID}_{year:04d}-{month:02d}": {"user_id": USER_ID, "month": f"{year:04d}-{month:02d}", "income_cents": 100, "income_count": 1}
+        for year in range(1950, 2000) for month in range(1, 13)
+    })
+    add_transaction(db, USER_ID, 'incomes', {"user_id": USER_ID, "amount": 12.34, "date": "2025-03-01"})
+
+    drift = rebuild_rollups(db, USER_ID)
+
+    assert len(drift) == 2 * 600
+    assert [row['month'] for row in load_rollups(db, USER_ID)] == ["2025-03"]
+    assert db.collection('users').document(USER_ID).get().to_dict() == {"rollups_version": ROLLUPS_VERSION}
+    assert verify_rollups(db, USER_ID) == []
+
+
+def test_deleting_a_transaction_twice_reverses_it_once():
+    db = MemoryClient()
+    row = {"user_id": USER_ID, "amount": 20.0, "date": "2025-02-03", "category": "Food"}
+    kept = add_transaction(db, USER_ID, 'expenses', row)
+    deleted = add_transaction(db, USER_ID, 'expenses', row)
+
+    assert delete_transaction(db, USER_ID, 'expenses', {**row, "id": deleted})
+    assert not delete_transaction(db, USER_ID, 'expenses', {**row, "id": deleted})
+
+    [rollup] = load_rollups(db, USER_ID)
+    assert (rollup['expense_cents'], rollup['expense_count']) == (2000, 1)
+    assert db.collection('expenses').document(kept).get().exists
+    assert verify_rollups(db, USER_ID) == []
@@ -0,0 +1,133 @@
+import time
+
+import pytest
+
+pytest.importorskip("firebase_admin")
+
+from app_files.rollups import load_rollups, verify_rollups
+from app_files.write_queue import WriteQueue
+from benchmarks.memory_firestore import MemoryClient
+
+USER_ID = "user-1"
+EXPENSE = {"user_id": USER_ID, "description": "Lunch", "amount": 12.5, "date": "2025-06-01", "category": "Food"}
+
+
+class LostResponseClient(MemoryClient):
+    """
+    Commits batches but reports the first `failures` commits as failed, like a response lost on the way back.
+    """
+
+    def __init__(self, failures, get_all_works=True):
+        super().__init__()
+        self.failures = failures
+        self.get_all_works = get_all_works
+
+    def batch(self):
+        batch = super().batch()
+        commit = batch.commit
+
+        def commit_and_fail():
+            commit()
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("response lost")
+
+        batch.commit = commit_and_fail
+        return batch
+
+    def get_all(self, references):
+        if not self.get_all_works:
+            raise ConnectionError("unavailable")
+        return super().get_all(references)
+
+
+def make_queue(db, **kwargs):
+    return WriteQueue(db, max_wait_seconds=0, backoff_seconds=0, **kwargs)
+
+
+def test_commit_with_a_lost_response_is_not_applied_twice():
+    db = LostResponseClient(failures=1)
+    queue = make_queue(db)
+    doc_id = queue.submit(USER_ID, 'expenses', EXPENSE)
+
+    assert queue.flush(timeout=5)
+    assert queue.failed(USER_ID) == []
+    assert db.collection('expenses').document(doc_id).get().exists
+    [row] = load_rollups(db, USER_ID)
+    assert (row['expense_cents'], row['expense_count']) == (1250, 1)
+    assert queue.stats()['written'] == 1
+
+
+def test_retrying_a_write_that_was_committed_does_not_count_it_again():
+    db = LostResponseClient(failures=1, get_all_works=False)
+    queue = make_queue(db, max_retries=0)
+    queue.submit(USER_ID, 'expenses', EXPENSE)
+    assert queue.flush(timeout=5)
+    assert len(queue.failed(USER_ID)) == 1
+
+    db.get_all_works = True
+    queue.retry_failed(USER_ID)
+    assert queue.flush(timeout=5)
+
+    assert queue.failed(USER_ID) == []
+    assert verify_rollups(db, USER_ID) == []
+    [row] = load_rollups(db, USER_ID)
+    assert row['expense_count'] == 1
+
+
+class RejectingClient(MemoryClient):
+    """
+    Fails every commit that includes a document of `rejected_user`.
+    """
+
+    def __init__(self, rejected_user):
+        super().__init__()
+        self.rejected_user = rejected_user
+
+    def batch(self):
+        batch = super().batch()
+        commit = batch.commit
+
+        def commit_unless_rejected():
+            if any(data and data.get('user_id') == self.rejected_user for _, _, data, _ in batch._ops):
+                raise PermissionError("rejected")
+            commit()
+
+        batch.commit = commit_unless_rejected
+        return batch
+
+
+class SlowCategorizer:
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def categorize_many(self, user_id, descriptions):
+        time.sleep(self.seconds)
+        return {description: "Food" for description in descriptions}
+
+
+def test_a_failing_user_does_not_fail_the_others_in_the_batch():
+    db = RejectingClient("bad-user")
+    queue = WriteQueue(db, max_wait_seconds=0.2, backoff_seconds=0, max_retries=2)
+    queue.submit("bad-user", 'expenses', {**EXPENSE, "user_id": "bad-user"})
+    good_id = queue.submit(USER_ID, 'expenses', EXPENSE)
+
+    assert queue.flush(timeout=5)
+    assert db.collection('expenses').document(good_id).get().exists
+    assert queue.failed(USER_ID) == []
+    [failed] = queue.failed("bad-user")
+    assert "rejected" in failed['error']
+
+
+def test_slow_categorization_falls_back_without_blocking_the_commit():
+    db = MemoryClient()
+    queue = make_queue(db, categorizer=SlowCategorizer(2), categorize_timeout_seconds=0.1)
+    data = {key: value for key, value in EXPENSE.items() if key != 'category'}
+    started = time.monotonic()
+    doc_id = queue.submit(USER_ID, 'expenses', data)
+
+    assert queue.flush(timeout=5)
+    assert time.monotonic() - started < 1.5
+    assert db.collection('expenses').document(doc_id).get().to_dict()['category'] == "Other"
+    assert queue.stats()['categorize_errors'] == 1
+    assert 'category' not in data